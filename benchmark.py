@@ -0,0 +1,587 @@
+#
+# Micro-benchmarks for the scoring pipeline. Each sub-command times the current implementation
+# against the one it replaced on real suite data and checks that both produce the same results.
+#
+# usage: python benchmark.py opps <path to juliet test cases>
+#        python benchmark.py hits [-n <number of hits>]
+#        python benchmark.py extract [<path to audit.fvdl>] [-n <number of synthetic findings>]
+#        python benchmark.py aggregate [--baseline-max <findings>]
+#        python benchmark.py summary
+#        python benchmark.py styles [-n <number of rows>]
+#        python benchmark.py hitdata [-n <number of hits>]
+#        python benchmark.py backends [-n <number of hits>] [-c <number of cwes>]
+#        python benchmark.py metrics
+#        python benchmark.py store [-n <number of findings per scan>]
+#
+import os, json, argparse, concurrent.futures, random, shutil, tempfile, time, tracemalloc, py_common
+import xml.etree.ElementTree as elemTree
+
+from suite import Suite, Xml, TestCase, HitAggregator, new_hit, store_project_score
+from hit_table import HitTable
+from findings import FindingExtractor, FvdlReader, Finding, get_schemas, get_name_space
+from findings_store import FindingsStore
+
+# 'XML Tags' sheet of the fortify vendor input file
+FORTIFY_XML_TAGS = [['Item', 'XML Schema', 'Tag or Attribute'],
+                    ['Finding_Type', 'Vulnerabilities/Vulnerability', 'Tag'],
+                    ['File_Name', 'AnalysisInfo/Unified/Context/FunctionDeclarationSourceLocation/path', 'Attribute'],
+                    ['Line_Number', 'AnalysisInfo/Unified/Context/FunctionDeclarationSourceLocation/line', 'Attribute'],
+                    ['Function_Name', 'AnalysisInfo/Unified/Context/Function/name', 'Attribute'],
+                    ['Weakness_ID_1', 'ClassInfo/Kingdom', 'Tag'],
+                    ['Weakness_ID_2', 'ClassInfo/Type', 'Tag'],
+                    ['Weakness_ID_3', 'ClassInfo/Subtype', 'Tag']]
+
+
+def time_it(fx, *args, repeat=3):
+    # best of 'repeat' runs, returns (seconds, result of last run)
+    best = None
+    result = None
+    for _ in range(repeat):
+        time_started = time.perf_counter()
+        result = fx(*args)
+        elapsed_seconds = time.perf_counter() - time_started
+        if best is None or elapsed_seconds < best:
+            best = elapsed_seconds
+    return best, result
+
+
+def report(name, baseline_seconds, new_seconds):
+    py_common.print_with_timestamp(name + ': baseline=' + '%0.3f' % baseline_seconds + 's, new=' +
+                                   '%0.3f' % new_seconds + 's, speedup=' +
+                                   '%0.1f' % (baseline_seconds / max(new_seconds, 1e-9)) + 'x')
+
+
+def count_opps_line_by_line(files):
+    # the original TestCase loop; reads each file as text and checks every line
+    opps = {}
+    for file in files:
+        opp_names = []
+        with open(file, 'r', errors='replace') as inF:
+            for line in inF:
+                if line.lstrip().startswith('good') and line.rstrip().endswith('();') \
+                        and 'Source' not in line and 'Sink' not in line and 'good()' not in line:
+                    opp_names.append(line.strip()[:-3])
+        opps[file] = opp_names
+    return opps
+
+
+def count_opps_with_regex(files):
+    return {file: py_common.find_good_fx_calls_in_file(file) for file in files}
+
+
+def bench_opps(args):
+    files = py_common.find_files_in_dir(args.juliet_path, '.*?\.(c|cpp)$')
+    py_common.print_with_timestamp('Scanning ' + str(len(files)) + ' juliet files for opportunities')
+
+    baseline_seconds, baseline = time_it(count_opps_line_by_line, files)
+    new_seconds, new = time_it(count_opps_with_regex, files)
+    threaded_seconds, threaded = time_it(py_common.find_good_fx_calls_in_files, files)
+
+    report('opps (regex)', baseline_seconds, new_seconds)
+    report('opps (regex, thread pool)', baseline_seconds, threaded_seconds)
+
+    mismatches = [file for file in files if baseline[file] != new[file] or new[file] != threaded[file]]
+    for file in mismatches:
+        print('OPP_MISMATCH', file, baseline[file], new[file])
+    py_common.print_with_timestamp(str(len(mismatches)) + ' file(s) with differing opportunities')
+
+
+def build_hits_as_lists(count):
+    # the original hit records; mutable lists with the line number as a string
+    return [['T/CWE121_Stack_Based_Buffer_Overflow/s01/CWE121_Stack_Based_Buffer_Overflow__char_type_overrun_' +
+             str(i % 5000).zfill(4) + '.c', str(i % 300), 'CWE121_Stack_Based_Buffer_Overflow__good' + str(i % 4)]
+            for i in range(count)]
+
+
+def build_hits_as_records(count):
+    return [new_hit('T/CWE121_Stack_Based_Buffer_Overflow/s01/CWE121_Stack_Based_Buffer_Overflow__char_type_overrun_' +
+                    str(i % 5000).zfill(4) + '.c', str(i % 300), 'CWE121_Stack_Based_Buffer_Overflow__good' + str(i % 4))
+            for i in range(count)]
+
+
+def peak_memory(fx, *args):
+    tracemalloc.start()
+    result = fx(*args)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    del result
+    return peak
+
+
+def bench_hits(args):
+    baseline_bytes = peak_memory(build_hits_as_lists, args.count)
+    new_bytes = peak_memory(build_hits_as_records, args.count)
+    py_common.print_with_timestamp('hits (' + str(args.count) + '): baseline=' + '%0.1f' % (baseline_bytes / 2 ** 20) +
+                                   'MB, new=' + '%0.1f' % (new_bytes / 2 ** 20) + 'MB')
+
+
+def write_synthetic_fvdl(path, count, seed=1):
+    # an audit.fvdl shaped like the fortify output, including the snippets and traces we never read
+    rand = random.Random(seed)
+    with open(path, 'w') as f:
+        f.write('<?xml version="1.0" encoding="UTF-8"?>\n'
+                '<FVDL xmlns="xmlns://www.fortifysoftware.com/schema/fvdl"><Build><SourceFiles>' +
+                ''.join('<File name="file' + str(i) + '.c"/>' for i in range(100)) +
+                '</SourceFiles></Build><Vulnerabilities>\n')
+        for i in range(count):
+            test_case = str(rand.randrange(5000)).zfill(4)
+            flow_variant = str(rand.randrange(1, 20)).zfill(2)
+            subtype = rand.choice(['', '<Subtype>Off-by-One</Subtype>', '<Subtype>Format String</Subtype>'])
+            f.write('<Vulnerability><ClassInfo><ClassID>' + str(i) + '</ClassID>'
+                    '<Kingdom>Input Validation and Representation</Kingdom>'
+                    '<Type>' + rand.choice(['Buffer Overflow', 'Command Injection', 'Format String']) + '</Type>' +
+                    subtype + '<AnalyzerName>dataflow</AnalyzerName><DefaultSeverity>4.0</DefaultSeverity>'
+                    '</ClassInfo><InstanceInfo><InstanceID>' + str(i) + '</InstanceID></InstanceInfo>'
+                    '<AnalysisInfo><Unified><Context>'
+                    '<Function name="CWE121_Stack_Based_Buffer_Overflow__' + test_case + '_' + flow_variant +
+                    '_good' + str(rand.randrange(1, 5)) + '" namespace=""/>'
+                    '<FunctionDeclarationSourceLocation path="' + rand.choice(['T', 'F']) +
+                    '/CWE121_Stack_Based_Buffer_Overflow/s01/CWE121_Stack_Based_Buffer_Overflow__char_' +
+                    test_case + '_' + flow_variant + rand.choice(['', 'a', 'b']) + '.c" line="' +
+                    str(rand.randrange(20, 300)) + '" lineEnd="300" colStart="0" colEnd="0"/></Context>'
+                    '<ReplacementDefinitions>' + '<Def key="PrimaryCall.name" value="memcpy"/>' * 5 +
+                    '</ReplacementDefinitions><Trace><Primary>' +
+                    '<Entry><Node isDefault="true"><SourceLocation path="F/x.c" line="1"/></Node></Entry>' * 10 +
+                    '</Primary></Trace></Unified></AnalysisInfo></Vulnerability>\n')
+        f.write('</Vulnerabilities><Snippets>' +
+                '<Snippet id="x"><File>F/x.c</File><Text>memcpy(data, source, 100);</Text></Snippet>' * count +
+                '</Snippets></FVDL>\n')
+
+
+def get_fvdl_path(args):
+    if args.fvdl_path:
+        return args.fvdl_path
+    fvdl_path = os.path.join(tempfile.mkdtemp(), 'audit.fvdl')
+    write_synthetic_fvdl(fvdl_path, args.count)
+    return fvdl_path
+
+
+def extract_with_find(vulns, schemas, weakness_id_schemas, ns):
+    # the original per-field find() calls
+    findings = []
+    for vuln in vulns:
+        values = []
+        for field in ['file_name', 'line_number', 'function_name']:
+            values.append(vuln.find(schemas[field + '_schema'], ns).attrib[schemas[field + '_attrib']])
+        wid_pieces = []
+        for weakness_id_schema in weakness_id_schemas:
+            wid_piece = vuln.find(weakness_id_schema, ns)
+            if wid_piece is not None:
+                wid_pieces.append(wid_piece.text)
+        findings.append(Finding(values[0], values[1], values[2], tuple(wid_pieces)))
+    return findings
+
+
+def extract_with_extractor(vulns, extractor, name_space):
+    return [extractor.extract(vuln, name_space) for vuln in vulns]
+
+
+def bench_extract(args):
+    schemas, weakness_id_schemas = get_schemas(FORTIFY_XML_TAGS)
+    extractor = FindingExtractor(schemas, weakness_id_schemas)
+
+    root = elemTree.parse(get_fvdl_path(args)).getroot()
+    name_space = get_name_space(root.tag)
+    ns = {'ns1': name_space}
+    vulns = root.findall('./' + schemas['finding_type_schema'], ns)
+    py_common.print_with_timestamp('Extracting the fields of ' + str(len(vulns)) + ' findings')
+
+    baseline_seconds, baseline = time_it(extract_with_find, vulns, schemas, weakness_id_schemas, ns)
+    new_seconds, new = time_it(extract_with_extractor, vulns, extractor, name_space)
+
+    report('extract', baseline_seconds, new_seconds)
+    py_common.print_with_timestamp('results match: ' + str(baseline == new))
+
+
+def get_synthetic_hits(count):
+    # about four hits per test case, like juliet
+    return [('T/CWE121_Stack_Based_Buffer_Overflow/s01/CWE121_Stack_Based_Buffer_Overflow__char_' + str(i // 4),
+             'T/CWE121_Stack_Based_Buffer_Overflow/s01/CWE121_Stack_Based_Buffer_Overflow__char_' + str(i // 4) + '.c',
+             str(i % 300), 'good' + str(i % 4)) for i in range(count)]
+
+
+def aggregate_with_lists(xml_project, hits):
+    # the original list based lookups
+    test_cases = []
+    test_case_objects = []
+    suite_hit_data = {}
+    for test_case_name, file_path, line_number, function_name in hits:
+        if test_case_name not in test_cases:
+            new_tc_obj = TestCase(test_case_name, xml_project.tc_type, xml_project.true_false, 'c')
+            new_tc_obj.hit_data.append(new_hit(file_path, line_number, function_name))
+            test_case_objects.append(new_tc_obj)
+            test_cases.append(test_case_name)
+            suite_hit_data[test_case_name] = len(new_tc_obj.hit_data)
+        else:
+            for test_case_object in test_case_objects:
+                if test_case_object.test_case_name == test_case_name:
+                    test_case_object.hit_data.append(new_hit(file_path, line_number, function_name))
+                    suite_hit_data[test_case_name] = len(test_case_object.hit_data)
+                    break
+    return suite_hit_data
+
+
+def aggregate_with_dicts(xml_project, hits):
+    project_hits = HitAggregator(xml_project, 'c')
+    for test_case_name, file_path, line_number, function_name in hits:
+        project_hits.add_hit(test_case_name, file_path, line_number, function_name)
+    # kdm counts, one hit per test case, as score_xml_project scores them
+    project_score = project_hits.get_project_score(project_hits.get_test_case_count(), None)
+    suite_hit_data = {}
+    store_project_score(xml_project, project_score, suite_hit_data)
+    return suite_hit_data
+
+
+def bench_aggregate(args):
+    # kdm test cases do not look for opportunities on disk
+    xml_project = Xml('CWE121', '121', 'kdm', 'TRUE', 'c', 'CWE121_T_kdm.xml', 'CWE121.fpr')
+
+    for count in [1000, 10000, 100000, 1000000]:
+        hits = get_synthetic_hits(count)
+        new_seconds, new = time_it(aggregate_with_dicts, xml_project, hits, repeat=1)
+        message = 'aggregate (' + str(count) + '): new=' + '%0.3f' % new_seconds + 's (' + \
+                  '%0.2f' % (new_seconds / count * 1e6) + 'us/finding)'
+        if count <= args.baseline_max:
+            baseline_seconds, baseline = time_it(aggregate_with_lists, xml_project, hits, repeat=1)
+            message += ', baseline=' + '%0.3f' % baseline_seconds + 's (' + \
+                       '%0.2f' % (baseline_seconds / count * 1e6) + 'us/finding), results match: ' + \
+                       str(baseline == new)
+        py_common.print_with_timestamp(message)
+
+
+def get_synthetic_suite(cwe_count):
+    # a scored suite with one TRUE and one FALSE juliet project per cwe
+    xml_projects = []
+    for i in range(cwe_count):
+        cwe_id_padded = 'CWE' + str(i).zfill(3)
+        for true_false, num_of_hits in [('TRUE', i % 7), ('FALSE', i % 3)]:
+            xml_project = Xml(cwe_id_padded, str(i), 'juliet', true_false, 'c',
+                              cwe_id_padded + '_' + true_false[0] + '_juliet.xml', cwe_id_padded + '.fpr')
+            xml_project.tc_count = 100
+            xml_project.num_of_hits = num_of_hits
+            xml_projects.append(xml_project)
+
+    suite_dat = Suite('', '', 'fortify', xml_projects)
+    for i in range(cwe_count):
+        suite_dat.acceptable_weakness_ids_full_list_dict['CWE' + str(i).zfill(3)] = \
+            ['None'] if i % 5 == 0 else ['Input Validation and Representation:Buffer Overflow']
+    return suite_dat
+
+
+def render_summary(score, workbook_class, cwe_count):
+    # the 'Summary' and 'SCORE' sheets of a fresh workbook, as score.py writes them
+    suite_dat = get_synthetic_suite(cwe_count)
+    wb = workbook_class()
+    score.ws1 = wb.create_sheet('Summary', 0)
+    score.ws5 = wb.create_sheet('SCORE', 1)
+    score.suite_data = suite_dat
+
+    suite_dat.summarize()
+    score.write_summary_data(suite_dat, score.ws1)
+    score.write_summary_data(suite_dat, score.ws5)
+    return suite_dat
+
+
+def get_scores_json(cwe_count):
+    # the scores of the same suite, as score.py writes them with --no-workbook
+    suite_dat = get_synthetic_suite(cwe_count)
+    suite_dat.summarize()
+    return json.dumps(suite_dat.metrics.get_dict(suite_dat.summary_table), indent=2)
+
+
+def bench_summary(args):
+    # imported here so the other benchmarks run without openpyxl
+    import score
+    from openpyxl import Workbook
+
+    for cwe_count in [25, 50, 100, 200, 400, 800]:
+        seconds, _ = time_it(render_summary, score, Workbook, cwe_count)
+        py_common.print_with_timestamp('summary (' + str(cwe_count) + ' cwes): ' + '%0.3f' % seconds + 's (' +
+                                       '%0.2f' % (seconds / cwe_count * 1e3) + 'ms/cwe)')
+
+
+def set_appearance_uncached(ws_id, row_id, col_id, style_id, color_id, border=True):
+    # the original set_appearance; builds new style objects on every call
+    from openpyxl.styles import Border, Side, PatternFill, Font
+
+    cell = ws_id.cell(row=row_id, column=col_id)
+    if style_id == 'font_color':
+        cell.font = Font(color=color_id)
+    if style_id == 'fg_fill':
+        cell.fill = PatternFill(fgColor=color_id, fill_type='solid')
+    if border:
+        cell.border = Border(left=Side(style='thin'), right=Side(style='thin'), top=Side(style='thin'),
+                             bottom=Side(style='thin'))
+
+
+def build_styled_workbook(workbook_class, set_appearance, row_count, path):
+    # a 'Hit Data' shaped sheet; every cell gets a fill and a border and every other row a font color
+    wb = workbook_class()
+    ws = wb.active
+    fill_colors = ['FFFFFF', 'F2F2F2', 'FFFF00', 'DDEBF7', 'E2EFDA', 'FCE4D6']
+    for row in range(1, row_count + 1):
+        for col in range(1, 13):
+            ws.cell(row=row, column=col).value = row * col
+            set_appearance(ws, row, col, 'fg_fill', fill_colors[(row + col) % len(fill_colors)])
+            if row % 2 == 0:
+                set_appearance(ws, row, col, 'font_color', '0000FF')
+    wb.save(path)
+    return os.path.getsize(path)
+
+
+def bench_styles(args):
+    # imported here so the other benchmarks run without openpyxl
+    import score
+    import styles
+    from openpyxl import Workbook
+
+    temp_path = tempfile.mkdtemp()
+    baseline_seconds, baseline_bytes = time_it(build_styled_workbook, Workbook, set_appearance_uncached, args.count,
+                                               os.path.join(temp_path, 'baseline.xlsx'), repeat=1)
+    new_seconds, new_bytes = time_it(build_styled_workbook, Workbook, score.set_appearance, args.count,
+                                     os.path.join(temp_path, 'new.xlsx'), repeat=1)
+
+    report('styles (' + str(args.count) + ' rows, build and save)', baseline_seconds, new_seconds)
+    py_common.print_with_timestamp('styles: baseline=' + '%0.1f' % (baseline_bytes / 2 ** 10) + 'KB, new=' +
+                                   '%0.1f' % (new_bytes / 2 ** 10) + 'KB, shared style objects=' +
+                                   str(styles.get_style_counts()))
+
+
+def get_synthetic_hit_table(count):
+    # juliet/false hits, about four per test case, some files and lines hit more than once
+    rand = random.Random(1)
+    xml_project = Xml('CWE121', '121', 'juliet', 'FALSE', 'c', 'CWE121_F_juliet.xml', 'CWE121.fpr')
+    for test_case_idx in range(count // 4):
+        test_case_name = 'CWE121_Stack_Based_Buffer_Overflow__char_' + str(test_case_idx)
+        test_case_obj = TestCase(test_case_name, 'juliet', 'FALSE', 'c', opps=(['goodG2B', 'goodB2G', 'good1'], 3))
+        test_case_obj.score = rand.randrange(4)
+        test_case_obj.percent = test_case_obj.score / 3
+        for _ in range(4):
+            test_case_obj.hit_data.append(new_hit('F/CWE121_Stack_Based_Buffer_Overflow/s01/' + test_case_name +
+                                                  rand.choice(['.c', 'a.c']), rand.randrange(20, 30),
+                                                  rand.choice(['goodG2B', 'goodB2GSink', 'bad'])))
+        xml_project.test_cases.append(test_case_obj)
+
+    hit_table = HitTable()
+    hit_table.add_project(xml_project)
+    hit_table.sort_by_file_and_line()
+    return hit_table
+
+
+def render_hit_data(score, workbook_class, hit_table, path, stream):
+    suite_dat = Suite('', '', 'fortify', [])
+    wb = workbook_class()
+    score.ws3 = wb.active
+    if stream:
+        score.stream_hit_data(suite_dat, hit_table, path)
+    else:
+        score.write_hit_data(suite_dat, hit_table)
+        wb.save(path)
+
+
+def bench_hit_data(args):
+    # imported here so the other benchmarks run without openpyxl
+    import score
+    from openpyxl import Workbook
+
+    hit_table = get_synthetic_hit_table(args.count)
+    temp_path = tempfile.mkdtemp()
+    for name, stream in [('write', False), ('stream', True)]:
+        path = os.path.join(temp_path, name + '.xlsx')
+        seconds, _ = time_it(render_hit_data, score, Workbook, hit_table, path, stream, repeat=1)
+        peak_bytes = peak_memory(render_hit_data, score, Workbook, hit_table, path, stream)
+        py_common.print_with_timestamp('hit data (' + str(len(hit_table)) + ' hits, ' + name + '): ' +
+                                       '%0.3f' % seconds + 's, peak=' + '%0.1f' % (peak_bytes / 2 ** 20) + 'MB')
+
+
+def render_scorecard(score, backend, hit_table, cwe_count, vendor_path, path):
+    # a whole scorecard from the same synthetic suite, the way score.py builds it with each backend
+    from openpyxl import Workbook, load_workbook
+
+    suite_dat = get_synthetic_suite(cwe_count)
+    score.suite_data = suite_dat
+    score.output_backend = backend
+    if backend == 'xlsxwriter':
+        score.wb = load_workbook(vendor_path, read_only=True)
+        sheets_wb = Workbook()
+        sheets_wb.remove(sheets_wb.active)
+    else:
+        shutil.copyfile(vendor_path, path)
+        score.wb = sheets_wb = load_workbook(path)
+    for idx, title in enumerate(['Summary', 'XML Data', 'Hit Data', 'Hit Analytics', 'SCORE']):
+        setattr(score, 'ws' + str(idx + 1), sheets_wb.create_sheet(title, idx))
+
+    score.format_workbook()
+    score.import_weakness_ids(suite_dat)
+    score.get_used_wids(suite_dat)
+    score.group_hit_data(suite_dat, hit_table)
+    score.write_xml_data(suite_dat)
+    suite_dat.summarize()
+    score.write_summary_data(suite_dat, score.ws1)
+    score.write_summary_data(suite_dat, score.ws5)
+    score.create_summary_charts(suite_dat.summary_table)
+    score.create_score_charts(suite_dat.summary_table)
+
+    if backend == 'xlsxwriter':
+        score.write_xlsxwriter_scorecard(path, vendor_path)
+        score.wb.close()
+    else:
+        score.wb.active = 0
+        score.wb.save(path)
+
+
+def bench_backends(args):
+    # imported here so the other benchmarks run without openpyxl
+    import score
+
+    vendor_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'vendor-input-fortify-c.xlsx')
+    hit_table = get_synthetic_hit_table(args.count)
+    temp_path = tempfile.mkdtemp()
+    for backend in ['openpyxl', 'xlsxwriter']:
+        path = os.path.join(temp_path, backend + '.xlsx')
+        seconds, _ = time_it(render_scorecard, score, backend, hit_table, args.cwe_count, vendor_path, path,
+                             repeat=1)
+        peak_bytes = peak_memory(render_scorecard, score, backend, hit_table, args.cwe_count, vendor_path, path)
+        py_common.print_with_timestamp('scorecard (' + str(len(hit_table)) + ' hits, ' + str(args.cwe_count) +
+                                       ' cwes, ' + backend + '): ' + '%0.3f' % seconds + 's, peak=' +
+                                       '%0.1f' % (peak_bytes / 2 ** 20) + 'MB, size=' +
+                                       '%0.1f' % (os.path.getsize(path) / 2 ** 10) + 'KB')
+
+
+def bench_metrics(args):
+    # imported here so the other benchmarks run without openpyxl
+    import score
+    from openpyxl import Workbook
+
+    for cwe_count in [25, 100, 400, 1600]:
+        baseline_seconds, _ = time_it(render_summary, score, Workbook, cwe_count)
+        new_seconds, scores_json = time_it(get_scores_json, cwe_count)
+        scores = json.loads(scores_json)
+        # p-avg, r-avg and the score as written to the 'SCORE' sheet
+        assert score.ws5.cell(row=2, column=10).value == scores['precision_average']
+        assert score.ws5.cell(row=2, column=13).value == scores['recall_average']
+        assert score.ws5.cell(row=1, column=15).value == '%0.2f' % scores['score']
+        assert [score.ws5.cell(row=row, column=12).value for row in range(2, cwe_count + 2)] == \
+            [cwe['r_final'] for cwe in scores['cwes']]
+        report('metrics (' + str(cwe_count) + ' cwes, sheets vs. json)', baseline_seconds, new_seconds)
+
+
+def get_store_readers(store, fvdl_paths):
+    # a StoringReader for each synthetic scan, none of which is in the store yet
+    schemas, weakness_id_schemas = get_schemas(FORTIFY_XML_TAGS)
+    extractor = FindingExtractor(schemas, weakness_id_schemas)
+    return [store.get_reader(os.path.basename(fvdl_path), 'tags', FvdlReader(fvdl_path, extractor))
+            for fvdl_path in fvdl_paths]
+
+
+def save_interleaved(readers):
+    # reads the scans a finding at a time from each in turn, so every save is in progress at once
+    counts = [0] * len(readers)
+    iterators = [iter(reader) for reader in readers]
+    while iterators:
+        for idx, iterator in list(enumerate(iterators)):
+            if next(iterator, None) is None:
+                iterators[idx] = None
+            else:
+                counts[idx] += 1
+        iterators = [iterator for iterator in iterators if iterator is not None]
+    return counts
+
+
+def parse_to_store(db_path, fvdl_path):
+    # one worker of a '-j N' first run: (time of its first finding, time finished, findings) of parsing and
+    # saving a scan; a worker kept waiting on the store gets its first finding only once the other is done
+    reader, = get_store_readers(FindingsStore(db_path), [fvdl_path])
+    time_started = None
+    count = 0
+    for _ in reader:
+        if time_started is None:
+            time_started = time.time()
+        count += 1
+    return time_started, time.time(), count
+
+
+def save_with_workers(db_path, fvdl_paths, jobs):
+    with concurrent.futures.ProcessPoolExecutor(max_workers=jobs) as executor:
+        return list(executor.map(parse_to_store, [db_path] * len(fvdl_paths), fvdl_paths))
+
+
+def bench_store(args):
+    temp_path = tempfile.mkdtemp()
+    fvdl_paths = []
+    for seed in [1, 2]:
+        fvdl_paths.append(os.path.join(temp_path, 'audit' + str(seed) + '.fvdl'))
+        write_synthetic_fvdl(fvdl_paths[-1], args.count, seed)
+
+    # two saves in progress on the same store must both complete, without waiting on each other's lock
+    store = FindingsStore(os.path.join(temp_path, 'interleaved.db'))
+    seconds, counts = time_it(save_interleaved, get_store_readers(store, fvdl_paths), repeat=1)
+    stored = [sum(1 for _ in store.get_stored_reader(os.path.basename(fvdl_path), 'tags'))
+              for fvdl_path in fvdl_paths]
+    assert counts == stored == [args.count] * len(fvdl_paths)
+    py_common.print_with_timestamp('store (2 interleaved saves, ' + str(args.count) + ' findings each): ' +
+                                   '%0.3f' % seconds + 's, both stored')
+
+    # two workers parse their uncached scans at the same time, as in a '-j 2' first run
+    for jobs in [1, 2]:
+        db_path = os.path.join(temp_path, 'jobs' + str(jobs) + '.db')
+        FindingsStore(db_path)
+        seconds, results = time_it(save_with_workers, db_path, fvdl_paths, jobs, repeat=1)
+        assert [count for _, _, count in results] == [args.count] * len(fvdl_paths)
+        # the parses overlap if each started before the other finished
+        overlap = max(started for started, _, _ in results) < min(finished for _, finished, _ in results)
+        py_common.print_with_timestamp('store (-j ' + str(jobs) + '): ' + '%0.3f' % seconds + 's, parses overlap: ' +
+                                       str(overlap))
+        if jobs > 1:
+            assert overlap
+    shutil.rmtree(temp_path)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Micro-benchmarks for the scoring scripts.')
+    sub_parsers = parser.add_subparsers(dest='benchmark')
+    sub_parsers.required = True
+
+    opps_parser = sub_parsers.add_parser('opps', help='Opportunity scanner vs. line by line loop')
+    opps_parser.add_argument('juliet_path', help='Path to the juliet test cases (i.e. juliet\\F)')
+    opps_parser.set_defaults(fx=bench_opps)
+
+    hits_parser = sub_parsers.add_parser('hits', help='Peak memory of hit records vs. lists')
+    hits_parser.add_argument('-n', dest='count', type=int, default=500000, help='Number of hits to build')
+    hits_parser.set_defaults(fx=bench_hits)
+
+    extract_parser = sub_parsers.add_parser('extract', help='Compiled field extractor vs. per-field find()')
+    extract_parser.add_argument('fvdl_path', nargs='?', help='Path to an audit.fvdl (synthetic if not given)')
+    extract_parser.add_argument('-n', dest='count', type=int, default=20000, help='Number of synthetic findings')
+    extract_parser.set_defaults(fx=bench_extract)
+
+    aggregate_parser = sub_parsers.add_parser('aggregate', help='Keyed hit aggregation scaling, 1k to 1M findings')
+    aggregate_parser.add_argument('--baseline-max', dest='baseline_max', type=int, default=10000,
+                                  help='Largest number of findings to also run thru the list based baseline')
+    aggregate_parser.set_defaults(fx=bench_aggregate)
+
+    summary_parser = sub_parsers.add_parser('summary', help='Summary and SCORE sheet rendering time per cwe')
+    summary_parser.set_defaults(fx=bench_summary)
+
+    styles_parser = sub_parsers.add_parser('styles', help='Shared style objects vs. new ones per styled cell')
+    styles_parser.add_argument('-n', dest='count', type=int, default=20000, help='Number of rows to style')
+    styles_parser.set_defaults(fx=bench_styles)
+
+    hit_data_parser = sub_parsers.add_parser('hitdata', help='Streamed vs. in-memory \'Hit Data\' sheet')
+    hit_data_parser.add_argument('-n', dest='count', type=int, default=20000, help='Number of hits to write')
+    hit_data_parser.set_defaults(fx=bench_hit_data)
+
+    backends_parser = sub_parsers.add_parser('backends', help='openpyxl vs. XlsxWriter (constant memory) scorecard')
+    backends_parser.add_argument('-n', dest='count', type=int, default=20000, help='Number of hits to write')
+    backends_parser.add_argument('-c', dest='cwe_count', type=int, default=100, help='Number of cwes to summarize')
+    backends_parser.set_defaults(fx=bench_backends)
+
+    metrics_parser = sub_parsers.add_parser('metrics', help='Summary and SCORE sheets vs. --no-workbook json scores')
+    metrics_parser.set_defaults(fx=bench_metrics)
+
+    store_parser = sub_parsers.add_parser('store', help='Concurrent saves of uncached scans to the findings store')
+    store_parser.add_argument('-n', dest='count', type=int, default=20000, help='Number of findings per scan')
+    store_parser.set_defaults(fx=bench_store)
+
+    args = parser.parse_args()
+    args.fx(args)
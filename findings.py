@@ -0,0 +1,384 @@
+#
+# Reads the findings out of the tool result files (xml or json) for scoring
+#
+import re
+import json
+import collections
+import xml.etree.ElementTree as elemTree
+
+# one finding from a tool result; wid_pieces are the weakness id pieces in 'XML Tags' sheet order
+Finding = collections.namedtuple('Finding', ['file_path', 'line_number', 'function_name', 'wid_pieces'])
+
+# the fields of a finding that are read from the xml, in 'XML Tags' sheet order
+FINDING_FIELDS = ['file_name', 'line_number', 'function_name']
+
+# characters read at a time when streaming json
+JSON_CHUNK_SIZE = 1 << 16
+JSON_WHITESPACE = re.compile('[ \t\r\n]*')
+# characters that matter when skipping over a json value, outside and inside of a string
+JSON_SKIP_CHARS = re.compile('["{}\\[\\]]')
+JSON_STRING_CHARS = re.compile('["\\\\]')
+# rest of the buffer after a value that may still be part of it, when it is a number cut off by the chunk
+JSON_NUMBER_TAIL = re.compile('[0-9.eE+-]*')
+
+
+def get_schemas(tag_ids):
+    schemas = {}
+    weakness_id_schemas = []
+
+    # get xml schemas from vendor input file
+    for idx, content in enumerate(tag_ids):
+        schema = 'ns1:' + tag_ids[idx][1].replace('/', '/ns1:')
+
+        # 'Item' & 'Tag or Attribute'
+        item = content[0].lower()
+        tag_or_attribute = content[2].lower()
+
+        # 'Finding_Type'
+        if item == 'finding_type':
+            if tag_or_attribute == 'tag':
+                schemas['finding_type_schema'] = schema
+            continue
+
+        # 'File_Name', 'Line_Number' & 'Function_Name'
+        if item == 'file_name' or item == 'line_number' or item == 'function_name':
+            if tag_or_attribute == 'tag':
+                schemas[item + '_schema'] = schema
+            elif tag_or_attribute == 'attribute':
+                schemas[item + '_schema'] = schema.rsplit('/', 1)[0]
+                schemas[item + '_attrib'] = schema.rsplit(':', 1)[1]
+            continue
+
+        # 'Weakness_ID_'s
+        if 'weakness' in item:
+            weakness_id_schemas.append('ns1:' + str(tag_ids[idx][1]).replace('/', '/ns1:'))
+
+    return schemas, weakness_id_schemas
+
+
+def schema_to_tags(schema):
+    # 'ns1:AnalysisInfo/ns1:Unified' -> ('AnalysisInfo', 'Unified')
+    return tuple(tag.rpartition(':')[2] for tag in schema.split('/'))
+
+
+def get_name_space(root_tag):
+    # read namespace from the root tag
+    return root_tag.split('}')[0].replace('{', '')
+
+
+class FindingExtractor(object):
+    """
+    The 'XML Tags' schemas compiled into a tree of tags, so that every field of a finding (file name,
+    line number, function name and weakness id pieces) is pulled out in a single pass over the
+    finding's children instead of one ElementTree find() per field.
+
+    Create one per suite; it holds no per-xml state and can be shared by streaming or parallel readers.
+    """
+
+    def __init__(self, schemas, weakness_id_schemas):
+        self.finding_tags = schema_to_tags(schemas['finding_type_schema'])
+
+        # (tags relative to the finding, attribute name or None for the tag text), one per slot
+        self.fields = []
+        for field in FINDING_FIELDS:
+            self.fields.append((schema_to_tags(schemas[field + '_schema']), schemas.get(field + '_attrib')))
+        for weakness_id_schema in weakness_id_schemas:
+            self.fields.append((schema_to_tags(weakness_id_schema), None))
+
+        # compiled field trees per namespace
+        self.field_trees = {}
+
+    @property
+    def field_tags(self):
+        return [tags for tags, attrib in self.fields]
+
+    def get_field_tree(self, name_space):
+        """
+        Returns the fields compiled into {full tag: (slots that end at this tag, child tree)} where
+        each slot is (slot index, attribute name or None).
+        """
+        if name_space not in self.field_trees:
+            field_tree = {}
+            for slot, (tags, attrib) in enumerate(self.fields):
+                tree = field_tree
+                for idx, tag in enumerate(tags):
+                    full_tag = '{' + name_space + '}' + tag
+                    if full_tag not in tree:
+                        tree[full_tag] = ([], {})
+                    if idx == len(tags) - 1:
+                        tree[full_tag][0].append((slot, attrib))
+                    tree = tree[full_tag][1]
+            self.field_trees[name_space] = field_tree
+        return self.field_trees[name_space]
+
+    def extract(self, vuln, name_space):
+        """
+        Returns the Finding for a finding element.  Like find(), the first matching element in
+        document order is used for each field and a missing field is None (missing weakness id
+        pieces are left out).
+        """
+        values = [None] * len(self.fields)
+        found = [False] * len(self.fields)
+        self.walk(vuln, self.get_field_tree(name_space), values, found)
+
+        num_of_fields = len(FINDING_FIELDS)
+        wid_pieces = tuple(value for value, was_found in zip(values[num_of_fields:], found[num_of_fields:])
+                           if was_found)
+        return Finding(values[0], values[1], values[2], wid_pieces)
+
+    def walk(self, elem, tree, values, found):
+        for child in elem:
+            node = tree.get(child.tag)
+            if node is None:
+                continue
+            for slot, attrib in node[0]:
+                if not found[slot]:
+                    found[slot] = True
+                    values[slot] = child.text if attrib is None else child.attrib.get(attrib)
+            if node[1]:
+                self.walk(child, node[1], values, found)
+
+
+class FvdlReader(object):
+    """
+    Streams the findings out of an xml (i.e. an audit.fvdl) one at a time with iterparse.
+
+    Only the parts of each finding that the 'XML Tags' schemas point at are kept while it is being
+    parsed; everything else (snippets, traces, descriptions, ...) is removed from the tree as soon as
+    it has been read, so memory stays flat no matter how big the xml is.
+    """
+
+    def __init__(self, xml_path, extractor):
+        self.xml_path = xml_path
+        self.extractor = extractor
+        # namespace of the root tag, available once iteration has started
+        self.name_space = {}
+
+    def build_tag_tree(self, name_space):
+        """
+        Builds a tree of {full tag: (kind, child tree)} from the root down to the finding ('ancestor'
+        and 'finding') and from the finding down to every field ('field').  Elements that are not in
+        this tree are dropped.
+        """
+        def add_path(tree, tags, kind, last_kind):
+            for idx, tag in enumerate(tags):
+                full_tag = '{' + name_space + '}' + tag
+                if full_tag not in tree:
+                    tree[full_tag] = (last_kind if idx == len(tags) - 1 else kind, {})
+                tree = tree[full_tag][1]
+            return tree
+
+        tag_tree = {}
+        finding_tree = add_path(tag_tree, self.extractor.finding_tags, 'ancestor', 'finding')
+        for tags in self.extractor.field_tags:
+            add_path(finding_tree, tags, 'field', 'field')
+        return tag_tree
+
+    def __iter__(self):
+        # tag trees of the open elements; None once an element is outside of the tree
+        open_trees = []
+        open_elements = []
+        name_space = None
+
+        for event, elem in elemTree.iterparse(self.xml_path, events=('start', 'end')):
+            if event == 'start':
+                if not open_elements:
+                    name_space = get_name_space(elem.tag)
+                    self.name_space['ns1'] = name_space
+                    node = ('ancestor', self.build_tag_tree(name_space))
+                else:
+                    parent_node = open_trees[-1]
+                    node = parent_node[1].get(elem.tag) if parent_node is not None else None
+                open_trees.append(node)
+                open_elements.append(elem)
+                continue
+
+            node = open_trees.pop()
+            open_elements.pop()
+            if not open_elements:
+                # end of root
+                elem.clear()
+                break
+
+            if node is not None:
+                if node[0] == 'finding':
+                    yield self.extractor.extract(elem, name_space)
+                elif node[0] == 'field':
+                    # part of a field inside the finding that is still being parsed
+                    continue
+
+            # done with this element
+            elem.clear()
+            open_elements[-1].remove(elem)
+
+
+class JsonStream(object):
+    """
+    Minimal pull parser over a json file.  The caller walks the containers it cares about with
+    iter_object() and iter_array(), decodes the values it needs whole with decode_value() and steps over
+    the rest with skip_value(), which never holds more than a chunk of the document in memory.
+    """
+
+    def __init__(self, f, chunk_size=JSON_CHUNK_SIZE):
+        self.f = f
+        self.chunk_size = chunk_size
+        self.buffer = ''
+        self.pos = 0
+        self.eof = False
+        self.decoder = json.JSONDecoder()
+
+    def read_more(self, size):
+        # drop what has been consumed and append the next chunk; False at the end of the file
+        if self.eof:
+            return False
+        chunk = self.f.read(size)
+        if not chunk:
+            self.eof = True
+            return False
+        self.buffer = self.buffer[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def peek(self):
+        # next non-whitespace character, without consuming it
+        while True:
+            self.pos = JSON_WHITESPACE.match(self.buffer, self.pos).end()
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self.read_more(self.chunk_size):
+                raise ValueError('Unexpected end of json')
+
+    def expect(self, char):
+        if self.peek() != char:
+            raise ValueError('Expected \'' + char + '\' in json, found \'' + self.buffer[self.pos] + '\'')
+        self.pos += 1
+
+    def decode_value(self):
+        self.peek()
+        size = self.chunk_size
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.pos)
+                # a value that ends with the buffer (or with a partial fraction or exponent) may be a number
+                # that continues in the next chunk
+                if self.eof or not JSON_NUMBER_TAIL.fullmatch(self.buffer, end):
+                    self.pos = end
+                    return value
+            except ValueError:
+                if self.eof:
+                    raise
+            # the value is longer than what has been read so far
+            self.read_more(size)
+            size *= 2
+
+    def skip_value(self):
+        # scans past the value at the current position, tracking brackets and strings, without decoding it
+        char = self.peek()
+        if char not in '{["':
+            # number, true, false or null
+            self.decode_value()
+            return
+
+        depth = 0
+        in_string = False
+        while True:
+            match = (JSON_STRING_CHARS if in_string else JSON_SKIP_CHARS).search(self.buffer, self.pos)
+            if match is None:
+                # nothing that matters in the rest of the buffer
+                self.pos = len(self.buffer)
+            else:
+                self.pos = match.start()
+                char = self.buffer[self.pos]
+                if char == '\\':
+                    # an escaped character, which may be in the next chunk
+                    if self.pos + 1 < len(self.buffer):
+                        self.pos += 2
+                        continue
+                else:
+                    self.pos += 1
+                    if char == '"':
+                        in_string = not in_string
+                    elif char in '{[':
+                        depth += 1
+                    else:
+                        depth -= 1
+                    if depth == 0 and not in_string:
+                        return
+                    continue
+            if not self.read_more(self.chunk_size):
+                raise ValueError('Unexpected end of json')
+
+    def iter_object(self):
+        # yields each key of the object at the current position; the caller must consume each value
+        self.expect('{')
+        while True:
+            char = self.peek()
+            if char == '}':
+                self.pos += 1
+                return
+            if char == ',':
+                self.pos += 1
+                continue
+            key = self.decode_value()
+            self.expect(':')
+            yield key
+
+    def iter_array(self):
+        # yields once per item of the array at the current position; the caller must consume each item
+        self.expect('[')
+        while True:
+            char = self.peek()
+            if char == ']':
+                self.pos += 1
+                return
+            if char == ',':
+                self.pos += 1
+                continue
+            yield
+
+
+def sarif_result_to_finding(result):
+    # the first location of a result is where it was found; the rule id is its (single piece) weakness id
+    file_path, line_number, function_name = None, '0', ''
+
+    locations = result.get('locations') or []
+    if locations:
+        physical_location = locations[0].get('physicalLocation', {})
+        file_path = physical_location.get('artifactLocation', {}).get('uri')
+        start_line = physical_location.get('region', {}).get('startLine')
+        if start_line is not None:
+            line_number = str(start_line)
+        logical_locations = locations[0].get('logicalLocations') or []
+        if logical_locations:
+            function_name = logical_locations[0].get('name') or logical_locations[0].get('fullyQualifiedName', '')
+
+    rule_id = result.get('ruleId')
+    wid_pieces = (rule_id,) if rule_id is not None else ()
+    return Finding(file_path, line_number, function_name, wid_pieces)
+
+
+class SarifReader(object):
+    """
+    Streams the results out of a SARIF log one at a time.  Only the runs[].results[] items are decoded
+    as a whole; everything else in the log (tool, rules, artifacts, ...) is skipped without decoding it.
+    """
+
+    def __init__(self, sarif_path):
+        self.sarif_path = sarif_path
+        # json has no namespace
+        self.name_space = {}
+
+    def __iter__(self):
+        with open(self.sarif_path, 'r', encoding='utf-8-sig') as f:
+            stream = JsonStream(f)
+            for key in stream.iter_object():
+                if key != 'runs':
+                    stream.skip_value()
+                    continue
+                for _ in stream.iter_array():
+                    for run_key in stream.iter_object():
+                        if run_key != 'results':
+                            stream.skip_value()
+                            continue
+                        for _ in stream.iter_array():
+                            yield sarif_result_to_finding(stream.decode_value())
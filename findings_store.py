@@ -0,0 +1,271 @@
+#
+# Keeps the findings read from each scan, and the test case catalog of the suite, in a sqlite database so they can
+# be rescored without parsing the xmls or reading the test cases again
+#
+import json
+import sqlite3
+import hashlib
+
+from findings import Finding
+from suite import Xml
+
+# seconds a worker waits for another worker that is saving its findings
+STORE_TIMEOUT = 60
+# findings staged per statement while a scan is read
+STORE_BATCH_SIZE = 1000
+
+STORE_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS scans (
+    scan_id INTEGER PRIMARY KEY,
+    scan_hash TEXT NOT NULL,
+    tags_key TEXT NOT NULL,
+    name_space TEXT NOT NULL,
+    UNIQUE (scan_hash, tags_key)
+);
+CREATE TABLE IF NOT EXISTS findings (
+    scan_id INTEGER NOT NULL REFERENCES scans (scan_id),
+    file_path TEXT,
+    line_number TEXT,
+    function_name TEXT,
+    wid_pieces TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS findings_scan_id ON findings (scan_id);
+CREATE TABLE IF NOT EXISTS catalog_projects (
+    project_idx INTEGER PRIMARY KEY,
+    cwe_id_padded TEXT NOT NULL,
+    cwe_num TEXT NOT NULL,
+    tc_type TEXT NOT NULL,
+    true_false TEXT NOT NULL,
+    tc_lang TEXT NOT NULL,
+    new_xml_name TEXT NOT NULL,
+    scan_data_file TEXT NOT NULL,
+    scan_hash TEXT NOT NULL,
+    tc_path TEXT NOT NULL,
+    tc_count INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS catalog_opps (
+    project_idx INTEGER NOT NULL REFERENCES catalog_projects (project_idx),
+    test_case_name TEXT NOT NULL,
+    opp_names TEXT NOT NULL,
+    opp_counts INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS run_times (
+    run_type TEXT PRIMARY KEY,
+    seconds REAL NOT NULL
+);
+'''
+
+
+def hash_file(path):
+    # content hash of a scan data file (i.e. an .fpr), read in chunks
+    file_hash = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            file_hash.update(chunk)
+    return file_hash.hexdigest()
+
+
+def get_tags_key(tag_info):
+    # findings depend on the 'XML Tags' sheet too, so a change there is a different key
+    return hashlib.sha1(json.dumps(tag_info).encode('utf-8')).hexdigest()
+
+
+class FindingsStore(object):
+    """
+    The findings of every scan that has been parsed, keyed by the content hash of the scan data file
+    and the 'XML Tags' they were read with, plus the xml projects and test case catalog of the last
+    full run.  Holds only the database path, so it (and the readers it hands out) can be passed to
+    worker processes.
+    """
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+
+        connection = self.connect()
+        try:
+            # readers do not wait for a worker that is saving a scan
+            connection.execute('PRAGMA journal_mode=WAL')
+            with connection:
+                connection.executescript(STORE_SCHEMA)
+        finally:
+            connection.close()
+
+    def connect(self):
+        return sqlite3.connect(self.db_path, timeout=STORE_TIMEOUT)
+
+    def get_scan(self, scan_hash, tags_key):
+        # (scan id, namespace) or None if this scan has not been stored
+        connection = self.connect()
+        try:
+            return connection.execute('SELECT scan_id, name_space FROM scans WHERE scan_hash = ? AND tags_key = ?',
+                                      (scan_hash, tags_key)).fetchone()
+        finally:
+            connection.close()
+
+    def get_reader(self, scan_hash, tags_key, reader):
+        """
+        Returns a reader for the findings of a scan: the stored findings if this scan has been read
+        before, otherwise the given xml reader wrapped so that its findings are stored as they are read.
+        """
+        scan = self.get_scan(scan_hash, tags_key)
+        if scan is not None:
+            return StoredFindingsReader(self, scan[0], scan[1])
+        return StoringReader(self, scan_hash, tags_key, reader)
+
+    def get_stored_reader(self, scan_hash, tags_key):
+        # the stored findings of a scan, or None if they are not in the store
+        scan = self.get_scan(scan_hash, tags_key)
+        if scan is None:
+            return None
+        return StoredFindingsReader(self, scan[0], scan[1])
+
+    def save(self, scan_hash, tags_key, reader):
+        """
+        Passes the findings of reader through and stages them as they are read, STORE_BATCH_SIZE at a time,
+        in a temp table of this connection.  The temp table is a file of its own, so parsing holds no lock
+        on the store and other workers parse and save their scans at the same time.  Once the whole scan
+        has been read its findings are moved into the store in one short transaction; a scan that is not
+        read to the end (an error, or the caller stops early) leaves nothing behind.
+        """
+        connection = self.connect()
+        try:
+            connection.execute('PRAGMA temp_store = FILE')
+            connection.execute('CREATE TEMP TABLE staged_findings (file_path TEXT, line_number TEXT, '
+                               'function_name TEXT, wid_pieces TEXT NOT NULL)')
+
+            rows = []
+            for finding in reader:
+                rows.append((finding.file_path, finding.line_number, finding.function_name,
+                             json.dumps(finding.wid_pieces)))
+                if len(rows) == STORE_BATCH_SIZE:
+                    with connection:
+                        connection.executemany('INSERT INTO staged_findings VALUES (?, ?, ?, ?)', rows)
+                    rows = []
+                yield finding
+
+            with connection:
+                connection.executemany('INSERT INTO staged_findings VALUES (?, ?, ?, ?)', rows)
+                # replace anything left over from an earlier run
+                connection.execute('DELETE FROM findings WHERE scan_id IN '
+                                   '(SELECT scan_id FROM scans WHERE scan_hash = ? AND tags_key = ?)',
+                                   (scan_hash, tags_key))
+                connection.execute('DELETE FROM scans WHERE scan_hash = ? AND tags_key = ?', (scan_hash, tags_key))
+                scan_id = connection.execute('INSERT INTO scans (scan_hash, tags_key, name_space) VALUES (?, ?, ?)',
+                                             (scan_hash, tags_key, reader.name_space.get('ns1', ''))).lastrowid
+                connection.execute('INSERT INTO findings SELECT ?, file_path, line_number, function_name, wid_pieces '
+                                   'FROM staged_findings ORDER BY rowid', (scan_id,))
+        finally:
+            connection.close()
+
+    def get_finding_count(self, scan_id):
+        connection = self.connect()
+        try:
+            return connection.execute('SELECT COUNT(*) FROM findings WHERE scan_id = ?', (scan_id,)).fetchone()[0]
+        finally:
+            connection.close()
+
+    def load(self, scan_id):
+        connection = self.connect()
+        try:
+            rows = connection.execute('SELECT file_path, line_number, function_name, wid_pieces FROM findings '
+                                      'WHERE scan_id = ? ORDER BY rowid', (scan_id,))
+            for file_path, line_number, function_name, wid_pieces in rows:
+                yield Finding(file_path, line_number, function_name, tuple(json.loads(wid_pieces)))
+        finally:
+            connection.close()
+
+    def save_catalog(self, xml_projects):
+        """
+        Replaces the stored xml projects with these, including their test case paths and counts and
+        the opps of their juliet/false test cases.
+        """
+        connection = self.connect()
+        try:
+            with connection:
+                connection.execute('DELETE FROM catalog_opps')
+                connection.execute('DELETE FROM catalog_projects')
+                for project_idx, xml_project in enumerate(xml_projects):
+                    connection.execute('INSERT INTO catalog_projects VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                                       (project_idx, xml_project.cwe_id_padded, xml_project.cwe_num,
+                                        xml_project.tc_type, xml_project.true_false, xml_project.tc_lang,
+                                        xml_project.new_xml_name, xml_project.scan_data_file, xml_project.scan_hash,
+                                        xml_project.tc_path, xml_project.tc_count))
+                    connection.executemany('INSERT INTO catalog_opps VALUES (?, ?, ?, ?)',
+                                           ((project_idx, test_case_name, json.dumps(opp_names), opp_counts)
+                                            for test_case_name, (opp_names, opp_counts) in
+                                            (xml_project.opp_catalog or {}).items()))
+        finally:
+            connection.close()
+
+    def load_catalog(self):
+        # the xml projects of the last full run, in the order they were saved
+        connection = self.connect()
+        try:
+            xml_projects = []
+            for row in connection.execute('SELECT * FROM catalog_projects ORDER BY project_idx'):
+                xml_project = Xml(row[1], row[2], row[3], row[4], row[5], row[6], row[7])
+                xml_project.scan_hash = row[8]
+                xml_project.tc_path = row[9]
+                xml_project.tc_count = row[10]
+                xml_project.opp_catalog = {}
+                xml_projects.append(xml_project)
+
+            for project_idx, test_case_name, opp_names, opp_counts in \
+                    connection.execute('SELECT * FROM catalog_opps ORDER BY rowid'):
+                xml_projects[project_idx].opp_catalog[test_case_name] = (json.loads(opp_names), opp_counts)
+            return xml_projects
+        finally:
+            connection.close()
+
+    def save_run_time(self, run_type, seconds):
+        connection = self.connect()
+        try:
+            with connection:
+                connection.execute('INSERT OR REPLACE INTO run_times VALUES (?, ?)', (run_type, seconds))
+        finally:
+            connection.close()
+
+    def get_run_time(self, run_type):
+        # seconds the last run of this type took, or None
+        connection = self.connect()
+        try:
+            row = connection.execute('SELECT seconds FROM run_times WHERE run_type = ?', (run_type,)).fetchone()
+            return row[0] if row else None
+        finally:
+            connection.close()
+
+
+class StoredFindingsReader(object):
+    """
+    Reads the findings of a scan back out of the store, in the order they were in the xml.
+    """
+
+    def __init__(self, store, scan_id, name_space):
+        self.store = store
+        self.scan_id = scan_id
+        self.name_space = {'ns1': name_space} if name_space else {}
+
+    def __iter__(self):
+        return self.store.load(self.scan_id)
+
+    def get_finding_count(self):
+        return self.store.get_finding_count(self.scan_id)
+
+
+class StoringReader(object):
+    """
+    Passes the findings of another reader through and stores them as they are read.
+    """
+
+    def __init__(self, store, scan_hash, tags_key, reader):
+        self.store = store
+        self.scan_hash = scan_hash
+        self.tags_key = tags_key
+        self.reader = reader
+
+    @property
+    def name_space(self):
+        return self.reader.name_space
+
+    def __iter__(self):
+        return self.store.save(self.scan_hash, self.tags_key, self.reader)
@@ -0,0 +1,284 @@
+#
+# Suite wide table of the valid hits, stored column by column
+#
+import array
+import collections
+
+
+class StringTable(object):
+    """
+    Stores each distinct string once and hands out a small int id for it.
+    """
+    __slots__ = ('strings', 'ids')
+
+    def __init__(self):
+        self.strings = []
+        self.ids = {}
+
+    def get_id(self, string):
+        string_id = self.ids.get(string)
+        if string_id is None:
+            string_id = self.ids[string] = len(self.strings)
+            self.strings.append(string)
+        return string_id
+
+    def __getitem__(self, string_id):
+        return self.strings[string_id]
+
+    def __len__(self):
+        return len(self.strings)
+
+
+class HitTable(object):
+    """
+    Every valid hit of the suite, one typed array per column instead of one tuple per hit.
+
+    Strings (cwe, type, t/f, file name and function name) are kept once in a StringTable and the
+    columns only hold their ids, so the table stays small for suites with millions of hits.  Sorting,
+    deduping and grouping work on the int columns and a permutation of the row indexes; a full row is
+    only built when a sheet writer asks for it.
+
+    (Built on the standard library 'array' module rather than NumPy so that scoring has no extra
+    dependencies.)
+    """
+
+    def __init__(self):
+        self.cwes = StringTable()
+        self.tc_types = StringTable()
+        self.true_falses = StringTable()
+        self.files = StringTable()
+        self.functions = StringTable()
+        # TestCase per test case id; holds the per test case columns (percent and opp names)
+        self.test_cases = []
+
+        # columns
+        self.cwe_ids = array.array('l')
+        self.tc_type_ids = array.array('l')
+        self.true_false_ids = array.array('l')
+        self.file_ids = array.array('l')
+        self.line_numbers = array.array('l')
+        self.function_ids = array.array('l')
+        self.test_case_ids = array.array('l')
+        self.scores = array.array('l')
+        self.opps = array.array('l')
+        # number of findings merged into each hit
+        self.counts = array.array('l')
+
+    def __len__(self):
+        return len(self.file_ids)
+
+    def get_columns(self):
+        return [self.cwe_ids, self.tc_type_ids, self.true_false_ids, self.file_ids, self.line_numbers,
+                self.function_ids, self.test_case_ids, self.scores, self.opps, self.counts]
+
+    def add_project(self, xml_project):
+        # the score and opps of each test case must already be calculated
+        cwe_id = self.cwes.get_id(xml_project.cwe_id_padded)
+        tc_type_id = self.tc_types.get_id(xml_project.tc_type)
+        true_false_id = self.true_falses.get_id(xml_project.true_false)
+
+        for test_case_obj in xml_project.test_cases:
+            test_case_id = len(self.test_cases)
+            self.test_cases.append(test_case_obj)
+            num_of_hits = len(test_case_obj.hit_data)
+
+            self.cwe_ids.extend([cwe_id] * num_of_hits)
+            self.tc_type_ids.extend([tc_type_id] * num_of_hits)
+            self.true_false_ids.extend([true_false_id] * num_of_hits)
+            self.test_case_ids.extend([test_case_id] * num_of_hits)
+            self.scores.extend([test_case_obj.score] * num_of_hits)
+            self.opps.extend([test_case_obj.opp_counts] * num_of_hits)
+            for hit in test_case_obj.hit_data:
+                self.file_ids.append(self.files.get_id(hit.file_path))
+                self.line_numbers.append(hit.line_number)
+                self.function_ids.append(self.functions.get_id(hit.function_name))
+                self.counts.append(hit.count)
+
+    def sort_by_file_and_line(self):
+        # rank the file names once so the sort key is a pair of ints (stable, like sorted())
+        file_ranks = [0] * len(self.files)
+        for rank, file_id in enumerate(sorted(range(len(self.files)), key=self.files.__getitem__)):
+            file_ranks[file_id] = rank
+
+        file_ids = self.file_ids
+        line_numbers = self.line_numbers
+        order = sorted(range(len(self)), key=lambda idx: (file_ranks[file_ids[idx]], line_numbers[idx]))
+
+        for column in self.get_columns():
+            column[:] = array.array(column.typecode, [column[idx] for idx in order])
+
+    def get_row(self, idx):
+        """
+        Returns row idx as it is written to the 'Hit Data' sheet:
+        CWE, Type, T/F, File Name, Line, Function, Score, Opps, %Hits, Opp Names...
+        """
+        test_case_obj = self.test_cases[self.test_case_ids[idx]]
+        percent = str(round(test_case_obj.percent * 100, 1)) + ' %'
+        return (self.cwes[self.cwe_ids[idx]], self.tc_types[self.tc_type_ids[idx]],
+                self.true_falses[self.true_false_ids[idx]], self.files[self.file_ids[idx]],
+                self.line_numbers[idx], self.functions[self.function_ids[idx]], self.scores[idx],
+                self.opps[idx], percent) + tuple(test_case_obj.opp_names)
+
+    def rows(self):
+        for idx in range(len(self)):
+            yield self.get_row(idx)
+
+    def get_opp_names(self, idx):
+        return self.test_cases[self.test_case_ids[idx]].opp_names
+
+    def get_test_case_groups(self):
+        """
+        Returns (first row, number of rows) for each run of rows that belong to the same test case.
+        """
+        groups = []
+        test_case_ids = self.test_case_ids
+        start = 0
+        for idx in range(1, len(self) + 1):
+            if idx == len(self) or test_case_ids[idx] != test_case_ids[start]:
+                groups.append((start, idx - start))
+                start = idx
+        return groups
+
+    def get_shards(self, max_rows):
+        """
+        Returns (cwe, rows) for each shard of the table: the rows of one cwe, split into parts of at most
+        max_rows rows between test cases.
+        """
+        cwe_groups = {}
+        for first_idx, group_size in self.get_test_case_groups():
+            cwe_groups.setdefault(self.cwes[self.cwe_ids[first_idx]], []).append((first_idx, group_size))
+
+        shards = []
+        for cwe in sorted(cwe_groups):
+            rows = []
+            for first_idx, group_size in cwe_groups[cwe]:
+                if rows and len(rows) + group_size > max_rows:
+                    shards.append((cwe, rows))
+                    rows = []
+                rows.extend(range(first_idx, first_idx + group_size))
+            shards.append((cwe, rows))
+        return shards
+
+    def get_sub_table(self, rows):
+        """
+        Returns a new HitTable with only the given rows, in the given order, and only the strings and test
+        cases they use (i.e. to hand a shard to a worker process).
+        """
+        sub_table = HitTable()
+        test_case_ids = {}
+        for idx in rows:
+            test_case_id = test_case_ids.get(self.test_case_ids[idx])
+            if test_case_id is None:
+                test_case_id = test_case_ids[self.test_case_ids[idx]] = len(sub_table.test_cases)
+                sub_table.test_cases.append(self.test_cases[self.test_case_ids[idx]])
+
+            sub_table.cwe_ids.append(sub_table.cwes.get_id(self.cwes[self.cwe_ids[idx]]))
+            sub_table.tc_type_ids.append(sub_table.tc_types.get_id(self.tc_types[self.tc_type_ids[idx]]))
+            sub_table.true_false_ids.append(sub_table.true_falses.get_id(self.true_falses[self.true_false_ids[idx]]))
+            sub_table.file_ids.append(sub_table.files.get_id(self.files[self.file_ids[idx]]))
+            sub_table.line_numbers.append(self.line_numbers[idx])
+            sub_table.function_ids.append(sub_table.functions.get_id(self.functions[self.function_ids[idx]]))
+            sub_table.test_case_ids.append(test_case_id)
+            sub_table.scores.append(self.scores[idx])
+            sub_table.opps.append(self.opps[idx])
+            sub_table.counts.append(self.counts[idx])
+
+        return sub_table
+
+    def get_duplicate_file_ids(self):
+        # file names that are hit more than once, including merged duplicate findings
+        file_counts = collections.Counter()
+        for file_id, count in zip(self.file_ids, self.counts):
+            file_counts[file_id] += count
+        return set(file_id for file_id, count in file_counts.items() if count > 1)
+
+    def is_repeat_of_previous(self, idx):
+        # same file name and line as the row before it
+        return idx > 0 and self.file_ids[idx] == self.file_ids[idx - 1] and \
+            self.line_numbers[idx] == self.line_numbers[idx - 1]
+
+    def get_unique_rows(self, tc_type, true_false):
+        """
+        Returns the indexes of the rows of the given type and t/f, leaving out rows that repeat an
+        earlier row exactly.
+        """
+        tc_type_id = self.tc_types.ids.get(tc_type)
+        true_false_id = self.true_falses.ids.get(true_false)
+        seen = set()
+        unique_rows = []
+
+        for idx in range(len(self)):
+            if self.tc_type_ids[idx] != tc_type_id or self.true_false_ids[idx] != true_false_id:
+                continue
+            # the percent column follows from score and opps
+            key = (self.cwe_ids[idx], self.file_ids[idx], self.line_numbers[idx], self.function_ids[idx],
+                   self.scores[idx], self.opps[idx], tuple(self.get_opp_names(idx)))
+            if key not in seen:
+                seen.add(key)
+                unique_rows.append(idx)
+
+        return unique_rows
+
+    def get_function_totals(self, rows):
+        """
+        Returns {enclosing function name: [hits, opps]} summed over the given rows.
+        """
+        totals = {}
+        for idx in rows:
+            function_totals = totals.get(self.function_ids[idx])
+            if function_totals is None:
+                function_totals = totals[self.function_ids[idx]] = [0, 0]
+            function_totals[0] += self.scores[idx]
+            function_totals[1] += self.opps[idx]
+
+        return dict((self.functions[function_id], function_totals) for function_id, function_totals in
+                    totals.items())
+
+
+# totals of one enclosing function over the unique juliet/false hits
+FunctionHits = collections.namedtuple('FunctionHits', ['name', 'hits', 'misses', 'opps', 'percent'])
+# totals of a group of enclosing functions; rows are indexes into the sorted function hits
+GroupHits = collections.namedtuple('GroupHits', ['first_row', 'num_of_rows', 'hits', 'opps', 'percent'])
+
+# groups of enclosing functions, in the order a function name is checked against them
+HIT_GROUPS = ['B2G', 'G2B']
+
+
+def get_percent(hits, opps):
+    return hits / opps * 100 if opps else 0
+
+
+def get_hit_group(function_name):
+    for group in HIT_GROUPS:
+        if group in function_name:
+            return group
+    return None
+
+
+def get_hit_analytics(hit_table):
+    """
+    Returns the 'Hit Analytics' of the juliet/false hits in one pass: the FunctionHits of every enclosing
+    function, sorted by name, and {group: GroupHits} for each of the HIT_GROUPS (all zeros for a group
+    that has no functions).
+    """
+    function_totals = hit_table.get_function_totals(hit_table.get_unique_rows('juliet', 'FALSE'))
+
+    function_hits = []
+    # group -> [first row, number of rows, hits, opps]
+    group_totals = dict((group, [0, 0, 0, 0]) for group in HIT_GROUPS)
+    for row, name in enumerate(sorted(function_totals)):
+        hits, opps = function_totals[name]
+        function_hits.append(FunctionHits(name, hits, opps - hits, opps, get_percent(hits, opps)))
+
+        group = get_hit_group(name)
+        if group is not None:
+            totals = group_totals[group]
+            if totals[1] == 0:
+                totals[0] = row
+            totals[1] += 1
+            totals[2] += hits
+            totals[3] += opps
+
+    groups = dict((group, GroupHits(first_row, num_of_rows, hits, opps, get_percent(hits, opps)))
+                  for group, (first_row, num_of_rows, hits, opps) in group_totals.items())
+    return function_hits, groups
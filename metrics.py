@@ -0,0 +1,68 @@
+#
+# Precision, recall and score of a suite, computed from its per cwe totals without building a workbook
+#
+import collections
+
+# scores of one cwe; precision and p_final are None (written as 'N/A') when the cwe has no hits
+CweMetrics = collections.namedtuple('CweMetrics', ['cwe', 'weight', 'precision', 'recall', 'p_final', 'r_final'])
+
+
+class SuiteMetrics(collections.namedtuple('SuiteMetrics', ['cwes', 'precision_average', 'recall_average', 'score',
+                                                           'threshold', 'pass_fail'])):
+    """
+    Read only scores of a suite: the CweMetrics of each cwe, in the order of the summary table, and the
+    averages over the cwes.  The score is the mean of the precision and recall averages and passes when it
+    reaches the threshold.
+    """
+    __slots__ = ()
+
+    def get_dict(self, summary_table):
+        # the metrics with the totals they were computed from, for json
+        cwes = []
+        for cwe_totals, cwe_metrics in zip(summary_table.cwes, self.cwes):
+            cwe_dict = cwe_totals._asdict()
+            cwe_dict.update(cwe_metrics._asdict())
+            cwes.append(cwe_dict)
+
+        return collections.OrderedDict([('cwes', cwes), ('tc_true', summary_table.tc_true),
+                                        ('tc_false', summary_table.tc_false), ('tp', summary_table.tp),
+                                        ('fp', summary_table.fp), ('precision_average', self.precision_average),
+                                        ('recall_average', self.recall_average), ('score', self.score),
+                                        ('threshold', self.threshold), ('pass_fail', self.pass_fail)])
+
+
+def get_cwe_weights(cwes):
+    # todo: all set to 1.0 for now; the same weighting applies to both precision and recall
+    return dict((cwe, 1.0) for cwe in cwes)
+
+
+def get_mean(values):
+    return sum(values) / len(values) if values else 0
+
+
+def get_suite_metrics(summary_table, threshold, weights=None):
+    """
+    Returns the SuiteMetrics of a SummaryTable; weights is {cwe: weight}, 1.0 for every cwe if not given.
+    Precision is rounded to two places before it is weighted, as it is shown on the 'Summary' sheet, and
+    cwes without a precision are left out of its average.
+    """
+    cwe_names = summary_table.get_cwe_names()
+    if weights is None:
+        weights = get_cwe_weights(cwe_names)
+
+    # one column per value, over all cwes at once
+    cwe_weights = [weights[cwe] for cwe in cwe_names]
+    precisions = [None if cwe_totals.precision is None else round(cwe_totals.precision, 2)
+                  for cwe_totals in summary_table.cwes]
+    recalls = [cwe_totals.recall for cwe_totals in summary_table.cwes]
+    p_finals = [None if precision is None else weight * precision for weight, precision in zip(cwe_weights, precisions)]
+    r_finals = [weight * recall for weight, recall in zip(cwe_weights, recalls)]
+
+    precision_average = get_mean([p_final for p_final in p_finals if p_final is not None])
+    recall_average = get_mean(r_finals)
+    score = (precision_average + recall_average) / 2
+
+    cwes = tuple(CweMetrics(*cwe_row) for cwe_row in zip(cwe_names, cwe_weights, precisions, recalls, p_finals,
+                                                         r_finals))
+    return SuiteMetrics(cwes, precision_average, recall_average, score, threshold,
+                        'PASS' if score >= threshold else 'FAIL')
@@ -36,7 +36,10 @@
 # 2010-07-02 john.laliberte@mandiant.com: add more common functions
 # 2010-07-01 john.laliberte@mandiant.com: initial version, take and modify functions from other scripts
 
-import os, re, csv, datetime, subprocess, glob, sys, time, shutil
+import os, re, csv, datetime, subprocess, glob, sys, time, shutil, mmap, functools, concurrent.futures
+
+# directories that are never enumerated when searching for files
+DEFAULT_PRUNED_DIRS = frozenset(['.svn'])
 
 
 def is_generated_file(fullfilepath):
@@ -50,26 +53,119 @@ def is_generated_file(fullfilepath):
     return False
 
 
+@functools.lru_cache(maxsize=64)
+def compile_ignorecase_regex(regex):
+    """
+    Compiles a string regex for case-insensitive matching.  Compiled patterns are cached so
+    callers can pass the same string repeatedly without paying for re-compilation.
+    """
+    return re.compile(regex, re.IGNORECASE)
+
+
+def get_compiled_regex(regex):
+    """
+    Returns a compiled pattern for either a string regex (compiled case-insensitive) or an
+    already compiled pattern (used as is).
+    """
+    if isinstance(regex, str):
+        return compile_ignorecase_regex(regex)
+    return regex
+
+
+def scan_dir_tree(directory, prune_dirs=DEFAULT_PRUNED_DIRS):
+    """
+    Generator that walks a directory tree top-down with os.scandir and yields an os.DirEntry
+    for every file and directory found.  The files and directories of a directory are yielded
+    before any of its sub-directories are entered (the same order as os.walk).
+    Directories named in prune_dirs are neither yielded nor entered, and symbolic links to
+    directories are yielded but not followed.
+    """
+    pending_dirs = [directory]
+    while pending_dirs:
+        current_dir = pending_dirs.pop()
+        sub_dirs = []
+        try:
+            with os.scandir(current_dir) as entries:
+                dir_entries = list(entries)
+        except OSError:
+            continue
+
+        for entry in dir_entries:
+            if entry.is_dir():
+                if entry.name in prune_dirs:
+                    continue
+                if not entry.is_symlink():
+                    sub_dirs.append(entry.path)
+            yield entry
+
+        # depth first, in the order the directories were listed
+        pending_dirs.extend(reversed(sub_dirs))
+
+
+def iter_entries_in_dir(directory, regex, want_dirs, prune_dirs=DEFAULT_PRUNED_DIRS, silent=True, workers=None):
+    """
+    Generator behind iter_files_in_dir and iter_directories_in_dir.  When workers is given, each
+    top-level sub-directory is walked in its own thread; results are still yielded in walk order.
+    """
+    pattern = get_compiled_regex(regex)
+    directory = os.path.realpath(directory)
+    kind = 'dir' if want_dirs else 'file'
+
+    def matching_paths(entries):
+        for entry in entries:
+            if entry.is_dir() != want_dirs:
+                continue
+            if pattern.search(entry.name):
+                yield entry.path
+            elif not silent:
+                print("Skipped " + kind + " (did not match regex): ", entry.name)
+
+    if not workers:
+        yield from matching_paths(scan_dir_tree(directory, prune_dirs))
+        return
+
+    # the top level is listed here, each top-level sub-directory tree is walked in a worker thread
+    try:
+        with os.scandir(directory) as entries:
+            top_entries = list(entries)
+    except OSError:
+        return
+    top_entries = [entry for entry in top_entries if not (entry.is_dir() and entry.name in prune_dirs)]
+    yield from matching_paths(top_entries)
+
+    sub_dirs = [entry.path for entry in top_entries if entry.is_dir() and not entry.is_symlink()]
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+        for paths in executor.map(lambda sub_dir: list(matching_paths(scan_dir_tree(sub_dir, prune_dirs))),
+                                  sub_dirs):
+            yield from paths
+
+
+def iter_files_in_dir(directory, regex, prune_dirs=DEFAULT_PRUNED_DIRS, silent=True, workers=None):
+    """
+    Generator that yields the full path of each file (non-directory) that matches a regex in a
+    certain directory.  (recursively, case-insensitive for string regexes)
+    The regex may be a string or a pre-compiled pattern.  Directories named in prune_dirs are
+    not enumerated, and an optional number of worker threads walks the top-level sub-directories
+    in parallel.  Can pass an optional argument of silent=False to print filenames that did not
+    match the regex.
+    """
+    return iter_entries_in_dir(directory, regex, False, prune_dirs, silent, workers)
+
+
+def iter_directories_in_dir(directory, regex, prune_dirs=DEFAULT_PRUNED_DIRS, silent=True, workers=None):
+    """
+    Generator that yields the full path of each directory that matches a regex in a certain
+    directory.  Accepts the same options as iter_files_in_dir.
+    """
+    return iter_entries_in_dir(directory, regex, True, prune_dirs, silent, workers)
+
+
 def find_files_in_dir(directory, regex, silent=True):
     """
     Finds files (non-directories) that match a regex in a certain directory.  (recursively, case-insensitive)
     Can pass an optional argument of silent=False to print filenames that did not match the regex.
     """
-    matching_files = []
-    for root, dirs, files in os.walk(directory):
-        for name in files:
-            result = re.search(regex, name, re.IGNORECASE)
-            if result != None:
-                matching_files.append(os.path.realpath(os.path.join(root, name)))
-            else:
-                if not silent:
-                    print("Skipped file (did not match regex): ", name)
-
-        # don't enumerate files in .svn dirs
-        if '.svn' in dirs:
-            dirs.remove('.svn')
-
-    return matching_files
+    return list(iter_files_in_dir(directory, regex, silent=silent))
 
 
 def find_directories_in_dir(directory, regex, silent=True):
@@ -77,21 +173,7 @@ def find_directories_in_dir(directory, regex, silent=True):
     Finds directories that match a regex in a certain directory (recursively, case-insensitive)
     Can pass an optional argument of silent=False to print filenames that did not match the regex.
     """
-    matching_directories = []
-    for root, dirs, files in os.walk(directory):
-        # don't enumerate dirs in .svn dirs
-        if '.svn' in dirs:
-            dirs.remove('.svn')
-
-        for name in dirs:
-            result = re.search(regex, name, re.IGNORECASE)
-            if result != None:
-                matching_directories.append(os.path.realpath(os.path.join(root, name)))
-            else:
-                if not silent:
-                    print("Skipped dir (did not match regex): ", name)
-
-    return matching_directories
+    return list(iter_directories_in_dir(directory, regex, silent=silent))
 
 
 def find_all_files_in_dir_nr(directory):
@@ -117,14 +199,15 @@ def find_testcase_functional_variants_in_dir(dir):
     """
 
     func_vars = []
+    testcase_filename_pattern = compile_ignorecase_regex(get_testcase_filename_regex())
 
     # filter the list of test cases to the baseline test cases so that we can
     # iterate over this list without worrying about duplicate functional variants
-    baseline_testcases = find_files_in_dir(dir, get_baseline_functional_variant_regex())
+    baseline_testcases = iter_files_in_dir(dir, get_baseline_functional_variant_regex())
 
     for btc in baseline_testcases:
         btc_file_name = os.path.basename(btc)
-        result = re.search(get_testcase_filename_regex(), btc_file_name, re.IGNORECASE)
+        result = testcase_filename_pattern.search(btc_file_name)
 
         if result != None:
             func_vars.append(result.group('functional_variant_name'))
@@ -270,6 +353,44 @@ def get_java_good_fx_counting_regex():
     return "good(\d+|G2B|B2G|G2B\d+|B2G\d+)"
 
 
+def get_c_good_fx_call_regex():
+    """
+    Matches a line that consists only of a call to one of the counted C/C++ good functions
+    (i.e. "    good1();") and captures the function name in the 'good_fx' group.
+    Matches must be performed multi-line (re.MULTILINE) against the raw bytes of a file.
+
+    Calls to 'good...Source()', 'good...Sink()' and the C++ 'good()' wrapper never match
+    because the counting regex must be followed directly by "();".
+    """
+    return "^[ \\t]*(?P<good_fx>" + get_c_good_fx_counting_regex() + ")\\(\\);[ \\t]*\\r?$"
+
+
+good_fx_call_pattern = re.compile(get_c_good_fx_call_regex().encode('ascii'), re.MULTILINE)
+
+
+def find_good_fx_calls_in_file(file):
+    """
+    Returns the names of the good functions called in a C/C++ test case file, in the order they
+    are called.  The file is memory mapped and searched as bytes with a single compiled regex,
+    so no per-line work is done in python.  Safe to call from multiple threads.
+    """
+    with open(file, 'rb') as f:
+        # empty files cannot be memory mapped
+        if os.fstat(f.fileno()).st_size == 0:
+            return []
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+            return [match.group('good_fx').decode('ascii') for match in good_fx_call_pattern.finditer(buf)]
+
+
+def find_good_fx_calls_in_files(files, max_workers=None):
+    """
+    Scans several C/C++ test case files for good function calls using a thread pool.
+    Returns a dictionary of {file: [good function names]}.
+    """
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+        return dict(zip(files, executor.map(find_good_fx_calls_in_file, files)))
+
+
 def get_testcase_filename_regex():
     """
     This regex matches primary and secondary test case files.
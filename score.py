@@ -3,15 +3,22 @@
 #
 # 2016-12-01 smcdonagh@keywcorp.com: initial version
 #
-import os, re, argparse, shutil, py_common, operator
-import xml.etree.ElementTree as elemTree
+import os, sys, copy, csv, gzip, json, argparse, shutil, concurrent.futures, py_common
 
 from hashlib import sha1
-from time import strftime
-from suite import Suite, TestCase
-from operator import itemgetter
-from openpyxl import load_workbook
-from openpyxl.styles import Border, Side, PatternFill, Font, Alignment
+from time import strftime, perf_counter
+from suite import Suite, HitAggregator, store_project_score, get_test_case_name
+from metrics import get_suite_metrics
+from hit_table import HitTable, get_hit_analytics, get_hit_group
+from findings import FindingExtractor, get_schemas
+from weakness_ids import WeaknessIdIndex
+from tool_adapters import TOOL_ADAPTERS
+from findings_store import FindingsStore, StoredFindingsReader, get_tags_key, hash_file
+from styles import get_font, get_fill, get_border, get_alignment, get_rule_fill
+from openpyxl import Workbook, load_workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.formatting.rule import FormulaRule
+from openpyxl.utils import column_index_from_string
 from openpyxl.chart import BarChart, LineChart
 from openpyxl.chart import PieChart, Reference
 from openpyxl.chart.series import DataPoint
@@ -20,24 +27,50 @@ from openpyxl.drawing.text import RichTextProperties, Paragraph, ParagraphProper
 
 # Global for command line argument
 normalize_juliet_false_scoring = False
+# 'Hit Data' is streamed to this workbook instead of written to the scorecard, if set
+hit_data_stream_path = None
+# color 'Hit Data' and 'XML Data' with conditional formatting rules instead of styling each cell; this saves the
+# time spent styling cells, not file size (the rules need hidden helper columns, so the scorecard is a little larger)
+use_conditional_formats = False
+# 'Hit Data' is sharded by cwe into 'xlsx' or 'csv' files in this folder, and the sheet indexes them, if set
+hit_data_shard_format = None
+hit_data_shard_path = None
+# worker processes writing the 'Hit Data' shards
+hit_data_jobs = 1
+# 'openpyxl' builds the scorecard in memory, 'xlsxwriter' writes it in constant memory mode
+output_backend = 'openpyxl'
 
 TOOL_NAME = 'fortify'
 XML_OUTPUT_DIR = 'xmls'
-WID_DELIMITER_FORTIFY = ':'
+FINDINGS_STORE_NAME = 'findings.db'
+
+HIT_SHEET_TITLES = ['CWE', 'Type', 'T/F', 'File Name', 'Line #', 'Function', 'SCORE', 'Opps', '%', 'Opportunities']
+HIT_SHEET_COL_WIDTHS = [('A', 8), ('B', 6), ('C', 6), ('D', 108), ('E', 6), ('F', 17), ('G', 6), ('H', 6), ('I', 8),
+                        ('J', 12), ('K', 12), ('L', 12), ('M', 12)]
+# hidden 'Hit Data' columns the conditional formatting rules read: rows of the test case and its number of (up to
+# four) opportunities, on its first row, and number of findings merged into a hit; blank when not needed
+HIT_SHEET_GROUP_SIZE_COL = 'AA'
+HIT_SHEET_COUNT_COL = 'AB'
+HIT_SHEET_OPP_COUNT_COL = 'AC'
+# 'Hit Data' as an index of the shards; a cwe with more hits than fit in one sheet is split into parts
+HIT_INDEX_TITLES = ['CWE', 'Part', 'Hits', 'TCs', 'Shard']
+HIT_INDEX_COL_WIDTHS = [('A', 8), ('B', 6), ('C', 10), ('D', 10), ('E', 48)]
+HIT_SHARD_MAX_ROWS = 1048576 - 1
 
 
 def format_workbook():
+    if hit_data_shard_format:
+        ws3_titles, ws3_col_widths = HIT_INDEX_TITLES, HIT_INDEX_COL_WIDTHS
+    else:
+        ws3_titles, ws3_col_widths = HIT_SHEET_TITLES, HIT_SHEET_COL_WIDTHS
     # column titles
-    hit_sheet_titles = ['CWE', 'Type', 'T/F', 'File Name', 'Line #', 'Function', 'SCORE', 'Opps', '%', 'Opportunities']
-    for idx, title in enumerate(hit_sheet_titles):
+    for idx, title in enumerate(ws3_titles):
         set_appearance(ws3, 1, idx + 1, 'fg_fill', 'C9C9C9')
         ws3.cell(row=1, column=idx + 1).value = title
-        ws3.cell(row=1, column=idx + 1).alignment = Alignment(horizontal='center')
+        ws3.cell(row=1, column=idx + 1).alignment = get_alignment(horizontal='center')
     # column widths
     ws1_col_widths = [('A', 8), ('B', 8), ('C', 8), ('D', 8), ('E', 8), ('F', 8), ('G', 8), ('H', 22), ('I', 8)]
     ws2_col_widths = [('A', 8), ('B', 6), ('C', 6), ('D', 5), ('E', 6), ('F', 6), ('G', 38), ('H', 62), ('I', 95)]
-    ws3_col_widths = [('A', 8), ('B', 6), ('C', 6), ('D', 108), ('E', 6), ('F', 17), ('G', 6), ('H', 6), ('I', 8),
-                      ('J', 12), ('K', 12), ('L', 12), ('M', 12)]
     ws4_col_widths = [('A', 18), ('B', 6), ('C', 6), ('D', 6), ('E', 6), ('F', 10), ('G', 6), ('H', 6), ('I', 6)]
     ws5_col_widths = [('A', 8), ('B', 8), ('C', 8), ('D', 8), ('E', 8), ('F', 8), ('G', 8), ('H', 7), ('I', 7),
                       ('J', 5), ('K', 7), ('L', 7), ('M', 5), ('AC', 12)]
@@ -70,197 +103,147 @@ def format_workbook():
     ws4.freeze_panes = ws4['A2']
     ws5.freeze_panes = ws5['N2']
     # merge 'Opportunities' title cells
-    ws3.merge_cells('J1:M1')
+    if not hit_data_shard_format:
+        ws3.merge_cells('J1:M1')
     # hide helper columns
     for col in ['AC', 'AD']:
         ws1.column_dimensions[col].hidden = True
 
 
-def get_schemas(suite_dat):
-    schemas = {}
-    weakness_id_schemas = []
-
-    tag_ids = getattr(suite_dat, 'tag_info')
-
-    # get xml schemas from vendor input file
-    for idx, content in enumerate(tag_ids):
-        schema = 'ns1:' + getattr(suite_dat, 'tag_info')[idx][1].replace('/', '/ns1:')
-
-        # 'Item' & 'Tag or Attribute'
-        item = content[0].lower()
-        tag_or_attribute = content[2].lower()
-
-        # 'Finding_Type'
-        if item == 'finding_type':
-            if tag_or_attribute == 'tag':
-                schemas['finding_type_schema'] = schema
-            continue
+def score_xmls(suite_dat, tc_lang, store, jobs=1, rescore=False, dedupe=False):
+    # compile the xml tags once for all xmls
+    tool_adapter = getattr(suite_dat, 'tool_adapter')
+    extractor = None
+    if tool_adapter.uses_xml_tags:
+        schemas, weakness_id_schemas = get_schemas(getattr(suite_dat, 'tag_info'))
+        extractor = FindingExtractor(schemas, weakness_id_schemas)
+    wid_index = getattr(suite_dat, 'weakness_id_index')
+
+    xml_paths = [os.path.join(os.getcwd(), 'xmls', getattr(xml_project, 'new_xml_name'))
+                 for xml_project in suite_dat.xml_projects]
+
+    tags_key = get_tags_key(suite_dat.tag_info)
+    if rescore:
+        # every finding comes out of the store; the scans and xmls are not read
+        readers = [store.get_stored_reader(xml_project.scan_hash, tags_key) for xml_project in suite_dat.xml_projects]
+        for xml_project, reader in zip(suite_dat.xml_projects, readers):
+            if reader is None:
+                py_common.print_with_timestamp('No stored findings for ' + xml_project.new_xml_name +
+                                               ' with these XML Tags, run a full scoring first')
+                sys.exit(1)
+    else:
+        # findings of a scan that was read before come out of the store instead of being parsed again
+        for xml_project in suite_dat.xml_projects:
+            xml_project.scan_hash = hash_file(xml_project.scan_data_file)
+        readers = [store.get_reader(xml_project.scan_hash, tags_key,
+                                    tool_adapter.get_reader(xml_path, extractor))
+                   for xml_project, xml_path in zip(suite_dat.xml_projects, xml_paths)]
+
+    if jobs > 1:
+        # projects are independent until they are stored, so score them in worker processes; the largest
+        # go first so a big one is not left running on its own at the end
+        by_size = sorted(range(len(xml_paths)), key=lambda idx: get_work_size(readers[idx], xml_paths[idx]),
+                         reverse=True)
+        with concurrent.futures.ProcessPoolExecutor(max_workers=jobs) as executor:
+            futures = {idx: executor.submit(score_xml_project, suite_dat.xml_projects[idx], xml_paths[idx],
+                                            readers[idx], wid_index, tc_lang, dedupe) for idx in by_size}
+            project_scores = [futures[idx].result() for idx in range(len(xml_paths))]
+    else:
+        project_scores = [score_xml_project(xml_project, xml_path, reader, wid_index, tc_lang, dedupe)
+                          for xml_project, xml_path, reader in zip(suite_dat.xml_projects, xml_paths, readers)]
 
-        # 'File_Name', 'Line_Number' & 'Function_Name'
-        if item == 'file_name' or item == 'line_number' or item == 'function_name':
-            if tag_or_attribute == 'tag':
-                schemas[item + '_schema'] = schema
-            elif tag_or_attribute == 'attribute':
-                schemas[item + '_schema'] = schema.rsplit('/', 1)[0]
-                schemas[item + '_attrib'] = schema.rsplit(':', 1)[1]
-            continue
+    # store in project order, so the results do not depend on which worker finished first
+    for xml_project, project_score in zip(suite_dat.xml_projects, project_scores):
+        store_project_score(xml_project, project_score, suite_dat.suite_hit_data)
 
-        # 'Weakness_ID_'s
-        if 'weakness' in item:
-            weakness_id_schemas.append('ns1:' + str(tag_ids[idx][1]).replace('/', '/ns1:'))
+        # namespace is the same for all xmls
+        if project_score.name_space:
+            setattr(suite_dat, 'name_space', project_score.name_space)
 
-    return schemas, weakness_id_schemas
+        print('XML_PROJECT_NAME:', xml_project.new_xml_name, 'SCORE:', project_score.score)
 
+    # keep the projects and their test case catalog for rescoring
+    if not rescore:
+        store.save_catalog(suite_dat.xml_projects)
 
-def score_xmls(suite_dat):
-    ns = {}
-    wid_pieces_that_hit = []
+    # True if every xml was parsed, rather than any of its findings coming out of the store
+    return not any(isinstance(reader, StoredFindingsReader) for reader in readers)
 
-    schemas, weakness_id_schemas = get_schemas(suite_dat)
 
-    for xml_project in suite_data.xml_projects:
-        used_wids = []
-        test_cases = []
-        test_case_files = []
-        file_paths = []
+def get_work_size(reader, xml_path):
+    # xmls that are parsed come before stored findings, each by its own size; a rescore has no xmls to size
+    if isinstance(reader, StoredFindingsReader):
+        return 0, reader.get_finding_count()
+    return 1, os.path.getsize(xml_path)
 
-        test_case_objects = []
 
-        # read namespace from the first xml since it will be the same for all other xmls
-        xml_path = os.path.join(os.getcwd(), 'xmls', getattr(xml_project, 'new_xml_name'))
-        tree = elemTree.parse(xml_path)
-        root = tree.getroot()
-        ns['ns1'] = root.tag.split('}')[0].replace('{', '')
+def score_xml_project(xml_project, xml_path, reader, wid_index, tc_lang, dedupe=False):
+    # test cases, hits and used wids for this xml, keyed for constant time updates
+    project_hits = HitAggregator(xml_project, tc_lang, dedupe)
 
-        setattr(suite_dat, 'name_space', ns)  # todo: we only need this one time
+    print('XML', xml_path)
 
-        print('XML', xml_path)
+    # opps for the test cases come from the catalog, read once per project
+    if xml_project.opp_catalog is None:
+        xml_project.read_opp_catalog()
 
-        # get the acceptable wids for this xml
-        good_wids = getattr(xml_project, 'acceptable_weakness_ids')
-        test_case_type = getattr(xml_project, 'tc_type')
-        tool_name = getattr(suite_data, 'tool_name')
+    # get the acceptable wids for this xml
+    cwe_num = getattr(xml_project, 'cwe_num')
+    test_case_type = getattr(xml_project, 'tc_type')
 
-        # 1. parse thru each row in this xml looking for good wids, and get the filename & line #
-        # for vuln in root.findall('./' + finding_type_schema, ns):
-        for vuln in root.findall('./' + schemas['finding_type_schema'], ns):
-            # todo: add condition for tag vs attribute; need flags in switch statement above
-            del wid_pieces_that_hit[:]
+    # 1. parse thru each finding in this xml looking for good wids
+    for finding in reader:
+        # 2. get relative path/filename, line number and function for this finding
+        file_path = finding.file_path
+        if file_path is None:
+            print('Hit Has No Path:', xml_path)
+            continue
 
-            # 2. get relative path/filename and line number for this row in this xml
+        # exclude support files
+        if not file_path.startswith('T/') and not file_path.startswith('F/'):
+            continue
+        line_number = finding.line_number
+        function_name = finding.function_name
 
-            try:
-                file_path = vuln.find(schemas['file_name_schema'], ns).attrib[schemas['file_name_attrib']]
-            except AttributeError:
-                print('Hit Has No Path:', xml_path)
-                continue
+        # 3. see if ALL of the pieces of the wid for this finding match an acceptable wid for this cwe
+        good_wids = wid_index.match(cwe_num, finding.wid_pieces)
+        if not good_wids:
+            continue
 
-            # exclude support files
-            if not file_path.startswith('T/') and not file_path.startswith('F/'):
-                continue
-            line_number = vuln.find(schemas['line_number_schema'], ns).attrib[schemas['line_number_attrib']]
-            function_name = vuln.find(schemas['function_name_schema'], ns).attrib[schemas['function_name_attrib']]
+        # this is a good wid so add it to the list if it is not already there
+        project_hits.add_used_wids(good_wids)
 
-            # 3. get all pieces of the wid for this row in the xml
-            for idx, weakness_id in enumerate(weakness_id_schemas):
-                wid_piece = vuln.find(weakness_id_schemas[idx], ns)
-                if wid_piece is not None:
-                    wid_pieces_that_hit.append(wid_piece.text)
+        test_case_name = get_test_case_name(file_path, test_case_type, tc_lang)
+        if test_case_name is None:
+            print('ERROR: NO TEST CASE NAME FOUND')
+            test_case_name = ''
 
-            # 4. look at each non-empty cell in the spreadsheet for acceptable wids
-            for good_wid in good_wids:
-                if tool_name == 'fortify':
-                    # split each wid based on it's delimiter
-                    good_wid_pieces = good_wid.split(WID_DELIMITER_FORTIFY)
-                else:
-                    good_wid_pieces = good_wid
-
-                # todo: 5/5/17 optimize, move on to next upon first blank cell in row
-                # 5. if the current cell in spreadsheet does not contain a cwe # or is blank, move on
-                if good_wid != 'None' and not good_wid.isdigit():
-                    # 6. see if ALL of the pieces for this row match this cell's good wid
-                    if set(wid_pieces_that_hit) != set(good_wid_pieces):
-                        continue
-                    else:
-                        # this is a good wid so add it to the list if it is not already there
-                        if good_wid not in used_wids:
-                            used_wids.append(good_wid)
-
-                        test_case_files.append([file_path, int(line_number)])
-
-                        if test_case_type == 'juliet':
-                            if suite_language == 'c':
-                                test_case_name = re.sub('[a-z]?\.\w+$', '', file_path)
-                                # reduce juliet function name to 'good ...' portion
-                                function_name = function_name.rpartition('_')[2]
-                            elif suite_language == 'cpp':
-                                test_case_name = re.sub('([a-z]?\.\w+$)|(_good.*)|(_bad.*)', '', file_path)
-                                # reduce juliet function name to 'good ...' portion
-                                if function_name == 'action':
-                                    function_name = file_path.rpartition('_')[2][:-4]
-                                else:
-                                    function_name = function_name.rpartition('_')[2]
-
-                        elif test_case_type == 'kdm':
-                            # todo: 5/5/17 reduce kdm name for display in ws3 (similar to juliet above)
-                            test_case_name = re.sub('[_a]?\.\w+$', '', file_path)
-                        else:
-                            print('ERROR: NO TEST CASE NAME FOUND')
-                            test_case_name = ''
-
-                        file_paths.append(file_path)
-
-                        if test_case_name not in test_cases:
-                            # create a new test case object
-                            new_tc_obj = TestCase(test_case_name, xml_project.tc_type, xml_project.true_false,
-                                                  suite_language)
-                            new_tc_obj.hit_data.append([file_path, line_number, function_name])
-                            test_case_objects.append(new_tc_obj)
-
-                            # add the new test case object to the xml project list
-                            setattr(xml_project, 'test_cases', test_case_objects)
-                            test_cases.append(test_case_name)
-                            # store the number of hits for this test case
-                            name = new_tc_obj.test_case_name
-                            suite_dat.suite_hit_data[name] = len(new_tc_obj.hit_data)
-
-                        else:  # todo: 5/3/17, consider using a dictionary here or default dict for speed
-                            # update existing test case object
-                            for test_case_object in test_case_objects:
-                                if test_case_object.test_case_name == test_case_name:
-                                    print('CPP_TEST_CASE_NAME_NOT_FIRST_OCCURRANCE________', test_case_name)
-                                    hit_data = getattr(test_case_object, 'hit_data')
-                                    hit_data.append([file_path, line_number, function_name])
-                                    # update the number of hits for this test case
-                                    name = test_case_object.test_case_name
-                                    suite_dat.suite_hit_data[name] = len(test_case_object.hit_data)
-                                    break
-
-                # empty acceptable wid cell on spreadsheet so move on
-                else:
-                    continue
+        if test_case_type == 'juliet':
+            # reduce juliet function name to 'good ...' portion
+            if tc_lang == 'cpp' and function_name == 'action':
+                function_name = file_path.rpartition('_')[2][:-4]
+            else:
+                function_name = function_name.rpartition('_')[2]
+        # todo: 5/5/17 reduce kdm name for display in ws3 (similar to juliet above)
 
-        if test_case_type == 'juliet' and xml_project.true_false == 'FALSE':
-            score = 0  # todo: 5/5/7 juliet/false will be calculated seperately
-            # score = calculate_juliet_false_xml_score(xml_project)
+        project_hits.add_hit(test_case_name, file_path, line_number, function_name, finding.wid_pieces)
 
-        else:
-            # juliet(true) and kdm counts, one hit per test case
-            score = len(set(test_cases))
+    if test_case_type == 'juliet' and xml_project.true_false == 'FALSE':
+        score = 0  # todo: 5/5/7 juliet/false will be calculated seperately
+        # score = calculate_juliet_false_xml_score(xml_project)
 
-        # store data for each xml project
-        setattr(xml_project, 'num_of_hits', score)
-        setattr(xml_project, 'used_wids', used_wids)
-        setattr(xml_project, 'test_case_files_that_hit', file_paths)
+    else:
+        # juliet(true) and kdm counts, one hit per test case
+        score = project_hits.get_test_case_count()
 
-        print('XML_PROJECT_NAME:', xml_project.new_xml_name, 'SCORE:', score)
+    return project_hits.get_project_score(score, reader.name_space)
 
 
 def calculate_test_case_score(test_case_obj):
     valid_hits = []
 
     for valid_hit_data in test_case_obj.hit_data:
-        valid_hits.append(valid_hit_data[2])
+        valid_hits.append(valid_hit_data.function_name)
     score = len(set(valid_hits))
     test_case_obj.score = score
 
@@ -278,7 +261,7 @@ def calculate_test_case_percent_hits(test_case_obj):
 
 def collect_hit_data(suite_dat):
     # file name, line number, and enclosing function
-    hit_data = []
+    hit_table = HitTable()
 
     # collect all valid hit data to be displayed
     for xml_project in suite_dat.xml_projects:
@@ -294,26 +277,14 @@ def collect_hit_data(suite_dat):
             # calculate the percent hits for this test case
             calculate_test_case_percent_hits(test_case_obj)
 
-            # build the columns for ws3
-            for data1 in test_case_obj.hit_data:
-                # A , B, C, D-F, G, H, I
-                hit_data_columns = [xml_project.cwe_id_padded] + \
-                                   [xml_project.tc_type] + \
-                                   [xml_project.true_false] + \
-                                   data1 + \
-                                   [test_case_obj.score] + \
-                                   [test_case_obj.opp_counts] + \
-                                   [str(round(test_case_obj.percent * 100, 1)) + ' %']
-                # J-M, opportunities
-                hit_data_columns.extend(test_case_obj.opp_names)
-                # add to composite list for writing to ws3
-                hit_data.append(hit_data_columns)
-
             # process only juliet, false
             if xml_project.tc_type == 'juliet' and xml_project.true_false == 'FALSE':
                 xml_project.num_of_hits += test_case_obj.score
                 xml_project.tc_count += test_case_obj.opp_counts
 
+        # add the hits to the columns for ws3
+        hit_table.add_project(xml_project)
+
         # todo: encapusalate with try/except block for divide by zero possibility (although unlikely to occur)
         # try:
         xml_project.percent_hits = str(round((xml_project.num_of_hits / xml_project.tc_count) * 100, 1)) + ' '
@@ -322,105 +293,62 @@ def collect_hit_data(suite_dat):
         print('Collecting Hit Data for:', xml_project.new_xml_name)
 
     # sort hits by file name and then line number
-    hit_data = sorted(hit_data, key=operator.itemgetter(3, 4))
+    hit_table.sort_by_file_and_line()
 
-    group_hit_data(suite_dat, hit_data)
+    return hit_table
 
 
-def group_hit_data(suite_dat, hit_data):
-    list_of_dicts = []
+def group_hit_data(suite_dat, hit_table):
+    suite_data.suite_hit_data_complete = hit_table
 
-    suite_data.suite_hit_data_complete = hit_data
-    good_data = []
-
-    # dedupe data
-    for hit_dat in suite_data.suite_hit_data_complete:
-        # only juliet/false have 'good...' opportunities
-        if hit_dat[1] == 'juliet' and hit_dat[2] == 'FALSE':
-            # good_data.append(hit_dat[:-7])
-            good_data.append(hit_dat)
-
-    good_data_unique = remove_dups(good_data)
-
-    for idx, data_unique in enumerate(good_data_unique):
-        # name of containing function
-        name = data_unique[5]
-        # score
-        hits = int(data_unique[6])
-        # opps
-        opps = int(data_unique[7])
-
-        list_of_dicts = update_list_of_dicts(list_of_dicts, name, hits, opps)
-
-    list_of_dicts = sorted(list_of_dicts, key=itemgetter('name'))
-
-    b2g_idx, b2g_row_start = 0, 0
-    g2b_idx, g2b_row_start = 0, 0
-    g2b_hits_total, b2g_hits_total = 0, 0
-    g2b_opps_total, b2g_opps_total = 0, 0
+    # per function and per group totals of the unique juliet/false hits ('good...' opportunities)
+    function_hits, groups = get_hit_analytics(hit_table)
+    # first row of each group in the sheet, 0 if the group is empty
+    b2g_row_start = groups['B2G'].first_row + 2 if groups['B2G'].num_of_rows else 0
+    g2b_row_start = groups['G2B'].first_row + 2 if groups['G2B'].num_of_rows else 0
+    b2g_idx = groups['B2G'].num_of_rows
+    g2b_idx = groups['G2B'].num_of_rows
 
     hit_analytics_titles = ['Encapsulating Function', 'Hits', 'Misses', 'Opps', '%-Hits', 'Group', 'HITS', 'OPPS',
                             '%-grp']
     for idx, title in enumerate(hit_analytics_titles):
         set_appearance(ws4, 1, idx + 1, 'fg_fill', 'C9C9C9')
         ws4.cell(row=1, column=idx + 1).value = title
-        ws4.cell(row=1, column=4).alignment = Alignment(horizontal='center')
+        ws4.cell(row=1, column=4).alignment = get_alignment(horizontal='center')
         if idx > 4:
-            ws4.cell(row=1, column=idx).alignment = Alignment(horizontal='center')
-            ws4.cell(row=2, column=idx).alignment = Alignment(horizontal='center')
-            ws4.cell(row=3, column=idx).alignment = Alignment(horizontal='center')
+            ws4.cell(row=1, column=idx).alignment = get_alignment(horizontal='center')
+            ws4.cell(row=2, column=idx).alignment = get_alignment(horizontal='center')
+            ws4.cell(row=3, column=idx).alignment = get_alignment(horizontal='center')
 
     # write to 'hit analytics' summary sheet
-    for idx, hits1 in enumerate(list_of_dicts):
-        if 'helperGood' in hits1['name']:
+    for idx, hits1 in enumerate(function_hits):
+        if 'helperGood' in hits1.name:
             # todo: log all of these and provide used more specifics w/ location, etc.
-            suite_data.manual_review_recommendataion = ' * Manual Review Required for ' + hits1['name']
+            suite_data.manual_review_recommendataion = ' * Manual Review Required for ' + hits1.name
 
         # write summary data
-        if hits1['opps'] == 0:
-            print('HITS_WITH_NO_OPPS_1', hits1['name'])
-            percent = 0
-        else:
-            percent = hits1['hits'] / hits1['opps'] * 100
-
-        misses = hits1['opps'] - hits1['hits']
-        ws4.cell(row=idx + 2, column=1).value = hits1['name']
-        ws4.cell(row=idx + 2, column=2).value = hits1['hits']
-        ws4.cell(row=idx + 2, column=3).value = misses
-        ws4.cell(row=idx + 2, column=4).value = hits1['opps']
-        ws4.cell(row=idx + 2, column=5).value = '%0.0f' % percent + '%'
-        ws4.cell(row=idx + 2, column=6).value = hits1['name']
-
-        # todo: 08312017
-        # get row indexing for B2G
-        if 'B2G' in hits1['name']:
-            if b2g_row_start == 0:
-                b2g_row_start = idx + 2
-
-            b2g_idx += 1
-            b2g_hits_total += hits1['hits']
-            b2g_opps_total += hits1['opps']
-            b2g_percent_total = b2g_hits_total / b2g_opps_total * 100
-            ws4.cell(row=b2g_row_start, column=7).value = b2g_hits_total
-            ws4.cell(row=b2g_row_start, column=8).value = b2g_opps_total
-            ws4.cell(row=b2g_row_start, column=9).value = '%0.0f' % b2g_percent_total + '%'
-
-        # get row indexing for G2B
-        elif 'G2B' in hits1['name']:
-            if g2b_row_start == 0:
-                g2b_row_start = idx + 2
-
-            g2b_idx += 1
-            g2b_hits_total += hits1['hits']
-            g2b_opps_total += hits1['opps']
-            g2b_percent_total = g2b_hits_total / g2b_opps_total * 100
-            ws4.cell(row=g2b_row_start, column=7).value = g2b_hits_total
-            ws4.cell(row=g2b_row_start, column=8).value = g2b_opps_total
-            ws4.cell(row=g2b_row_start, column=9).value = '%0.0f' % g2b_percent_total + '%'
-        else:
-            ws4.cell(row=idx + 2, column=7).value = hits1['hits']
-            ws4.cell(row=idx + 2, column=8).value = hits1['opps']
-            ws4.cell(row=idx + 2, column=9).value = '%0.0f' % percent + '%'
+        if hits1.opps == 0:
+            print('HITS_WITH_NO_OPPS_1', hits1.name)
+
+        ws4.cell(row=idx + 2, column=1).value = hits1.name
+        ws4.cell(row=idx + 2, column=2).value = hits1.hits
+        ws4.cell(row=idx + 2, column=3).value = hits1.misses
+        ws4.cell(row=idx + 2, column=4).value = hits1.opps
+        ws4.cell(row=idx + 2, column=5).value = '%0.0f' % hits1.percent + '%'
+        ws4.cell(row=idx + 2, column=6).value = hits1.name
+
+        # B2G and G2B functions share their group's totals, on the first row of the group
+        if get_hit_group(hits1.name) is None:
+            ws4.cell(row=idx + 2, column=7).value = hits1.hits
+            ws4.cell(row=idx + 2, column=8).value = hits1.opps
+            ws4.cell(row=idx + 2, column=9).value = '%0.0f' % hits1.percent + '%'
+
+    # write the group totals
+    for group, row_start in [('B2G', b2g_row_start), ('G2B', g2b_row_start)]:
+        if row_start:
+            ws4.cell(row=row_start, column=7).value = groups[group].hits
+            ws4.cell(row=row_start, column=8).value = groups[group].opps
+            ws4.cell(row=row_start, column=9).value = '%0.0f' % groups[group].percent + '%'
 
     # merge and align cells
     for col_idx, row in enumerate(hit_analytics_titles):
@@ -440,16 +368,16 @@ def group_hit_data(suite_dat, hit_data):
                             end_column=col_idx + 1)
             ws4.merge_cells(start_row=g2b_row_start, start_column=col_idx + 1, end_row=g2b_row_start + g2b_idx - 1,
                             end_column=col_idx + 1)
-            ws4.cell(row=b2g_row_start, column=col_idx + 1).alignment = Alignment(horizontal='center',
+            ws4.cell(row=b2g_row_start, column=col_idx + 1).alignment = get_alignment(horizontal='center',
                                                                                   vertical='center')
-            ws4.cell(row=g2b_row_start, column=col_idx + 1).alignment = Alignment(horizontal='center',
+            ws4.cell(row=g2b_row_start, column=col_idx + 1).alignment = get_alignment(horizontal='center',
                                                                                   vertical='center')
 
     # color cells
-    for idx, hits1 in enumerate(list_of_dicts):
-        ws4.cell(row=idx + 2, column=4).alignment = Alignment(horizontal='right', vertical='center')
-        ws4.cell(row=idx + 2, column=5).alignment = Alignment(horizontal='center', vertical='center')
-        ws4.cell(row=idx + 2, column=6).alignment = Alignment(horizontal='center', vertical='center')
+    for idx, hits1 in enumerate(function_hits):
+        ws4.cell(row=idx + 2, column=4).alignment = get_alignment(horizontal='right', vertical='center')
+        ws4.cell(row=idx + 2, column=5).alignment = get_alignment(horizontal='center', vertical='center')
+        ws4.cell(row=idx + 2, column=6).alignment = get_alignment(horizontal='center', vertical='center')
 
         for col_idx, val in enumerate(hit_analytics_titles):
             if col_idx == 1:  # hits
@@ -459,9 +387,9 @@ def group_hit_data(suite_dat, hit_data):
                 set_appearance(ws4, idx + 2, col_idx + 1, 'fg_fill', 'FCE4D6')  # light red
                 set_appearance(ws4, idx + 2, col_idx + 1, 'font_color', '990000')  # dark red
             else:
-                if 'B2G' in hits1['name']:
+                if get_hit_group(hits1.name) == 'B2G':
                     set_appearance(ws4, idx + 2, col_idx + 1, 'fg_fill', 'F2F2F2')  # light gray
-                elif 'G2B' in hits1['name']:
+                elif get_hit_group(hits1.name) == 'G2B':
                     set_appearance(ws4, idx + 2, col_idx + 1, 'fg_fill', 'D0CECE')  # dark gray
                 else:
                     set_appearance(ws4, idx + 2, col_idx + 1, 'fg_fill', 'FFFFFF')  # white
@@ -471,8 +399,18 @@ def group_hit_data(suite_dat, hit_data):
 
     create_hit_charts()
 
-    print('Writing hit data to sheet ... please stand by, thank you for your patience!')
-    write_hit_data(suite_dat, hit_data)
+    if hit_data_shard_format:
+        print('Sharding hit data to', hit_data_shard_path)
+        shard_hit_data(suite_dat, hit_table, hit_data_shard_path, hit_data_shard_format, hit_data_jobs)
+    elif hit_data_stream_path:
+        print('Streaming hit data to', hit_data_stream_path)
+        stream_hit_data(suite_dat, hit_table, hit_data_stream_path)
+    elif output_backend == 'xlsxwriter':
+        # the rows are written straight from the hit table when the scorecard is saved
+        print('Hit data will be written with the scorecard')
+    else:
+        print('Writing hit data to sheet ... please stand by, thank you for your patience!')
+        write_hit_data(suite_dat, hit_table)
 
 
 def create_hit_charts():
@@ -530,149 +468,324 @@ def create_hit_charts():
     ws4.add_chart(pie, 'A16')
 
 
-def update_list_of_dicts(list_data, name, hits, opps):
-    found = False
-    # update the dictionary if it already exists
-    if len(list_data) > 0:
-        for d in list_data:
-            if d['name'] == name:
-                d['hits'] += hits
-                d['opps'] += opps
-                found = True
-                break
-    # create new dictionary in the list if it does not exists
-    if not found:
-        list_data.append({'name': name, 'hits': hits, 'opps': opps})
-
-    return list_data
-
-
-def write_hit_data(suite_dat, hit_data):
-    row = 1
-    file_seen = set()
-    file_name_dups = []
-
+def write_hit_data(suite_dat, hit_table):
     # column alignments
     horizontal_left = [4]
     horizontal_right = [9]
 
-    for hit in hit_data:
-        col = 1
-        for cell in hit:
+    for idx, hit in enumerate(hit_table.rows()):
+        row = idx + 2
+        for col, cell in enumerate(hit, 1):
             # write hit data to cells in ws3
-            ws3.cell(row=row + 1, column=col).value = cell
+            ws3.cell(row=row, column=col).value = cell
 
             # set the alignment based on column
             if col in horizontal_right:
-                ws3.cell(row=row + 1, column=col).alignment = Alignment(horizontal='right', vertical='center')
+                ws3.cell(row=row, column=col).alignment = get_alignment(horizontal='right', vertical='center')
             elif col not in horizontal_left:
-                ws3.cell(row=row + 1, column=col).alignment = Alignment(horizontal='center', vertical='center')
+                ws3.cell(row=row, column=col).alignment = get_alignment(horizontal='center', vertical='center')
 
             # put border around non-opp cells; they will be formated later
-            if col < 10:
-                set_appearance(ws3, row + 1, col, 'fg_fill', 'FFFFFF')  # white
+            if col < 10 and not use_conditional_formats:
+                set_appearance(ws3, row, col, 'fg_fill', 'FFFFFF')  # white
 
-            col += 1
+    # identify the duplicate files
+    duplicate_file_ids = hit_table.get_duplicate_file_ids()
+    suite_dat.duplicate_file_name_hits.update(hit_table.files[file_id] for file_id in duplicate_file_ids)
 
-        # identify the duplicate files #todo: maybe do this when they come in? are they in order though?
-        if hit[3] in file_seen:
-            file_name_dups.append(hit[3])
-            suite_dat.duplicate_file_name_hits.add(hit[3])
+    if use_conditional_formats:
+        merge_hit_groups(hit_table)
+        add_hit_data_rules(hit_table)
+    else:
+        format_hit_data(suite_dat, hit_table, duplicate_file_ids)
+
+
+def merge_hit_groups(hit_table):
+    # todo: 5/4/17 skip merge if group size=1?
+    # merge cells into test case groups
+    for first_idx, group_size in hit_table.get_test_case_groups():
+        start = first_idx + 2
+        end = start + group_size - 1
+        for i in range(7, 14):
+            ws3.merge_cells(start_row=start, start_column=i, end_row=end, end_column=i)
+
+
+def add_hit_data_rules(hit_table):
+    """
+    Colors 'Hit Data' with conditional formatting rules over whole ranges, the same colors format_hit_data
+    gives each cell.  The rows are sorted by file name and line, so repeats of a file (and line) are always
+    next to each other.
+    """
+    last_row = len(hit_table) + 1
+    group_size_col = column_index_from_string(HIT_SHEET_GROUP_SIZE_COL)
+    count_col = column_index_from_string(HIT_SHEET_COUNT_COL)
+    opp_count_col = column_index_from_string(HIT_SHEET_OPP_COUNT_COL)
+
+    # helper columns for the rules; empty opp names are written as blank cells, so those test cases get their
+    # opps counted
+    for first_idx, group_size in hit_table.get_test_case_groups():
+        ws3.cell(row=first_idx + 2, column=group_size_col).value = group_size
+        opp_names = hit_table.get_opp_names(first_idx)[:4]
+        if not all(opp_names):
+            ws3.cell(row=first_idx + 2, column=opp_count_col).value = len(opp_names)
+    for idx, count in enumerate(hit_table.counts):
+        if count > 1:
+            ws3.cell(row=idx + 2, column=count_col).value = count
+    for col_id in [HIT_SHEET_GROUP_SIZE_COL, HIT_SHEET_COUNT_COL, HIT_SHEET_OPP_COUNT_COL]:
+        ws3.column_dimensions[col_id].hidden = True
+
+    # rules are added highest priority first
+    hit_range = 'A2:I' + str(last_row)
+    # yellow - repeat file name and line, or duplicate findings merged into this hit
+    ws3.conditional_formatting.add(hit_range, FormulaRule(
+        formula=['OR(AND($D2=$D1,$E2=$E1),AND($D2=$D3,$E2=$E3),$' + HIT_SHEET_COUNT_COL + '2>1)'],
+        fill=get_rule_fill('FFD966')))
+    # blue - unique file name and line number in a file that is hit more than once
+    ws3.conditional_formatting.add(hit_range, FormulaRule(formula=['OR($D2=$D1,$D2=$D3)'],
+                                                          fill=get_rule_fill('BDD7EE')))
+    ws3.conditional_formatting.add(hit_range, FormulaRule(formula=['TRUE'], border=get_border()))
+
+    # opportunities; the merged opp cells are evaluated on the first row of the test case
+    opp_range = 'J2:M' + str(last_row)
+    group_functions = '$F2:INDEX($F:$F,ROW()+$' + HIT_SHEET_GROUP_SIZE_COL + '2-1)'
+    # no opp = gray
+    ws3.conditional_formatting.add(opp_range, FormulaRule(formula=['AND(COLUMN(J2)-9<=$' + HIT_SHEET_OPP_COUNT_COL +
+                                                                   '2,LEN(J2)=0)'],
+                                                          fill=get_rule_fill('D9D9D9'), border=get_border()))
+    # opp found in an enclosing function of the test case = green
+    ws3.conditional_formatting.add(opp_range, FormulaRule(
+        formula=['AND(LEN(J2)>0,COUNTIF(' + group_functions + ',"*"&J2&"*")>0)'],
+        fill=get_rule_fill('A9D08E'), border=get_border()))
+    # opp not found = red
+    ws3.conditional_formatting.add(opp_range, FormulaRule(formula=['LEN(J2)>0'], fill=get_rule_fill('FFC7CE'),
+                                                          border=get_border()))
+
+
+def get_opp_colors(hit_table, first_idx, group_size):
+    # color of each of the (up to four) opportunities of a test case group; used(green), unused(red) or none(gray)
+    # enclosing functions hit in this test case
+    group_functions = [hit_table.functions[hit_table.function_ids[idx]] for idx in
+                       range(first_idx, first_idx + group_size)]
+
+    opp_colors = []
+    for item in hit_table.get_opp_names(first_idx)[:4]:
+        if not len(item):
+            # no opp = gray
+            opp_colors.append('D9D9D9')
+        elif any(item in function_name for function_name in group_functions):
+            # opp found = green
+            opp_colors.append('A9D08E')
         else:
-            file_seen.add(hit[3])
+            # opp not found = red
+            opp_colors.append('FFC7CE')
+    return opp_colors
 
-        row += 1
 
-    # format_hit_data(suite_dat, hit_data, file_name_dups)
-    format_hit_data(suite_dat, hit_data)
+def get_hit_row_colors(hit_table, duplicate_file_ids):
+    # final fill of the non-opp cells of each row
+    row_colors = ['FFFFFF'] * len(hit_table)  # white
 
+    for idx in range(len(hit_table)):
+        if hit_table.file_ids[idx] in duplicate_file_ids:
+            if hit_table.is_repeat_of_previous(idx):
+                #  yellow - repeat file name and line
+                #  previous sorted file name and line are identical to this hit
+                row_colors[idx] = 'FFD966'
+                row_colors[idx - 1] = 'FFD966'
+            elif hit_table.counts[idx] > 1:
+                #  yellow - duplicate findings merged into this hit repeat its file name and line
+                row_colors[idx] = 'FFD966'
+            else:
+                # blue - unique file name and line number
+                row_colors[idx] = 'BDD7EE'
+    return row_colors
 
-def get_test_case_name(hit_data):
-    test_case_type = hit_data[1]
-    file_name = hit_data[3]
 
-    test_case_name = 'TEST_CASE_NAME_NOT_FOUND'
+def format_hit_data(suite_dat, hit_table, duplicate_file_ids):
+    merge_hit_groups(hit_table)
 
-    if test_case_type == 'juliet':
-        if suite_language == 'c':
-            test_case_name = re.sub('[a-z]?\.\w+$', '', file_name)
-        elif suite_language == 'cpp':
-            test_case_name = re.sub('([a-z]?\.\w+$)|(_good.*)|(_bad.*)', '', file_name)
-            # test_case_name = re.sub('([a-z]?\.\w+$)', '', file_name)
-        else:
-            print('ERROR_COULD_NOT_FIND_LANG')
-    elif test_case_type == 'kdm':
-        test_case_name = re.sub('[_a]?\.\w+$', '', file_name)
+    # color opportunities used(green), unused(red) or none(gray)
+    for first_idx, group_size in hit_table.get_test_case_groups():
+        start = first_idx + 2
+        end = start + group_size - 1
+
+        # look thru all four possible opportunities
+        for idx1, color in enumerate(get_opp_colors(hit_table, first_idx, group_size)):
+            for a in range(start, end + 1):
+                set_appearance(ws3, a, idx1 + 10, 'fg_fill', color)
+
+    # the rows are already white
+    for idx, color in enumerate(get_hit_row_colors(hit_table, duplicate_file_ids)):
+        if color != 'FFFFFF':
+            for col in range(1, 10):
+                set_appearance(ws3, idx + 2, col, 'fg_fill', color)
+
+
+def get_hit_cell(ws, value, style_cells, fill_color, alignment):
+    """
+    Returns a styled cell for a write-only sheet.  Assigning style objects hashes them on every cell, so
+    cells with the same fill and alignment (horizontal, vertical) copy the style of a template cell in
+    style_cells instead.
+    """
+    template = style_cells.get((fill_color, alignment))
+    if template is None:
+        template = style_cells[(fill_color, alignment)] = WriteOnlyCell(ws)
+        if fill_color is not None:
+            template.fill = get_fill(fill_color)
+            template.border = get_border()
+        if alignment is not None:
+            template.alignment = get_alignment(*alignment)
+
+    cell = WriteOnlyCell(ws, value=value)
+    cell._style = copy.copy(template._style)
+    return cell
+
+
+def stream_hit_data(suite_dat, hit_table, hit_data_path):
+    # identify the duplicate files
+    duplicate_file_ids = hit_table.get_duplicate_file_ids()
+    suite_dat.duplicate_file_name_hits.update(hit_table.files[file_id] for file_id in duplicate_file_ids)
+
+    write_hit_data_workbook(hit_table, duplicate_file_ids, hit_data_path)
+
+    # point to the streamed sheet from the scorecard
+    ws3.cell(row=2, column=1).value = 'Hit data is in ' + os.path.basename(hit_data_path)
+
+
+def write_hit_data_workbook(hit_table, duplicate_file_ids, hit_data_path):
+    """
+    Writes the 'Hit Data' sheet to its own write-only workbook in one pass.  The colors of every row are
+    worked out before the first row is written, so each row is streamed with its final values and styles
+    and no cells are kept in memory.
+    """
+    row_colors = get_hit_row_colors(hit_table, duplicate_file_ids)
+
+    # the sheet layout has to be set before any rows are written
+    stream_wb = Workbook(write_only=True)
+    ws = stream_wb.create_sheet('Hit Data')
+    for col_id, col_width in HIT_SHEET_COL_WIDTHS:
+        ws.column_dimensions[col_id].width = col_width
+    ws.sheet_view.zoomScale = 70
+    ws.sheet_view.showGridLines = False
+    ws.freeze_panes = 'A2'
+
+    # column titles
+    style_cells = {}
+    ws.append([get_hit_cell(ws, title, style_cells, 'C9C9C9', ('center', None)) for title in HIT_SHEET_TITLES])
+    ws.merged_cells.add('J1:M1')
+
+    # column alignments
+    right = ('right', 'center')
+    center = ('center', 'center')
+    alignments = [center, center, center, None, center, center, center, center, right]
+
+    for first_idx, group_size in hit_table.get_test_case_groups():
+        opp_colors = get_opp_colors(hit_table, first_idx, group_size)
+
+        for idx in range(first_idx, first_idx + group_size):
+            hit = hit_table.get_row(idx)
+            cells = []
+            for col, value in enumerate(hit, 1):
+                # test case columns are not merged (merged ranges are held until the sheet is saved), their
+                # values are only in the first row of the group
+                if 6 < col < 14 and idx != first_idx:
+                    value = None
+                if col < 10:
+                    cells.append(get_hit_cell(ws, value, style_cells, row_colors[idx], alignments[col - 1]))
+                else:
+                    opp_color = opp_colors[col - 10] if col - 10 < len(opp_colors) else None
+                    cells.append(get_hit_cell(ws, value, style_cells, opp_color, center))
+            ws.append(cells)
+
+    stream_wb.save(hit_data_path)
+
+
+def write_hit_data_csv(hit_table, hit_data_path):
+    # one gzipped csv row per hit, every column filled in and no colors
+    with gzip.open(hit_data_path, 'wt', newline='') as csv_file:
+        writer = csv.writer(csv_file)
+        writer.writerow(HIT_SHEET_TITLES)
+        writer.writerows(hit_table.rows())
+
+
+def write_hit_shard(hit_table, duplicate_file_names, shard_path):
+    # runs in a worker process, so it only uses its arguments
+    if shard_path.endswith('.csv.gz'):
+        write_hit_data_csv(hit_table, shard_path)
+    else:
+        write_hit_data_workbook(hit_table, set(hit_table.files.ids[file_name] for file_name in duplicate_file_names),
+                                shard_path)
+    return shard_path
+
+
+def shard_hit_data(suite_dat, hit_table, shard_path, shard_format, jobs=1):
+    """
+    Writes the hits of each cwe to a file of its own in shard_path ('xlsx' workbooks streamed like
+    stream_hit_data, or gzipped 'csv' files) and turns the 'Hit Data' sheet into an index linking to them.
+    Each shard is cut out of the hit table as it is handed to its writer; with jobs > 1 the shards are
+    written in worker processes.
+    """
+    # identify the duplicate files
+    duplicate_file_ids = hit_table.get_duplicate_file_ids()
+    duplicate_file_names = set(hit_table.files[file_id] for file_id in duplicate_file_ids)
+    suite_dat.duplicate_file_name_hits.update(duplicate_file_names)
+
+    os.makedirs(shard_path, exist_ok=True)
+    extension = '.csv.gz' if shard_format == 'csv' else '.xlsx'
+    shards = get_hit_shards(hit_table, duplicate_file_names, shard_path, extension)
+
+    # (cwe, part, hits, test cases, file name) of each shard, in index order
+    index_rows = []
+    if jobs > 1:
+        with concurrent.futures.ProcessPoolExecutor(max_workers=jobs) as executor:
+            futures = []
+            for index_row, shard_args in shards:
+                futures.append(executor.submit(write_hit_shard, *shard_args))
+                index_rows.append(index_row)
+            # raises the error of any shard that failed
+            for future in futures:
+                future.result()
     else:
-        print('ERROR_COULD_NOT_FIND_TYPE', test_case_type)
+        for index_row, shard_args in shards:
+            write_hit_shard(*shard_args)
+            index_rows.append(index_row)
 
-    return test_case_name
+    write_hit_shard_index(index_rows, os.path.basename(shard_path))
 
 
-def format_hit_data(suite_dat, hit_data):
-    row = 1
-    start = 0
-    group_size = 0
-    next_group_idx = 0
-    found_ops_in_group = []
-    previous_file_name_and_line = []
+def get_hit_shards(hit_table, duplicate_file_names, shard_path, extension):
+    # yields the index row and write_hit_shard arguments of each shard, cutting its rows out of the table
+    shards = hit_table.get_shards(HIT_SHARD_MAX_ROWS)
+    part_counts = {}
+    for cwe, _ in shards:
+        part_counts[cwe] = part_counts.get(cwe, 0) + 1
 
-    # color opportunities used(green), unused(red) or none(gray)
-    for idx, hit in enumerate(hit_data):
-        if idx == next_group_idx:
-            found_ops_in_group = hit[9:13]
-            test_case_name = get_test_case_name(hit)
-
-            # a.
-            group_size = suite_dat.suite_hit_data[test_case_name]
-            # b.
-            start = (idx + 2)
-            # c.
-            end = (idx + 2) + group_size - 1
-            # d.
-            next_group_idx = idx + group_size
-
-            # todo: 5/4/17 skip merge if group size=1?
-            # merge cells into test case groups
-            for i in range(7, 14):
-                ws3.merge_cells(start_row=start, start_column=i, end_row=end, end_column=i)
-
-            # look thru all four possible opportunities
-            for idx1, item in enumerate(found_ops_in_group):
-                # opp not found = red
-                for a in range(start, start + group_size):
-                    set_appearance(ws3, a, idx1 + 10, 'fg_fill', 'FFC7CE')  # red
-                # no opp = gray
-                if not len(item):
-                    for a in range(start, start + group_size):
-                        set_appearance(ws3, a, idx1 + 10, 'fg_fill', 'D9D9D9')  # gray
-        # opp found = green
-        for idx1, item in enumerate(found_ops_in_group):
-            if item in hit[5] and len(item) > 0:
-                for a in range(start, start + group_size):
-                    set_appearance(ws3, a, idx1 + 10, 'fg_fill', 'A9D08E')  # green
-
-        # todo: 5/23/7 this needs optimized
-        if hit[3] in suite_dat.duplicate_file_name_hits:
-            if previous_file_name_and_line == list(hit[3:5]):
-                #  yellow - repeat file name and line
-                #  previous sorted file name and line are identical to this hit
-                for hit_idx, item in enumerate(hit):
-                    if hit_idx < 9:
-                        # adjust current row
-                        set_appearance(ws3, row + 1, hit_idx + 1, 'fg_fill', 'FFD966')  # yellow
-                        # adjust previous row
-                        set_appearance(ws3, row, hit_idx + 1, 'fg_fill', 'FFD966')  # yellow
-            else:
-                # blue - unique file name and line number
-                for hit_idx, item in enumerate(hit):
-                    if hit_idx < 9:
-                        # adjust current row
-                        set_appearance(ws3, row + 1, hit_idx + 1, 'fg_fill', 'BDD7EE')  # light blue
+    parts = {}
+    for cwe, rows in shards:
+        parts[cwe] = parts.get(cwe, 0) + 1
+        file_name = cwe + ('_part' + str(parts[cwe]) if part_counts[cwe] > 1 else '') + extension
 
-            previous_file_name_and_line = list(hit[3:5])
+        sub_table = hit_table.get_sub_table(rows)
+        shard_duplicate_file_names = [name for name in sub_table.files.strings if name in duplicate_file_names]
+        yield ((cwe, parts[cwe], len(sub_table), len(sub_table.test_cases), file_name),
+               (sub_table, shard_duplicate_file_names, os.path.join(shard_path, file_name)))
 
-        row += 1
+
+def write_hit_shard_index(index_rows, shard_dir):
+    # one row per shard, linked to its file relative to the scorecard
+    for idx, index_row in enumerate(index_rows):
+        row = idx + 2
+        for col, value in enumerate(index_row, 1):
+            cell = ws3.cell(row=row, column=col)
+            cell.value = value
+            if col < len(index_row):
+                cell.alignment = get_alignment(horizontal='center', vertical='center')
+                cell.number_format = '#,##0'
+            set_appearance(ws3, row, col, 'fg_fill', 'FFFFFF')  # white
+
+        link_cell = ws3.cell(row=row, column=len(index_row))
+        link_cell.hyperlink = os.path.join(shard_dir, link_cell.value)
+        link_cell.font = get_font('0563C1')  # hyperlink blue
 
 
 def import_xml_tags(suite_dat):
@@ -694,14 +807,6 @@ def import_xml_tags(suite_dat):
     setattr(suite_dat, 'tag_info', tag_ids)
 
 
-def remove_dups(d):
-    new_d = []
-    for x in d:
-        if x not in new_d:
-            new_d.append(x)
-    return new_d
-
-
 def write_xml_data(suite_data_details):
     #########################################################################################################
     detail_sheet_titles = ['CWE', 'Type', 'T/F', 'TC', 'Hits', '%Hits', 'XML', 'TC Path', 'RAW Project File']
@@ -715,7 +820,7 @@ def write_xml_data(suite_data_details):
     for idx, title in enumerate(detail_sheet_titles):
         set_appearance(ws2, row, idx + 1, 'fg_fill', 'C9C9C9')
         ws2.cell(row=1, column=idx + 1).value = title
-        ws2.cell(row=1, column=idx + 1).alignment = Alignment(horizontal='center')
+        ws2.cell(row=1, column=idx + 1).alignment = get_alignment(horizontal='center')
 
     # write xml data
     for j, attrib in enumerate(attribute_list):
@@ -723,50 +828,80 @@ def write_xml_data(suite_data_details):
             # juliet or kdm
             tc_attrib = getattr(suite_data_details.xml_projects[i], attrib)
 
-            # set colors for false
-            if suite_data_details.xml_projects[i].true_false == 'FALSE':
-                if suite_data_details.xml_projects[i].num_of_hits > 0:
-                    # red
-                    set_appearance(ws2, i + 2, 5, 'font_color', 'C00000')
-                    set_appearance(ws2, i + 2, 6, 'font_color', 'C00000')
-                    set_appearance(ws2, i + 2, j + 1, 'fg_fill', 'FFC7CE')
-                else:
-                    # green font, white fill
-                    set_appearance(ws2, i + 2, 5, 'font_color', '548235')
-                    set_appearance(ws2, i + 2, 6, 'font_color', '548235')
-                    set_appearance(ws2, i + 2, j + 1, 'fg_fill', 'FFFFFF')
-
-                # highlight juliet/false test cases as opp counts (vs. TC)
-                if suite_data_details.xml_projects[i].tc_type == 'juliet':
-                    set_appearance(ws2, i + 2, 4, 'font_color', '0000FF')
-            else:
-                # set colors for true
-                if suite_data_details.xml_projects[i].num_of_hits > 0:
-                    # green font, white fill
-                    set_appearance(ws2, i + 2, 5, 'font_color', '548235')
-                    set_appearance(ws2, i + 2, 6, 'font_color', '548235')
-                    set_appearance(ws2, i + 2, j + 1, 'fg_fill', 'FFFFFF')
-                else:
-                    # red
-                    set_appearance(ws2, i + 2, 5, 'font_color', 'C00000')
-                    set_appearance(ws2, i + 2, 6, 'font_color', 'C00000')
-                    set_appearance(ws2, i + 2, j + 1, 'fg_fill', 'FFC7CE')
+            # colored by conditional formatting rules instead
+            if not use_conditional_formats:
+                color_xml_data_cell(suite_data_details.xml_projects[i], i + 2, j + 1)
 
             # write data to cells
             ws2.cell(row=i + 2, column=j + 1).value = tc_attrib
 
             # set fill color for col=1 and rows for hits=0
-            if j == 0:
+            if j == 0 and not use_conditional_formats:
                 # dark gray
                 set_appearance(ws2, i + 2, j + 1, 'fg_fill', 'C6C6C6')
 
             # align columns
             if j == 1 or j == 2:
-                ws2.cell(row=i + 2, column=j + 1).alignment = Alignment(horizontal='center')
+                ws2.cell(row=i + 2, column=j + 1).alignment = get_alignment(horizontal='center')
             elif j == 6 or j == 7 or j == 8:
-                ws2.cell(row=i + 2, column=j + 1).alignment = Alignment(horizontal='left')
+                ws2.cell(row=i + 2, column=j + 1).alignment = get_alignment(horizontal='left')
             else:
-                ws2.cell(row=i + 2, column=j + 1).alignment = Alignment(horizontal='right')
+                ws2.cell(row=i + 2, column=j + 1).alignment = get_alignment(horizontal='right')
+
+    if use_conditional_formats:
+        add_xml_data_rules(len(suite_data_details.xml_projects) + 1)
+
+
+def color_xml_data_cell(xml_project, row, col):
+    # set colors for false
+    if xml_project.true_false == 'FALSE':
+        if xml_project.num_of_hits > 0:
+            # red
+            set_appearance(ws2, row, 5, 'font_color', 'C00000')
+            set_appearance(ws2, row, 6, 'font_color', 'C00000')
+            set_appearance(ws2, row, col, 'fg_fill', 'FFC7CE')
+        else:
+            # green font, white fill
+            set_appearance(ws2, row, 5, 'font_color', '548235')
+            set_appearance(ws2, row, 6, 'font_color', '548235')
+            set_appearance(ws2, row, col, 'fg_fill', 'FFFFFF')
+
+        # highlight juliet/false test cases as opp counts (vs. TC)
+        if xml_project.tc_type == 'juliet':
+            set_appearance(ws2, row, 4, 'font_color', '0000FF')
+    else:
+        # set colors for true
+        if xml_project.num_of_hits > 0:
+            # green font, white fill
+            set_appearance(ws2, row, 5, 'font_color', '548235')
+            set_appearance(ws2, row, 6, 'font_color', '548235')
+            set_appearance(ws2, row, col, 'fg_fill', 'FFFFFF')
+        else:
+            # red
+            set_appearance(ws2, row, 5, 'font_color', 'C00000')
+            set_appearance(ws2, row, 6, 'font_color', 'C00000')
+            set_appearance(ws2, row, col, 'fg_fill', 'FFC7CE')
+
+
+def add_xml_data_rules(last_row):
+    # the colors write_xml_data gives each cell, as conditional formatting rules (highest priority first)
+    # false with hits, or true without hits
+    missed = 'OR(AND($C2="FALSE",$E2>0),AND($C2<>"FALSE",$E2=0))'
+
+    # dark gray
+    ws2.conditional_formatting.add('A2:A' + str(last_row), FormulaRule(formula=['TRUE'],
+                                                                       fill=get_rule_fill('C6C6C6')))
+    # red
+    ws2.conditional_formatting.add('A2:I' + str(last_row), FormulaRule(formula=[missed],
+                                                                       fill=get_rule_fill('FFC7CE')))
+    ws2.conditional_formatting.add('E2:F' + str(last_row), FormulaRule(formula=[missed],
+                                                                       font=get_font('C00000')))
+    # green
+    ws2.conditional_formatting.add('E2:F' + str(last_row), FormulaRule(formula=['TRUE'], font=get_font('548235')))
+    # highlight juliet/false test cases as opp counts (vs. TC)
+    ws2.conditional_formatting.add('D2:D' + str(last_row), FormulaRule(formula=['AND($C2="FALSE",$B2="juliet")'],
+                                                                       font=get_font('0000FF')))
+    ws2.conditional_formatting.add('A2:I' + str(last_row), FormulaRule(formula=['TRUE'], border=get_border()))
 
 
 def write_summary_data(scan_data, ws):
@@ -775,84 +910,48 @@ def write_summary_data(scan_data, ws):
     #########################################################################################################
 
     row = 1
-    cwes = []
-
-    # set all totals to zero
-    suite_data.clear_totals()
 
     # write column headers
     for idx, title in enumerate(summary_sheet_titles):
         set_appearance(ws, row, idx + 1, 'fg_fill', 'E6B8B7')
         ws.cell(row=1, column=idx + 1).value = title
-        ws.cell(row=1, column=idx + 1).alignment = Alignment(horizontal='center')
-
-    for xml_project in scan_data.xml_projects:
-        cwes.append(getattr(xml_project, 'cwe_id_padded'))
-
-    unique_cwes = list(set(cwes))
-    unique_cwes.sort()
-
-    # collect data for each cwe and summarize
-    for cwe in unique_cwes:
-        suite_data.unique_cwes.append(cwe)
+        ws.cell(row=1, column=idx + 1).alignment = get_alignment(horizontal='center')
 
-        tc_t = tc_f = tp = fp = 0
+    # one row per cwe, from the totals shared by both sheets
+    for cwe_totals in scan_data.summary_table.cwes:
+        cwe = cwe_totals.cwe
         row += 1
 
-        # tally up the results from each xml project
-        for xml_project in scan_data.xml_projects:
-            if cwe == getattr(xml_project, 'cwe_id_padded'):
-                if 'TRUE' == getattr(xml_project, 'true_false'):
-                    tc_t += getattr(xml_project, 'tc_count')
-                    tp += getattr(xml_project, 'num_of_hits')
-                elif 'FALSE' == getattr(xml_project, 'true_false'):
-                    tc_f += getattr(xml_project, 'tc_count')
-                    fp += getattr(xml_project, 'num_of_hits')
-                    # todo: add break or continue to speed this up?
-
-        # for row1 in ws.iter_rows('A1:C2'):
-        for row1 in ws.iter_rows():
-            for cell in row1:
-                if 1 < cell.col_idx < 9:
-                    # highlight if no wid for this cwe
-                    if all(x == 'None' for x in suite_data.acceptable_weakness_ids_full_list_dict[cwe]):
-                        # light blue, no wid provided
-                        set_appearance(ws, row, cell.col_idx, 'fg_fill', 'D6DCE4')
-                    elif tp == 0:
-                        # light gray, had at least one wid privided for the cwe, but no hits
-                        set_appearance(ws, row, cell.col_idx, 'fg_fill', 'F2F2F2')
-                    else:
-                        set_appearance(ws, row, cell.col_idx, 'fg_fill', 'FFFFFF')
-
-                    ws.cell(row=row, column=cell.col_idx).alignment = Alignment(horizontal='right')
+        # style only the cells of this row
+        if all(x == 'None' for x in suite_data.acceptable_weakness_ids_full_list_dict[cwe]):
+            # light blue, no wid provided
+            fill_color = 'D6DCE4'
+        elif cwe_totals.tp == 0:
+            # light gray, had at least one wid privided for the cwe, but no hits
+            fill_color = 'F2F2F2'
+        else:
+            fill_color = 'FFFFFF'
+        for col in range(2, len(summary_sheet_titles) + 1):
+            set_appearance(ws, row, col, 'fg_fill', fill_color)
+            ws.cell(row=row, column=col).alignment = get_alignment(horizontal='right')
 
         set_appearance(ws, row, 1, 'fg_fill', 'C6C6C6')
 
         # precision
-        if tp + fp != 0:
-            prec = tp / (tp + fp)
-            ws.cell(row=row, column=6).value = round(prec, 2)
+        if cwe_totals.precision is not None:
+            ws.cell(row=row, column=6).value = round(cwe_totals.precision, 2)
             ws.cell(row=row, column=6).number_format = '0.00'
         else:
             ws.cell(row=row, column=6).value = 'N/A'
-            ws.cell(row=row, column=6).alignment = Alignment(horizontal='right')
-
-        # recall
-        recall = tp / tc_t
+            ws.cell(row=row, column=6).alignment = get_alignment(horizontal='right')
 
         # write cwe values to sheet
         ws.cell(row=row, column=1).value = cwe
-        ws.cell(row=row, column=2).value = tc_t
-        ws.cell(row=row, column=3).value = tc_f
-        ws.cell(row=row, column=4).value = tp
-        ws.cell(row=row, column=5).value = fp
-        ws.cell(row=row, column=7).value = recall
-        # update totals
-        suite_data.suite_tc_count_true += tc_t
-        suite_data.suite_tc_count_false += tc_f
-        suite_data.suite_tp_count += tp
-        suite_data.suite_fp_count += fp
-        suite_data.suite_cwe_count = row - 1
+        ws.cell(row=row, column=2).value = cwe_totals.tc_true
+        ws.cell(row=row, column=3).value = cwe_totals.tc_false
+        ws.cell(row=row, column=4).value = cwe_totals.tp
+        ws.cell(row=row, column=5).value = cwe_totals.fp
+        ws.cell(row=row, column=7).value = cwe_totals.recall
 
         # apply format
         for col in range(2, 5):
@@ -869,37 +968,36 @@ def write_summary_data(scan_data, ws):
     if ws == ws5:
         # append columns to the right of current data
         # write_unweighted_averages(suite_data, ws)
-        write_weighted_averages(ws)
-        write_averages_to_summary_sheet()
+        write_weighted_averages(ws, scan_data.metrics)
+        write_averages_to_summary_sheet(scan_data.summary_table)
         write_score_and_message_to_score_sheet(suite_data, ws)
 
     # write totals
-    ws.cell(row=row + 1, column=2).value = suite_data.suite_tc_count_true
-    ws.cell(row=row + 1, column=3).value = suite_data.suite_tc_count_false
-    ws.cell(row=row + 1, column=4).value = suite_data.suite_tp_count
-    ws.cell(row=row + 1, column=5).value = suite_data.suite_fp_count
+    ws.cell(row=row + 1, column=2).value = scan_data.summary_table.tc_true
+    ws.cell(row=row + 1, column=3).value = scan_data.summary_table.tc_false
+    ws.cell(row=row + 1, column=4).value = scan_data.summary_table.tp
+    ws.cell(row=row + 1, column=5).value = scan_data.summary_table.fp
     for col in range(2, 6):
         ws.cell(row=row + 1, column=col).number_format = '#,##0'
         set_appearance(ws, row + 1, col, 'font_color', '0000FF')  # blue
 
 
-def write_averages_to_summary_sheet():
+def write_averages_to_summary_sheet(summary_table):
     # write helper col headers
     set_appearance(ws1, 1, 29, 'fg_fill', 'FFFFFF')
     set_appearance(ws1, 1, 30, 'fg_fill', 'FFFFFF')
     ws1.cell(row=1, column=29).value = 'Pavg= ' + '%0.2f' % suite_data.precision_average_unweighted
     ws1.cell(row=1, column=30).value = 'Ravg= ' + '%0.2f' % suite_data.recall_average_unweighted
 
-    # write helper col p and r averages
-    for row in ws1.iter_rows():
-        if row[0].value is not None and row[0].row > 1:
-            ws1.cell(row=row[0].row, column=29).value = suite_data.precision_average_unweighted
-            set_appearance(ws1, row[0].row, 29, 'font_color', 'FFFFFF', False)
-            ws1.cell(row=row[0].row, column=30).value = suite_data.recall_average_unweighted
-            set_appearance(ws1, row[0].row, 30, 'font_color', 'FFFFFF', False)
+    # write helper col p and r averages, on each cwe row
+    for row in range(2, len(summary_table) + 2):
+        ws1.cell(row=row, column=29).value = suite_data.precision_average_unweighted
+        set_appearance(ws1, row, 29, 'font_color', 'FFFFFF', False)
+        ws1.cell(row=row, column=30).value = suite_data.recall_average_unweighted
+        set_appearance(ws1, row, 30, 'font_color', 'FFFFFF', False)
 
 
-def write_weighted_averages(ws):
+def write_weighted_averages(ws, suite_metrics):
     #########################################################################################
     score_sheet_titles_addendum = ['P-Wt.', 'P-Final', 'P-Avg', 'R-Wt.', 'R-Final', 'R-Avg.']
     #########################################################################################
@@ -912,209 +1010,89 @@ def write_weighted_averages(ws):
         idx += offset
         set_appearance(ws, row, idx + 1, 'fg_fill', 'E6B8B7')
         ws.cell(row=1, column=idx + 1).value = title
-        ws.cell(row=1, column=idx + 1).alignment = Alignment(horizontal='center')
+        ws.cell(row=1, column=idx + 1).alignment = get_alignment(horizontal='center')
+
+    last_row = len(suite_metrics.cwes) + 1
+
+    # the cwe rows written by write_summary_data, scored by the metrics module
+    for row, cwe_metrics in enumerate(suite_metrics.cwes, 2):
+        # p-wt.
+        ws.cell(row=row, column=offset + 1).value = cwe_metrics.weight
+        ws.cell(row=row, column=offset + 1).number_format = '0.00'
+        ws.cell(row=row, column=offset + 1).alignment = get_alignment(horizontal='right')
+        set_appearance(ws, row, offset + 1, 'fg_fill', 'DDEBF7')  # light blue
+        set_appearance(ws, row, offset + 1, 'font_color', '833C0C')  # dark brown
+        # r-wt.
+        ws.cell(row=row, column=offset + 4).value = cwe_metrics.weight
+        ws.cell(row=row, column=offset + 4).number_format = '0.00'
+        ws.cell(row=row, column=offset + 4).alignment = get_alignment(horizontal='right')
+        set_appearance(ws, row, offset + 4, 'fg_fill', 'EDEDED')  # light gray
+        set_appearance(ws, row, offset + 4, 'font_color', '833C0C')  # dark brown
+
+        # p-final
+        if cwe_metrics.p_final is None:
+            ws.cell(row=row, column=offset + 2).value = 'N/A'
+            set_appearance(ws, row, offset + 2, 'font_color', '808080')  # med gray
+        else:
+            ws.cell(row=row, column=offset + 2).value = cwe_metrics.p_final
+            set_appearance(ws, row, offset + 2, 'font_color', '0000FF')  # blue
+            ws.cell(row=row, column=offset + 2).number_format = '0.00'
+        ws.cell(row=row, column=offset + 2).alignment = get_alignment(horizontal='right')
+        set_appearance(ws, row, offset + 2, 'fg_fill', 'DDEBF7')  # light blue
+
+        # r-final
+        if cwe_metrics.recall == 0:
+            set_appearance(ws, row, offset + 5, 'font_color', '808080')  # med gray
+        else:
+            set_appearance(ws, row, offset + 5, 'font_color', 'C00000')  # dark red
 
-    set_cwe_weightings(suite_data)
-
-    for row_idx in ws.iter_rows():
-        for cell in row_idx:
-            if cell.col_idx == 1:
-                if cell.row > 1:
-                    # col 1 contains the cwe string
-                    cwe = cell.value
-                    weight = suite_data.weightings_per_cwe_dict[cwe]
-                    # p-wt.
-                    ws.cell(row=cell.row, column=offset + 1).value = weight
-                    ws.cell(row=cell.row, column=offset + 1).number_format = '0.00'
-                    ws.cell(row=cell.row, column=offset + 1).alignment = Alignment(horizontal='right')
-                    set_appearance(ws, cell.row, offset + 1, 'fg_fill', 'DDEBF7')  # light blue
-                    set_appearance(ws, cell.row, offset + 1, 'font_color', '833C0C')  # dark brown
-                    # r-wt.
-                    ws.cell(row=cell.row, column=offset + 4).value = weight
-                    ws.cell(row=cell.row, column=offset + 4).number_format = '0.00'
-                    ws.cell(row=cell.row, column=offset + 4).alignment = Alignment(horizontal='right')
-                    set_appearance(ws, cell.row, offset + 4, 'fg_fill', 'EDEDED')  # light gray
-                    set_appearance(ws, cell.row, offset + 4, 'font_color', '833C0C')  # dark brown
-
-                    # p-final
-                    if row_idx[5].value == 'N/A':
-                        suite_data.precision_values_per_cwe_unweighted[cwe] = 'N/A'
-                        ws.cell(row=cell.row, column=offset + 2).value = 'N/A'
-                        set_appearance(ws, cell.row, offset + 2, 'font_color', '808080')  # med gray
-                    else:
-                        suite_data.precision_values_per_cwe_unweighted[cwe] = weight * row_idx[5].value
-                        ws.cell(row=cell.row, column=offset + 2).value = suite_data.precision_values_per_cwe_unweighted[
-                            cwe]
-                        set_appearance(ws, cell.row, offset + 2, 'font_color', '0000FF')  # blue
-                        ws.cell(row=cell.row, column=offset + 2).number_format = '0.00'
-                    ws.cell(row=cell.row, column=offset + 2).alignment = Alignment(horizontal='right')
-                    set_appearance(ws, cell.row, offset + 2, 'fg_fill', 'DDEBF7')  # light blue
-
-                    # r-final
-                    if row_idx[6].value == 0:
-                        set_appearance(ws, cell.row, offset + 5, 'font_color', '808080')  # med gray
-                    else:
-                        set_appearance(ws, cell.row, offset + 5, 'font_color', 'C00000')  # dark red
-
-                    suite_data.recall_values_per_cwe_unweighted[cwe] = weight * row_idx[6].value
-                    ws.cell(row=cell.row, column=offset + 5).value = suite_data.recall_values_per_cwe_unweighted[cwe]
-                    ws.cell(row=cell.row, column=offset + 5).number_format = '0.00'
-                    ws.cell(row=cell.row, column=offset + 5).alignment = Alignment(horizontal='right')
-                    set_appearance(ws, cell.row, offset + 5, 'fg_fill', 'EDEDED')  # light blue
-
-                    # p-avg
-                    if suite_data.precision_values_per_cwe_unweighted[cwe] != 'N/A':
-                        suite_data.precision_accumulated_valid_count_unweighted += 1
-                        suite_data.precision_accumulated_valid_values_unweighted += \
-                            suite_data.precision_values_per_cwe_unweighted[cwe]
-                        suite_data.precision_average_unweighted = \
-                            suite_data.precision_accumulated_valid_values_unweighted \
-                            / suite_data.precision_accumulated_valid_count_unweighted
-
-                    # r-avg
-                    suite_data.recall_accumulated_count_unweighted += 1
-                    suite_data.recall_accumulated_values_unweighted += suite_data.recall_values_per_cwe_unweighted[cwe]
-                    suite_data.recall_average_unweighted = \
-                        suite_data.recall_accumulated_values_unweighted \
-                        / suite_data.recall_accumulated_count_unweighted
+        ws.cell(row=row, column=offset + 5).value = cwe_metrics.r_final
+        ws.cell(row=row, column=offset + 5).number_format = '0.00'
+        ws.cell(row=row, column=offset + 5).alignment = get_alignment(horizontal='right')
+        set_appearance(ws, row, offset + 5, 'fg_fill', 'EDEDED')  # light blue
 
     # p-avg display
-    ws.merge_cells(start_row=2, start_column=offset + 3, end_row=ws.max_row, end_column=offset + 3)
-    ws.cell(row=2, column=offset + 3).value = suite_data.precision_average_unweighted
+    ws.merge_cells(start_row=2, start_column=offset + 3, end_row=last_row, end_column=offset + 3)
+    ws.cell(row=2, column=offset + 3).value = suite_metrics.precision_average
     ws.cell(row=2, column=offset + 3).number_format = '0.00'
-    ws.cell(row=2, column=offset + 3).alignment = Alignment(horizontal='center', vertical='center')
+    ws.cell(row=2, column=offset + 3).alignment = get_alignment(horizontal='center', vertical='center')
     set_appearance(ws, 2, offset + 3, 'font_color', '0000FF')  # blue
     set_appearance(ws, 2, offset + 3, 'fg_fill', 'DDEBF7')  # light blue
-    set_appearance(ws, ws.max_row, offset + 3, 'fg_fill', 'DDEBF7')  # light blue
+    set_appearance(ws, last_row, offset + 3, 'fg_fill', 'DDEBF7')  # light blue
     # r-avg display
-    ws.merge_cells(start_row=2, start_column=offset + 6, end_row=ws.max_row, end_column=offset + 6)
-    ws.cell(row=2, column=offset + 6).value = suite_data.recall_average_unweighted
+    ws.merge_cells(start_row=2, start_column=offset + 6, end_row=last_row, end_column=offset + 6)
+    ws.cell(row=2, column=offset + 6).value = suite_metrics.recall_average
     ws.cell(row=2, column=offset + 6).number_format = '0.00'
-    ws.cell(row=2, column=offset + 6).alignment = Alignment(horizontal='center', vertical='center')
+    ws.cell(row=2, column=offset + 6).alignment = get_alignment(horizontal='center', vertical='center')
     set_appearance(ws, 2, offset + 6, 'font_color', 'C00000')  # dark red
     set_appearance(ws, 2, offset + 6, 'fg_fill', 'EDEDED')  # light gray
-    set_appearance(ws, ws.max_row, offset + 6, 'fg_fill', '808080')  # medium gray
+    set_appearance(ws, last_row, offset + 6, 'fg_fill', '808080')  # medium gray
 
 
 def write_unweighted_averages(suite_data, ws):
     # todo: all calls to this function are currently disabled
-    #########################################################################################
-    score_sheet_titles_addendum = ['P-Wt.', 'P-Final', 'P-Avg', 'R-Wt.', 'R-Final', 'R-Avg.']
-    #########################################################################################
-
-    row = 1
-    offset = 7
-
-    # write column headers
-    for idx, title in enumerate(score_sheet_titles_addendum):
-        idx += offset
-        set_appearance(ws, row, idx + 1, 'fg_fill', 'E6B8B7')
-        ws.cell(row=1, column=idx + 1).value = title
-        ws.cell(row=1, column=idx + 1).alignment = Alignment(horizontal='center')
-
-    for row_idx in ws.iter_rows():
-        for cell in row_idx:
-            if cell.col_idx == 1:
-                if cell.row > 1:
-                    # col 1 contains the cwe string
-                    cwe = cell.value
-                    # weight = suite_data.weightings_per_cwe_dict[cwe]
-                    weight = 1.00  # fixed for unweighted
-                    # p-wt.
-                    ws.cell(row=cell.row, column=offset + 1).value = weight
-                    ws.cell(row=cell.row, column=offset + 1).number_format = '0.00'
-                    ws.cell(row=cell.row, column=offset + 1).alignment = Alignment(horizontal='right')
-                    set_appearance(ws, cell.row, offset + 1, 'fg_fill', 'DDEBF7')  # light blue
-                    set_appearance(ws, cell.row, offset + 1, 'font_color', '833C0C')  # dark brown
-                    # r-wt.
-                    ws.cell(row=cell.row, column=offset + 4).value = weight
-                    ws.cell(row=cell.row, column=offset + 4).number_format = '0.00'
-                    ws.cell(row=cell.row, column=offset + 4).alignment = Alignment(horizontal='right')
-                    set_appearance(ws, cell.row, offset + 4, 'fg_fill', 'EDEDED')  # light gray
-                    set_appearance(ws, cell.row, offset + 4, 'font_color', '833C0C')  # dark brown
-                    # p-final
-                    if row_idx[5].value == 'N/A':
-                        suite_data.precision_values_per_cwe_unweighted[cwe] = 'N/A'
-                        ws.cell(row=cell.row, column=offset + 2).value = 'N/A'
-                        set_appearance(ws, cell.row, offset + 2, 'font_color', '808080')  # med gray
-                    else:
-                        suite_data.precision_values_per_cwe_unweighted[cwe] = weight * row_idx[5].value
-                        ws.cell(row=cell.row, column=offset + 2).value = suite_data.precision_values_per_cwe_unweighted[
-                            cwe]
-                        set_appearance(ws, cell.row, offset + 2, 'font_color', '0000FF')  # blue
-                        ws.cell(row=cell.row, column=offset + 2).number_format = '0.00'
-                    ws.cell(row=cell.row, column=offset + 2).alignment = Alignment(horizontal='right')
-                    set_appearance(ws, cell.row, offset + 2, 'fg_fill', 'DDEBF7')  # light blue
-                    # r-final
-                    if row_idx[6].value == 0:
-                        set_appearance(ws, cell.row, offset + 5, 'font_color', '808080')  # med gray
-                    else:
-                        set_appearance(ws, cell.row, offset + 5, 'font_color', 'C00000')  # dark red
-
-                    suite_data.recall_values_per_cwe_unweighted[cwe] = weight * row_idx[6].value
-                    ws.cell(row=cell.row, column=offset + 5).value = suite_data.recall_values_per_cwe_unweighted[cwe]
-                    ws.cell(row=cell.row, column=offset + 5).number_format = '0.00'
-                    ws.cell(row=cell.row, column=offset + 5).alignment = Alignment(horizontal='right')
-                    set_appearance(ws, cell.row, offset + 5, 'fg_fill', 'EDEDED')  # light blue
-
-                    # p-avg
-                    if suite_data.precision_values_per_cwe_unweighted[cwe] != 'N/A':
-                        suite_data.precision_accumulated_valid_count_unweighted += 1
-                        suite_data.precision_accumulated_valid_values_unweighted += \
-                            suite_data.precision_values_per_cwe_unweighted[cwe]
-                        suite_data.precision_average_unweighted = suite_data.precision_accumulated_valid_values_unweighted \
-                                                                  / suite_data.precision_accumulated_valid_count_unweighted
-
-                    # r-avg
-                    suite_data.recall_accumulated_count_unweighted += 1
-                    suite_data.recall_accumulated_values_unweighted += suite_data.recall_values_per_cwe_unweighted[cwe]
-                    suite_data.recall_average_unweighted = suite_data.recall_accumulated_values_unweighted \
-                                                           / suite_data.recall_accumulated_count_unweighted
-
-    # p-avg display
-    ws.merge_cells(start_row=2, start_column=offset + 3, end_row=ws.max_row, end_column=offset + 3)
-    ws.cell(row=2, column=offset + 3).value = suite_data.precision_average_unweighted
-    ws.cell(row=2, column=offset + 3).number_format = '0.00'
-    ws.cell(row=2, column=offset + 3).alignment = Alignment(horizontal='center', vertical='center')
-    set_appearance(ws, 2, offset + 3, 'font_color', '0000FF')  # blue
-    set_appearance(ws, 2, offset + 3, 'fg_fill', 'DDEBF7')  # light blue
-    set_appearance(ws, ws.max_row, offset + 3, 'fg_fill', 'DDEBF7')  # light blue
-
-    # r-avg display
-    ws.merge_cells(start_row=2, start_column=offset + 6, end_row=ws.max_row, end_column=offset + 6)
-    ws.cell(row=2, column=offset + 6).value = suite_data.recall_average_unweighted
-    ws.cell(row=2, column=offset + 6).number_format = '0.00'
-    ws.cell(row=2, column=offset + 6).alignment = Alignment(horizontal='center', vertical='center')
-    set_appearance(ws, 2, offset + 6, 'font_color', 'C00000')  # dark red
-    set_appearance(ws, 2, offset + 6, 'fg_fill', 'EDEDED')  # light gray
-    set_appearance(ws, ws.max_row, offset + 6, 'fg_fill', '808080')  # medium gray
-
-
-def set_cwe_weightings(suite_dat):
-    # todo: all set to 1.0 for now
-    for cwe in suite_dat.unique_cwes:
-        suite_dat.weightings_per_cwe_dict[cwe] = 1.0
-        # todo: 5/12/7 remove this, for testing only. assumption is that
-        # todo: (cont) for each cwe, same weighting applies to both precisino and recall?
+    # same columns as the weighted averages, with every cwe weighted 1.0
+    write_weighted_averages(ws, get_suite_metrics(suite_data.summary_table,
+                                                  suite_data.overall_required_threshold_unweighted))
 
 
 def write_score_and_message_to_summary(ws):
     # revision with git hash
-    ws.cell(row=1, column=8).alignment = Alignment(horizontal='center', vertical='center')
+    ws.cell(row=1, column=8).alignment = get_alignment(horizontal='center', vertical='center')
     # ws.merge_cells(start_row=1, start_column=8, end_row=1, end_column=10)
     # todo: keep, this cell contains the hash/revision value of the code
     # ws.cell(row=1, column=8).value = ' \'score.exe\', v2.0.' + git_hash[:7]  # todo: keep short hash? or long?
     set_appearance(ws, 1, 8, 'font_color', '000000')  # black
     set_appearance(ws, 1, 8, 'fg_fill', 'F2F2F2')  # light gray
     # pass/fail notification
-    ws.cell(row=1, column=9).alignment = Alignment(horizontal='center', vertical='center')
+    ws.cell(row=1, column=9).alignment = get_alignment(horizontal='center', vertical='center')
     ws.cell(row=1, column=9).value = suite_data.pass_fail
     set_appearance(ws, 1, 9, 'font_color', 'FFFFFF')  # white
-    set_appearance(ws, 1, 9, 'fg_fill', '008000')  # green
+    set_appearance(ws, 1, 9, 'fg_fill', get_pass_fail_color(suite_data.pass_fail))
     cell = ws['I1']
     cell.font = cell.font.copy(bold=True, italic=False)
     # manual review notification
-    ws.cell(row=1, column=10).alignment = Alignment(horizontal='left', vertical='center')
+    ws.cell(row=1, column=10).alignment = get_alignment(horizontal='left', vertical='center')
     ws.merge_cells(start_row=1, start_column=10, end_row=1, end_column=28)
     ws.cell(row=1, column=10).value = suite_data.manual_review_recommendataion
     set_appearance(ws, 1, 10, 'font_color', '000000')  # black
@@ -1127,58 +1105,62 @@ def write_score_and_message_to_score_sheet(suite_dat, ws):
     col_offset = 7
 
     # score label
-    ws.cell(row=1, column=7 + col_offset).alignment = Alignment(horizontal='center', vertical='center')
+    ws.cell(row=1, column=7 + col_offset).alignment = get_alignment(horizontal='center', vertical='center')
     ws.cell(row=1, column=7 + col_offset).value = 'SCORE='
     set_appearance(ws, 1, 7 + col_offset, 'font_color', '000000')  # black
     set_appearance(ws, 1, 7 + col_offset, 'fg_fill', 'F2F2F2')  # light gray
     # score value
-    ws.cell(row=1, column=8 + col_offset).alignment = Alignment(horizontal='center', vertical='center')
-    ws.cell(row=1, column=8 + col_offset).value = '%0.2f' % (
-        (suite_dat.precision_average_unweighted + suite_dat.recall_average_unweighted) / 2)
+    ws.cell(row=1, column=8 + col_offset).alignment = get_alignment(horizontal='center', vertical='center')
+    ws.cell(row=1, column=8 + col_offset).value = '%0.2f' % suite_dat.metrics.score
     set_appearance(ws, 1, 8 + col_offset, 'font_color', '000000')  # black
     set_appearance(ws, 1, 8 + col_offset, 'fg_fill', 'F2F2F2')  # light gray
     # threshold label
-    ws.cell(row=1, column=9 + col_offset).alignment = Alignment(horizontal='center', vertical='center')
+    ws.cell(row=1, column=9 + col_offset).alignment = get_alignment(horizontal='center', vertical='center')
     ws.cell(row=1, column=9 + col_offset).value = 'THRESH='
     set_appearance(ws, 1, 9 + col_offset, 'font_color', '000000')  # black
     set_appearance(ws, 1, 9 + col_offset, 'fg_fill', 'FFE699')  # light yellow
     # threshold value
-    ws.cell(row=1, column=10 + col_offset).alignment = Alignment(horizontal='center', vertical='center')
+    ws.cell(row=1, column=10 + col_offset).alignment = get_alignment(horizontal='center', vertical='center')
     ws.cell(row=1, column=10 + col_offset).value = suite_dat.overall_required_threshold_unweighted
     set_appearance(ws, 1, 10 + col_offset, 'font_color', '000000')  # black
     set_appearance(ws, 1, 10 + col_offset, 'fg_fill', 'F2F2F2')  # light gray
     # pass/fail notification
-    ws.cell(row=1, column=11 + col_offset).alignment = Alignment(horizontal='center', vertical='center')
+    ws.cell(row=1, column=11 + col_offset).alignment = get_alignment(horizontal='center', vertical='center')
     ws.cell(row=1, column=11 + col_offset).value = suite_dat.pass_fail
     set_appearance(ws, 1, 11 + col_offset, 'font_color', 'FFFFFF')  # white
-    set_appearance(ws, 1, 11 + col_offset, 'fg_fill', '008000')  # green
+    set_appearance(ws, 1, 11 + col_offset, 'fg_fill', get_pass_fail_color(suite_dat.pass_fail))
+
+
+def get_pass_fail_color(pass_fail):
+    # green for a pass, dark red for a fail
+    return '008000' if pass_fail == 'PASS' else 'C00000'
 
 
 def set_appearance(ws_id, row_id, col_id, style_id, color_id, border=True):
+    # style objects come from the shared registry in styles.py
     cell = ws_id.cell(row=row_id, column=col_id)
 
     if style_id == 'font_color':
-        font_color = Font(color=color_id)
-        cell.font = font_color
+        cell.font = get_font(color_id)
 
     if style_id == 'fg_fill':
-        fill_color = PatternFill(fgColor=color_id, fill_type='solid')
-        cell.fill = fill_color
+        cell.fill = get_fill(color_id)
 
     if border:
-        # build thin border for all styles
-        thin_border = Border(left=Side(style='thin'), right=Side(style='thin'), top=Side(style='thin'),
-                             bottom=Side(style='thin'))
-        cell.border = thin_border
+        # thin border for all styles
+        cell.border = get_border()
+
 
+def create_summary_charts(summary_table):
+    # header row plus one row per cwe
+    last_row = len(summary_table) + 1
 
-def create_summary_charts():
     c2 = LineChart()
     # p-avg
-    v2 = Reference(ws1, min_col=29, min_row=1, max_row=53)
+    v2 = Reference(ws1, min_col=29, min_row=1, max_row=last_row)
     c2.add_data(v2, titles_from_data=True, from_rows=False)
     # r-avg
-    v2 = Reference(ws1, min_col=30, min_row=1, max_row=53)
+    v2 = Reference(ws1, min_col=30, min_row=1, max_row=last_row)
     c2.add_data(v2, titles_from_data=True, from_rows=False)
     c2.y_axis.scaling.min = 0
     c2.y_axis.scaling.max = 1
@@ -1204,9 +1186,9 @@ def create_summary_charts():
     p_chart.y_axis.title = 'Precision & Recall'
     # p_chart.x_axis.title = 'CWE Number'
 
-    recall_data = Reference(ws1, min_col=6, min_row=1, max_row=52, max_col=6)
+    recall_data = Reference(ws1, min_col=6, min_row=1, max_row=last_row, max_col=6)
     p_chart.add_data(recall_data, titles_from_data=True)
-    recall_data = Reference(ws1, min_col=7, min_row=1, max_row=52, max_col=7)
+    recall_data = Reference(ws1, min_col=7, min_row=1, max_row=last_row, max_col=7)
     p_chart.add_data(recall_data, titles_from_data=True)
 
     # precision bars
@@ -1218,7 +1200,7 @@ def create_summary_charts():
     s5.graphicalProperties.line.solidFill = 'FFFFFF'
     s5.graphicalProperties.solidFill = '93A9CF'  # light blue
 
-    cats = Reference(ws1, min_col=1, min_row=2, max_row=52)
+    cats = Reference(ws1, min_col=1, min_row=2, max_row=last_row)
     p_chart.set_categories(cats)
     p_chart.shape = 4
     p_chart.title = 'Protection Profile Scores (Precision & Recall) - Unweighted'
@@ -1235,7 +1217,7 @@ def create_summary_charts():
     tcc_true_bar_chart.style = 5
     tcc_true_bar_chart.y_axis.title = 'Tese Case Counts (True)'
 
-    tcc_true_data = Reference(ws1, min_col=2, min_row=1, max_row=52, max_col=2)
+    tcc_true_data = Reference(ws1, min_col=2, min_row=1, max_row=last_row, max_col=2)
     tcc_true_bar_chart.add_data(tcc_true_data, titles_from_data=True)
 
     s33 = tcc_true_bar_chart.series[0]
@@ -1243,7 +1225,7 @@ def create_summary_charts():
     s33.graphicalProperties.line.width = 1000  # width in EMUs
     s33.graphicalProperties.solidFill = 'E6B8B7'  # light red
 
-    cats = Reference(ws1, min_col=1, min_row=2, max_row=52)
+    cats = Reference(ws1, min_col=1, min_row=2, max_row=last_row)
     tcc_true_bar_chart.set_categories(cats)
     tcc_true_bar_chart.shape = 4
     tcc_true_bar_chart.title = 'Test Case Distribution'
@@ -1253,16 +1235,17 @@ def create_summary_charts():
     ws1.add_chart(tcc_true_bar_chart, 'H32')
 
 
-def create_score_charts():
+def create_score_charts(summary_table):
+    last_row = len(summary_table) + 1
     p_offset = 3
     r_offset = 5
 
     p_r_average_line_chart = LineChart()
     # p-avg
-    p_r_average_data = Reference(ws5, min_col=29, min_row=1, max_row=53)
+    p_r_average_data = Reference(ws5, min_col=29, min_row=1, max_row=last_row)
     p_r_average_line_chart.add_data(p_r_average_data, titles_from_data=True, from_rows=False)
     # r-avg
-    p_r_average_data = Reference(ws5, min_col=30, min_row=1, max_row=53)
+    p_r_average_data = Reference(ws5, min_col=30, min_row=1, max_row=last_row)
     p_r_average_line_chart.add_data(p_r_average_data, titles_from_data=True, from_rows=False)
     # p and r average scaling
     p_r_average_line_chart.y_axis.scaling.min = 0
@@ -1287,10 +1270,10 @@ def create_score_charts():
     # p_r_bar_chart.x_axis.title = 'CWE Number'
 
     # precision
-    p_r_data = Reference(ws5, min_col=6 + p_offset, min_row=1, max_row=52, max_col=6 + p_offset)
+    p_r_data = Reference(ws5, min_col=6 + p_offset, min_row=1, max_row=last_row, max_col=6 + p_offset)
     p_r_bar_chart.add_data(p_r_data, titles_from_data=True)
     # recall
-    p_r_data = Reference(ws5, min_col=7 + r_offset, min_row=1, max_row=52, max_col=7 + r_offset)
+    p_r_data = Reference(ws5, min_col=7 + r_offset, min_row=1, max_row=last_row, max_col=7 + r_offset)
     p_r_bar_chart.add_data(p_r_data, titles_from_data=True)
 
     # precision bars
@@ -1306,7 +1289,7 @@ def create_score_charts():
     # s5.graphicalProperties.solidFill = '93A9CF'  # light blue
     s5.graphicalProperties.solidFill = 'A9D18E'  # light green
 
-    cats = Reference(ws5, min_col=1, min_row=2, max_row=52)
+    cats = Reference(ws5, min_col=1, min_row=2, max_row=last_row)
     p_r_bar_chart.set_categories(cats)
     p_r_bar_chart.shape = 4
     p_r_bar_chart.title = 'Protection Profile Scores (Precision & Recall) - Weighted'
@@ -1324,7 +1307,7 @@ def create_score_charts():
     tcc_true_bar_chart.style = 5
     tcc_true_bar_chart.y_axis.title = 'Tese Case Counts (True)'
 
-    tcc_true_data = Reference(ws5, min_col=2, min_row=1, max_row=52, max_col=2)
+    tcc_true_data = Reference(ws5, min_col=2, min_row=1, max_row=last_row, max_col=2)
     tcc_true_bar_chart.add_data(tcc_true_data, titles_from_data=True)
 
     s33 = tcc_true_bar_chart.series[0]
@@ -1332,7 +1315,7 @@ def create_score_charts():
     s33.graphicalProperties.line.width = 1000  # width in EMUs
     s33.graphicalProperties.solidFill = 'E6B8B7'  # light red
 
-    cats = Reference(ws5, min_col=1, min_row=2, max_row=52)
+    cats = Reference(ws5, min_col=1, min_row=2, max_row=last_row)
     tcc_true_bar_chart.set_categories(cats)
     tcc_true_bar_chart.shape = 4
     tcc_true_bar_chart.title = 'Test Case Distribution'
@@ -1342,6 +1325,158 @@ def create_score_charts():
     ws5.add_chart(tcc_true_bar_chart, 'N31')
 
 
+def write_xlsxwriter_scorecard(scorecard_path, vendor_path):
+    """
+    Writes the scorecard with XlsxWriter in constant memory mode.  The generated sheets are copied from the
+    scratch workbook, except for the hit rows, which are written straight from the hit table; then the vendor
+    sheets are copied from the vendor input file, which was opened read only.
+    """
+    # XlsxWriter is only needed for this backend
+    import scorecard_xlsxwriter
+
+    workbook = scorecard_xlsxwriter.new_workbook(scorecard_path)
+    formats = scorecard_xlsxwriter.FormatCache(workbook)
+
+    # generated sheets
+    sheets = {}
+    for ws in [ws1, ws2, ws3, ws4, ws5]:
+        sheets[ws.title] = workbook.add_worksheet(ws.title)
+        scorecard_xlsxwriter.copy_sheet_layout(ws, sheets[ws.title])
+        scorecard_xlsxwriter.copy_cells(ws.iter_rows(), sheets[ws.title], formats, ws.merged_cells.ranges)
+    write_hit_rows_xlsxwriter(suite_data, suite_data.suite_hit_data_complete, sheets[ws3.title], formats)
+
+    # charts
+    last_row = len(suite_data.summary_table) + 1
+    add_p_r_charts_xlsxwriter(workbook, sheets[ws1.title], last_row, [(5, '4572A7'), (6, '93A9CF')], 'FFFFFF',
+                              'Unweighted', (40, 13), (40, 10.4), ['H2', 'H32'])
+    add_p_r_charts_xlsxwriter(workbook, sheets[ws5.title], last_row, [(8, '548235'), (11, 'A9D18E')], '000000',
+                              'Weighted', (40, 15), (40, 11.3), ['N2', 'N31'])
+    add_hit_charts_xlsxwriter(workbook, sheets[ws4.title])
+
+    # vendor sheets, with the wid usage fills
+    layouts = scorecard_xlsxwriter.get_sheet_layouts(vendor_path)
+    for vendor_ws in wb.worksheets:
+        fills = suite_data.weakness_id_fills if vendor_ws.title == 'Weakness IDs' else None
+        scorecard_xlsxwriter.copy_read_only_sheet(vendor_ws, workbook.add_worksheet(vendor_ws.title), formats,
+                                                  layouts[vendor_ws.title], fills)
+
+    workbook.close()
+
+
+def write_hit_rows_xlsxwriter(suite_dat, hit_table, ws, formats):
+    # the 'Hit Data' rows below the titles, laid out like write_hit_data_workbook
+    duplicate_file_ids = hit_table.get_duplicate_file_ids()
+    suite_dat.duplicate_file_name_hits.update(hit_table.files[file_id] for file_id in duplicate_file_ids)
+    row_colors = get_hit_row_colors(hit_table, duplicate_file_ids)
+
+    # column alignments
+    right = ('right', 'vcenter')
+    center = ('center', 'vcenter')
+    alignments = [center, center, center, (None, None), center, center, center, center, right]
+
+    # (fill, alignment) -> format
+    cell_formats = {}
+
+    def get_cell_format(fill_color, alignment):
+        cell_format = cell_formats.get((fill_color, alignment))
+        if cell_format is None:
+            properties = dict((key, value) for key, value in zip(['align', 'valign'], alignment) if value)
+            if fill_color is not None:
+                properties.update(bg_color='#' + fill_color, border=1)
+            cell_format = cell_formats[(fill_color, alignment)] = formats.get_format(**properties)
+        return cell_format
+
+    for first_idx, group_size in hit_table.get_test_case_groups():
+        opp_colors = get_opp_colors(hit_table, first_idx, group_size)
+
+        for idx in range(first_idx, first_idx + group_size):
+            for col, value in enumerate(hit_table.get_row(idx), 1):
+                # test case columns are not merged, their values are only in the first row of the group
+                if 6 < col < 14 and idx != first_idx:
+                    value = None
+                if col < 10:
+                    cell_format = get_cell_format(row_colors[idx], alignments[col - 1])
+                else:
+                    opp_color = opp_colors[col - 10] if col - 10 < len(opp_colors) else None
+                    cell_format = get_cell_format(opp_color, center)
+                ws.write(idx + 1, col - 1, value, cell_format)
+
+
+def get_chart_size(width, height):
+    # openpyxl chart sizes are in cm, xlsxwriter's in pixels
+    return {'width': round(width * 96 / 2.54), 'height': round(height * 96 / 2.54)}
+
+
+def add_p_r_charts_xlsxwriter(workbook, ws, last_row, bar_columns, bar_line_color, title_suffix, p_r_size,
+                              tcc_size, anchors):
+    """
+    The charts of create_summary_charts and create_score_charts: precision and recall bars of the given
+    (0 based column, fill color) with the average lines over them, and the test case distribution.
+    """
+    sheet_name = ws.get_name()
+    line_width = 10000 / 12700  # 10000 EMUs in points
+
+    p_r_bar_chart = workbook.add_chart({'type': 'column'})
+    p_r_bar_chart.set_style(5)
+    for col, fill_color in bar_columns:
+        border = {'color': '#' + bar_line_color}
+        if bar_line_color == '000000':
+            border['width'] = 1000 / 12700
+        p_r_bar_chart.add_series({'name': [sheet_name, 0, col], 'values': [sheet_name, 1, col, last_row - 1, col],
+                                  'categories': [sheet_name, 1, 0, last_row - 1, 0],
+                                  'fill': {'color': '#' + fill_color}, 'border': border, 'gap': 50})
+    p_r_bar_chart.set_title({'name': 'Protection Profile Scores (Precision & Recall) - ' + title_suffix})
+    p_r_bar_chart.set_y_axis({'name': 'Precision & Recall', 'min': 0, 'max': 1})
+    p_r_bar_chart.set_size(get_chart_size(*p_r_size))
+
+    # p and r averages, in the helper columns
+    p_r_average_line_chart = workbook.add_chart({'type': 'line'})
+    for col, line_color in [(28, '4572A7'), (29, 'C65911')]:
+        p_r_average_line_chart.add_series({'name': [sheet_name, 0, col],
+                                           'values': [sheet_name, 1, col, last_row - 1, col],
+                                           'line': {'color': '#' + line_color, 'dash_type': 'dash',
+                                                    'width': line_width}})
+    p_r_bar_chart.combine(p_r_average_line_chart)
+    ws.insert_chart(anchors[0], p_r_bar_chart)
+
+    tcc_true_bar_chart = workbook.add_chart({'type': 'column'})
+    tcc_true_bar_chart.set_style(5)
+    tcc_true_bar_chart.add_series({'name': [sheet_name, 0, 1], 'values': [sheet_name, 1, 1, last_row - 1, 1],
+                                   'categories': [sheet_name, 1, 0, last_row - 1, 0],
+                                   'fill': {'color': '#E6B8B7'}, 'border': {'color': '#000000', 'width': 1000 / 12700},
+                                   'gap': 0})
+    tcc_true_bar_chart.set_title({'name': 'Test Case Distribution'})
+    tcc_true_bar_chart.set_y_axis({'name': 'Tese Case Counts (True)'})
+    tcc_true_bar_chart.set_size(get_chart_size(*tcc_size))
+    ws.insert_chart(anchors[1], tcc_true_bar_chart)
+
+
+def add_hit_charts_xlsxwriter(workbook, ws):
+    # the charts of create_hit_charts
+    sheet_name = ws.get_name()
+
+    hit_bar_chart = workbook.add_chart({'type': 'column', 'subtype': 'stacked'})
+    hit_bar_chart.set_style(12)
+    for col, fill_color in [(1, 'C5E0B4'), (2, 'F8CBAD')]:
+        hit_bar_chart.add_series({'name': [sheet_name, 0, col], 'values': [sheet_name, 1, col, 14, col],
+                                  'categories': [sheet_name, 1, 0, 14, 0], 'fill': {'color': '#' + fill_color},
+                                  'border': {'color': '#000000'}, 'gap': 50, 'overlap': 100})
+    hit_bar_chart.set_title({'name': 'Function Hits vs. Opportunities (Juliet/False Only)'})
+    hit_bar_chart.set_y_axis({'name': 'Total Hits per Group'})
+    # x-axis labels at 45 degrees
+    hit_bar_chart.set_x_axis({'num_font': {'rotation': -45}})
+    hit_bar_chart.set_size(get_chart_size(24, 12))
+    ws.insert_chart('J2', hit_bar_chart)
+
+    # groups chart
+    pie = workbook.add_chart({'type': 'pie'})
+    pie.add_series({'name': [sheet_name, 1, 10], 'values': [sheet_name, 2, 10, 5, 10],
+                    'categories': [sheet_name, 2, 9, 5, 9], 'points': [None, None, {'fill': {'color': '#BFBFBF'}}]})
+    pie.set_title({'name': 'Hits by Group'})
+    pie.set_size(get_chart_size(13.9, 10))
+    ws.insert_chart('A16', pie)
+
+
 def import_weakness_ids(suite_dat):
     # todo: consider consolidating this function with 'import_xml_tags'
     row = 0
@@ -1359,15 +1494,23 @@ def import_weakness_ids(suite_dat):
             weakness_ids[row][col] = str(cell.value)
             col += 1
 
-        # create a dictionary of wids per cwe
+        # create a dictionary of wids per cwe, and index where each wid is in the sheet
         if row > 0:
             cwe_id = 'CWE' + str(weakness_ids[row][0]).zfill(3)
             suite_data.acceptable_weakness_ids_full_list_dict[cwe_id] = weakness_ids[row][1:]
 
+            wid_cells = suite_dat.weakness_id_cells.setdefault(cwe_id, {})
+            for col, wid in enumerate(weakness_ids[row][1:], 2):
+                if wid != 'None':
+                    wid_cells.setdefault(wid, []).append((row + 1, col))
+
         row += 1
         # create a full list for the suite object
         setattr(suite_dat, 'acceptable_weakness_ids_full_list', weakness_ids)
 
+    # index the acceptable wids per cwe for matching
+    setattr(suite_dat, 'weakness_id_index', WeaknessIdIndex(weakness_ids, suite_dat.tool_adapter.wid_delimiter))
+
     # add weakness ids to each xml object
     for i, xml_project in enumerate(suite_dat.xml_projects):
         cwe_num = getattr(xml_project, 'cwe_num')
@@ -1378,90 +1521,41 @@ def import_weakness_ids(suite_dat):
                 break
 
 
-def paint_wids_usage(used_wids, unused_wids):
-    key = list(used_wids)[0]
-    key = int(key[3:].lstrip('0'))
-
-    # values = used wids
-    values = list(used_wids.values())[0]
-    unused_wid_values = list(unused_wids.values())[0]
-
+def paint_wids_usage(scan_data, cwe, used_wids, unused_wids):
     ws = wb.get_sheet_by_name('Weakness IDs')
+    wid_cells = scan_data.weakness_id_cells.get(cwe, {})
+
+    # highlight only the cells of this cwe's used (green) and unused (red) wids
+    for wids, fill_color in [(used_wids, 'A9D08E'), (unused_wids, 'E6B8B7')]:
+        for wid in wids:
+            for row, col in wid_cells.get(wid, ()):
+                if wb.read_only:
+                    # the vendor sheets are read only, the fills are applied when they are copied
+                    scan_data.weakness_id_fills[(row, col)] = fill_color
+                else:
+                    set_appearance(ws, row, col, 'fg_fill', fill_color)
 
-    for row in ws.iter_rows():
-
-        found_row = False
-        for cell in row:
-            # look for matching cwe row in sheet
-            if key == cell.value:
-                print('CWE_ID_ROW', cell.row, 'COL', cell.col_idx, cell.value)
-                found_row = True
-                continue
-
-            if found_row:
-                print('WID_ID', cell.row, 'COL', cell.col_idx, cell.value)
-                # highlight all used wids green
-                for value in values:
-                    if value == cell.value:
-                        # green = used
-                        set_appearance(ws, cell.row, cell.col_idx, 'fg_fill', 'A9D08E')
-
-                for value in unused_wid_values:
-                    if value == cell.value:
-                        # red
-                        set_appearance(ws, cell.row, cell.col_idx, 'fg_fill', 'E6B8B7')
-
-
-def get_unused_wids(scan_data, used_wids):
-    acceptable_wids = {}
-
-    cwe = list(used_wids)[0]
-    cwe = cwe[3:].lstrip('0')
-
-    for weak_id in scan_data.acceptable_weakness_ids_full_list:
-        if weak_id[0] == cwe:
-            del weak_id[0]
-            acceptable_wids = {cwe: weak_id}
-
-    used_values = list(used_wids.values())[0]
-    acceptable_wids = list(acceptable_wids.values())[0]
-    unused_wids = list(set(acceptable_wids) - set(used_values))
 
-    if 'None' in unused_wids:
-        unused_wids.remove('None')
+def get_unused_wids(scan_data, cwe, used_wids):
+    # acceptable wids of the cwe that no project used
+    acceptable_wids = scan_data.acceptable_weakness_ids_full_list_dict.get(cwe, [])
+    unused_wids = set(acceptable_wids) - used_wids
+    unused_wids.discard('None')
 
-    return {cwe: unused_wids}
+    return unused_wids
 
 
 def get_used_wids(scan_data):
-    cwes = []
-
+    # used wids per cwe, in one pass over the projects
     for xml_project in scan_data.xml_projects:
-        cwes.append(getattr(xml_project, 'cwe_id_padded'))
-
-    unique_cwes = list(set(cwes))
-    unique_cwes.sort()  # todo: necessary?
-
-    for cwe in unique_cwes:
-        used_wids_per_cwe = []
-
-        # go thru each project looking for this cwe
-        for xml_project in suite_data.xml_projects:
-            # if the cwe for this project matches, get it's wids
-            if cwe == getattr(xml_project, 'cwe_id_padded'):
-                used_wids_per_cwe.extend(getattr(xml_project, 'used_wids'))
-            else:
-                continue
-
-        unique_used_wids_per_cwe = list(set(used_wids_per_cwe))
-        scan_data.used_wids_per_cwe.append([cwe, unique_used_wids_per_cwe])
+        scan_data.used_wids_per_cwe_dict.setdefault(xml_project.cwe_id_padded, set()).update(xml_project.used_wids)
 
-        # todo: consider appending this dict like the list
-        # scan_data.used_wids_per_cwe_dict = {cwe:unique_used_wids_per_cwe}
-        used_wids = {cwe: unique_used_wids_per_cwe}
-        unused_wids = get_unused_wids(scan_data, used_wids)
+    for cwe in sorted(scan_data.used_wids_per_cwe_dict):
+        used_wids = scan_data.used_wids_per_cwe_dict[cwe]
+        scan_data.used_wids_per_cwe.append([cwe, list(used_wids)])
 
-        paint_wids_usage(used_wids, unused_wids)
+        unused_wids = get_unused_wids(scan_data, cwe, used_wids)
+        paint_wids_usage(scan_data, cwe, used_wids, unused_wids)
 
 
 def githash(path):
@@ -1485,10 +1579,45 @@ if __name__ == '__main__':
     parser.add_argument('suite', help='The suite number being scanned (i.e. 1 - 10)', type=int)
     # optional
     parser.add_argument('-n', dest='normalize', action='store_true', help='Enter \'\-n\' option for normalized score')
+    parser.add_argument('-t', dest='tool', default=TOOL_NAME, choices=sorted(TOOL_ADAPTERS),
+                        help='The tool that produced the scans (default: ' + TOOL_NAME + ')')
+    parser.add_argument('-j', dest='jobs', type=int, default=1,
+                        help='Number of worker processes used to score the xmls (default: 1)')
+    parser.add_argument('--dedupe', dest='dedupe', action='store_true',
+                        help='Merge findings with the same file, line, function and category into a single hit')
+    hit_data_group = parser.add_mutually_exclusive_group()
+    hit_data_group.add_argument('--stream-hit-data', dest='stream_hit_data', action='store_true',
+                                help='Stream the \'Hit Data\' sheet to its own write-only workbook next to the '
+                                     'scorecard, for suites with too many hits to hold in the scorecard')
+    hit_data_group.add_argument('--shard-hit-data', dest='shard_hit_data', choices=['xlsx', 'csv'],
+                                help='Write the hits of each cwe to its own workbook (xlsx) or gzipped csv file in '
+                                     'a folder next to the scorecard, with \'Hit Data\' linking to them; written '
+                                     'by -j worker processes')
+    parser.add_argument('--conditional-formats', dest='conditional_formats', action='store_true',
+                        help='Color \'Hit Data\' and \'XML Data\' with conditional formatting rules instead of '
+                             'styling each cell. Trades file size for render time: the cells are colored by Excel '
+                             'when the scorecard is opened, and the rules and their hidden helper columns make the '
+                             'file slightly larger')
+    parser.add_argument('--backend', dest='backend', default='openpyxl', choices=['openpyxl', 'xlsxwriter'],
+                        help='Library that writes the scorecard; xlsxwriter writes it in constant memory mode '
+                             '(default: openpyxl)')
+    parser.add_argument('--rescore', dest='rescore', action='store_true',
+                        help='Rescore with the findings and test cases stored by the last full run, without reading '
+                             'the scans, xmls or test cases (i.e. after changing the Weakness IDs)')
+
+    parser.add_argument('--no-workbook', dest='no_workbook', action='store_true',
+                        help='Write only the scores, as json, without building the scorecard')
 
     args = parser.parse_args()
+    if args.backend == 'xlsxwriter' and (args.stream_hit_data or args.shard_hit_data or args.conditional_formats):
+        parser.error('--backend xlsxwriter writes the \'Hit Data\' sheet itself and colors it cell by cell')
+    if args.no_workbook and (args.backend != 'openpyxl' or args.stream_hit_data or args.shard_hit_data or
+                             args.conditional_formats):
+        parser.error('--no-workbook writes no sheets')
+    start_time = perf_counter()
     suite_language = args.language
     suite_number = args.suite
+    tool_name = args.tool
     suite_path = os.getcwd()
     scaned_data_path = os.path.join(suite_path, 'scans')
     new_xml_path = os.path.join(suite_path, XML_OUTPUT_DIR)
@@ -1499,52 +1628,108 @@ if __name__ == '__main__':
 
     # create scorecard from vendor input file
     time = strftime(
-        'scorecard-fortify-' + suite_language + '_%m-%d-%Y_%H.%M.%S' + '_suite_' + str(suite_number).zfill(2))
-    vendor_input = os.path.join(suite_path, 'vendor-input-' + TOOL_NAME + '-' + suite_language + '.xlsx')
+        'scorecard-' + tool_name + '-' + suite_language + '_%m-%d-%Y_%H.%M.%S' + '_suite_' + str(suite_number).zfill(2))
+    vendor_input = os.path.join(suite_path, 'vendor-input-' + tool_name + '-' + suite_language + '.xlsx')
     scorecard = os.path.join(suite_path, time) + '.xlsx'
-    shutil.copyfile(vendor_input, scorecard)
+    scores_path = os.path.join(suite_path, time) + '.json'
+    use_conditional_formats = args.conditional_formats
+    output_backend = args.backend
+    if args.stream_hit_data:
+        hit_data_stream_path = os.path.join(suite_path, time) + '_hit_data.xlsx'
+    if args.shard_hit_data:
+        hit_data_shard_format = args.shard_hit_data
+        hit_data_shard_path = os.path.join(suite_path, time) + '_hit_data'
+        hit_data_jobs = args.jobs
 
     # get hash of score files for rev suffix
     # todo: this works but will also need to include all files in the build (not just score.py, but suite.py too)
     # git_hash = githash(suite_path)
 
     # add sheets and format
-    wb = load_workbook(scorecard)
-    ws1 = wb.create_sheet('Summary', 0)
-    ws2 = wb.create_sheet('XML Data', 1)
-    ws3 = wb.create_sheet('Hit Data', 2)
-    ws4 = wb.create_sheet('Hit Analytics', 3)
-    ws5 = wb.create_sheet('SCORE', 4)
+    if args.no_workbook:
+        # only the vendor sheets are read
+        wb = load_workbook(vendor_input, read_only=True)
+    elif output_backend == 'xlsxwriter':
+        # the vendor sheets are only read; the generated sheets are laid out in a scratch workbook and
+        # copied to the scorecard when it is written
+        wb = load_workbook(vendor_input, read_only=True)
+        sheets_wb = Workbook()
+        sheets_wb.remove(sheets_wb.active)
+    else:
+        shutil.copyfile(vendor_input, scorecard)
+        wb = sheets_wb = load_workbook(scorecard)
+    if not args.no_workbook:
+        ws1 = sheets_wb.create_sheet('Summary', 0)
+        ws2 = sheets_wb.create_sheet('XML Data', 1)
+        ws3 = sheets_wb.create_sheet('Hit Data', 2)
+        ws4 = sheets_wb.create_sheet('Hit Analytics', 3)
+        ws5 = sheets_wb.create_sheet('SCORE', 4)
 
-    format_workbook()
+        format_workbook()
 
     # instanciate a suite object and get suite data
-    suite_data = Suite(scaned_data_path, new_xml_path, TOOL_NAME)
+    store = FindingsStore(os.path.join(suite_path, FINDINGS_STORE_NAME))
+    if args.rescore:
+        xml_projects = store.load_catalog()
+        if not xml_projects:
+            py_common.print_with_timestamp('No stored test case catalog, run a full scoring first')
+            sys.exit(1)
+        suite_data = Suite(scaned_data_path, new_xml_path, tool_name, xml_projects)
+    else:
+        suite_data = Suite(scaned_data_path, new_xml_path, tool_name)
 
     # import tag data
-    import_xml_tags(suite_data)
+    if suite_data.tool_adapter.uses_xml_tags:
+        import_xml_tags(suite_data)
     # import weakness ids
     import_weakness_ids(suite_data)
 
     # score the xml projects
-    score_xmls(suite_data)
+    xmls_parsed = score_xmls(suite_data, suite_language, store, args.jobs, args.rescore, args.dedupe)
     # get a summary of all used wids
     get_used_wids(suite_data)
 
-    # write to sheets
-    collect_hit_data(suite_data)
-    write_xml_data(suite_data)
+    # score the test cases and collect their hits
+    hit_table = collect_hit_data(suite_data)
 
-    # summary sheet
-    write_summary_data(suite_data, ws1)
-    # score sheet
-    write_summary_data(suite_data, ws5)
-
-    # chart for summary sheet
-    create_summary_charts()
-    create_score_charts()
+    # per cwe totals and scores for the summary and score sheets and their charts
+    suite_data.summarize()
 
-    wb.active = 0
-    wb.save(scorecard)
+    if args.no_workbook:
+        with open(scores_path, 'w') as scores_file:
+            json.dump(suite_data.metrics.get_dict(suite_data.summary_table), scores_file, indent=2)
+        wb.close()
+        py_common.print_with_timestamp('Scores written to ' + scores_path)
+    else:
+        # write to sheets
+        group_hit_data(suite_data, hit_table)
+        write_xml_data(suite_data)
+
+        # summary sheet
+        write_summary_data(suite_data, ws1)
+        # score sheet
+        write_summary_data(suite_data, ws5)
+
+        # chart for summary sheet
+        create_summary_charts(suite_data.summary_table)
+        create_score_charts(suite_data.summary_table)
+
+        if output_backend == 'xlsxwriter':
+            write_xlsxwriter_scorecard(scorecard, vendor_input)
+            wb.close()
+        else:
+            wb.active = 0
+            wb.save(scorecard)
+
+    # a full scoring parses every xml and builds the scorecard; only a rescore that also builds it compares to one
+    elapsed = perf_counter() - start_time
+    if args.rescore and not args.no_workbook:
+        full_run_time = store.get_run_time('full')
+        if full_run_time is not None:
+            py_common.print_with_timestamp('Rescored in ' + str(round(elapsed, 1)) + 's, the last full scoring took ' +
+                                           str(round(full_run_time, 1)) + 's (' +
+                                           str(round(full_run_time - elapsed, 1)) + 's saved)')
+    elif xmls_parsed and not args.no_workbook:
+        store.save_run_time('full', elapsed)
 
     py_common.print_with_timestamp('--- FINISHED SCORING ---')
@@ -0,0 +1,199 @@
+#
+# XlsxWriter output for the scorecard, in constant memory mode
+#
+# Rows are written to each sheet in order and flushed to a temp file as soon as the next row starts, so a
+# sheet's size does not add to memory.  The small generated sheets are laid out with openpyxl in a scratch
+# workbook and copied here row by row; the vendor sheets are copied from the vendor input file opened
+# read only.
+#
+import colorsys
+import zipfile
+import xml.etree.ElementTree as elemTree
+
+import xlsxwriter
+
+from openpyxl.utils import column_index_from_string
+
+# default office theme (lt1, dk1, lt2, dk2, accent1-6), for the theme colors of the vendor sheets
+OFFICE_THEME_COLORS = ['FFFFFF', '000000', 'E7E6E6', '44546A', '4472C4', 'ED7D31', 'A5A5A5', 'FFC000', '5B9BD5',
+                       '70AD47']
+# openpyxl border style -> xlsxwriter border index
+BORDER_STYLES = {'thin': 1, 'medium': 2, 'dashed': 3, 'dotted': 4, 'thick': 5, 'double': 6, 'hair': 7}
+
+XLSX_MAIN_NS = '{http://schemas.openxmlformats.org/spreadsheetml/2006/main}'
+XLSX_REL_NS = '{http://schemas.openxmlformats.org/officeDocument/2006/relationships}'
+XLSX_PACKAGE_REL_NS = '{http://schemas.openxmlformats.org/package/2006/relationships}'
+
+
+def new_workbook(path):
+    # values are written as they are; openpyxl does not turn strings into urls either
+    return xlsxwriter.Workbook(path, {'constant_memory': True, 'strings_to_urls': False})
+
+
+def get_theme_rgb(theme, tint):
+    # theme color with the tint applied to its luminance, as excel does
+    red, green, blue = (int(OFFICE_THEME_COLORS[theme][idx:idx + 2], 16) / 255 for idx in (0, 2, 4))
+    hue, luminance, saturation = colorsys.rgb_to_hls(red, green, blue)
+    if tint < 0:
+        luminance *= 1 + tint
+    else:
+        luminance = luminance * (1 - tint) + tint
+    return ''.join('%02X' % round(value * 255) for value in colorsys.hls_to_rgb(hue, luminance, saturation))
+
+
+def get_rgb(color):
+    # 'RRGGBB' of an openpyxl color, None if it is not set
+    if color is None:
+        return None
+    if color.type == 'theme' and color.theme < len(OFFICE_THEME_COLORS):
+        return get_theme_rgb(color.theme, color.tint)
+    if color.type == 'rgb':
+        return color.rgb[-6:]
+    return None
+
+
+class FormatCache(object):
+    """
+    Creates each distinct cell format of the workbook once.  Formats are looked up by their properties,
+    so copied cells and cells written directly share them.
+    """
+    __slots__ = ('workbook', 'formats')
+
+    def __init__(self, workbook):
+        self.workbook = workbook
+        self.formats = {}
+
+    def get_format(self, **properties):
+        key = tuple(sorted(properties.items()))
+        cell_format = self.formats.get(key)
+        if cell_format is None:
+            cell_format = self.formats[key] = self.workbook.add_format(properties)
+        return cell_format
+
+    def get_cell_format(self, cell, fill_color=None):
+        # format of an openpyxl cell, None if it has no style; fill_color replaces its fill
+        if not cell.has_style and fill_color is None:
+            return None
+
+        properties = {}
+        font = cell.font
+        font_color = get_rgb(font.color)
+        if font_color is not None and font_color != '000000':
+            properties['font_color'] = '#' + font_color
+        if font.b:
+            properties['bold'] = True
+        if font.i:
+            properties['italic'] = True
+
+        if fill_color is None and cell.fill.fill_type == 'solid':
+            fill_color = get_rgb(cell.fill.fgColor)
+        if fill_color is not None:
+            properties['bg_color'] = '#' + fill_color
+
+        for side in ['left', 'right', 'top', 'bottom']:
+            border_style = getattr(cell.border, side).style
+            if border_style in BORDER_STYLES:
+                properties[side] = BORDER_STYLES[border_style]
+
+        if cell.alignment.horizontal not in (None, 'general'):
+            properties['align'] = cell.alignment.horizontal
+        if cell.alignment.vertical is not None:
+            properties['valign'] = 'vcenter' if cell.alignment.vertical == 'center' else cell.alignment.vertical
+        if cell.number_format != 'General':
+            properties['num_format'] = cell.number_format
+
+        return self.get_format(**properties)
+
+
+def copy_sheet_layout(src_ws, dst_ws):
+    # column widths and hidden columns, zoom, gridlines and frozen panes of an openpyxl sheet
+    for col_id, dimension in src_ws.column_dimensions.items():
+        col = column_index_from_string(col_id) - 1
+        width = dimension.width if dimension.customWidth else None
+        if width is not None or dimension.hidden:
+            dst_ws.set_column(col, col, width, None, {'hidden': True} if dimension.hidden else None)
+    if src_ws.sheet_view.zoomScale:
+        dst_ws.set_zoom(src_ws.sheet_view.zoomScale)
+    if src_ws.sheet_view.showGridLines is False:
+        dst_ws.hide_gridlines(2)
+    if src_ws.freeze_panes:
+        dst_ws.freeze_panes(src_ws.freeze_panes)
+
+
+def copy_cells(rows, dst_ws, formats, merged_ranges=(), fills=None):
+    """
+    Writes the openpyxl cells of rows (i.e. ws.iter_rows()) to dst_ws in row order.  Ranges merged within
+    a row are merged again; XlsxWriter cannot merge down rows in constant memory mode, so a range over
+    several rows keeps its value in its first cell only.  fills is {(row, col): fill color} of cells to
+    repaint, 1 based like openpyxl.
+    """
+    # first row -> [(first col, last col)] of the ranges merged within that row
+    row_merges = {}
+    for merged_range in merged_ranges:
+        if merged_range.min_row == merged_range.max_row and merged_range.min_col < merged_range.max_col:
+            row_merges.setdefault(merged_range.min_row, []).append((merged_range.min_col, merged_range.max_col))
+    fills = fills or {}
+
+    for row_cells in rows:
+        # empty cells of read only sheets have no position
+        row = next((cell.row for cell in row_cells if getattr(cell, 'row', None)), None)
+        if row is None:
+            continue
+        # first col -> last col of each merged range, and the other cols they cover
+        merge_starts = {}
+        merged_cols = set()
+        for min_col, max_col in row_merges.get(row, ()):
+            merge_starts[min_col] = max_col
+            merged_cols.update(range(min_col + 1, max_col + 1))
+
+        for cell in row_cells:
+            col = getattr(cell, 'column', None)
+            if col is None or col in merged_cols:
+                continue
+            cell_format = formats.get_cell_format(cell, fills.get((row, col)))
+            if col in merge_starts:
+                dst_ws.merge_range(row - 1, col - 1, row - 1, merge_starts[col] - 1, cell.value, cell_format)
+            elif cell.value is not None:
+                dst_ws.write(row - 1, col - 1, cell.value, cell_format)
+            elif cell_format is not None:
+                dst_ws.write_blank(row - 1, col - 1, None, cell_format)
+
+
+def get_sheet_layouts(xlsx_path):
+    """
+    Returns {sheet title: (zoom, [(first col, last col, width)])} of an xlsx, read from its sheet xml up
+    to the cell data (openpyxl's read only sheets do not load the column widths).
+    """
+    layouts = {}
+    with zipfile.ZipFile(xlsx_path) as xlsx:
+        rels = elemTree.fromstring(xlsx.read('xl/_rels/workbook.xml.rels'))
+        targets = dict((rel.get('Id'), rel.get('Target')) for rel in rels.iter(XLSX_PACKAGE_REL_NS + 'Relationship'))
+        workbook = elemTree.fromstring(xlsx.read('xl/workbook.xml'))
+
+        for sheet in workbook.iter(XLSX_MAIN_NS + 'sheet'):
+            target = targets[sheet.get(XLSX_REL_NS + 'id')]
+            sheet_path = target.lstrip('/') if target.startswith('/') else 'xl/' + target
+            zoom = None
+            col_widths = []
+            with xlsx.open(sheet_path) as sheet_xml:
+                for event, element in elemTree.iterparse(sheet_xml, events=('start',)):
+                    if element.tag == XLSX_MAIN_NS + 'sheetView' and element.get('zoomScale'):
+                        zoom = int(element.get('zoomScale'))
+                    elif element.tag == XLSX_MAIN_NS + 'col' and element.get('width'):
+                        col_widths.append((int(element.get('min')), int(element.get('max')),
+                                           float(element.get('width'))))
+                    elif element.tag == XLSX_MAIN_NS + 'sheetData':
+                        break
+            layouts[sheet.get('name')] = (zoom, col_widths)
+
+    return layouts
+
+
+def copy_read_only_sheet(src_ws, dst_ws, formats, layout, fills=None):
+    # a sheet of a workbook opened with read_only=True, with the layout from get_sheet_layouts
+    zoom, col_widths = layout
+    if zoom:
+        dst_ws.set_zoom(zoom)
+    for min_col, max_col, width in col_widths:
+        dst_ws.set_column(min_col - 1, max_col - 1, width)
+    copy_cells(src_ws.iter_rows(), dst_ws, formats, fills=fills)
@@ -0,0 +1,43 @@
+#
+# Shared openpyxl style objects for the scorecard sheets
+#
+# Style objects are immutable once assigned to a cell, so each distinct font color, fill, border and
+# alignment is built once here and shared by every cell that uses it, rather than constructed (and then
+# de-duplicated by openpyxl) on every call.
+#
+import functools
+
+from openpyxl.styles import Border, Side, PatternFill, Font, Alignment
+
+
+@functools.lru_cache(maxsize=None)
+def get_font(color):
+    return Font(color=color)
+
+
+@functools.lru_cache(maxsize=None)
+def get_fill(color):
+    return PatternFill(fgColor=color, fill_type='solid')
+
+
+@functools.lru_cache(maxsize=None)
+def get_border(style='thin'):
+    # same style on all four sides
+    return Border(left=Side(style=style), right=Side(style=style), top=Side(style=style), bottom=Side(style=style))
+
+
+@functools.lru_cache(maxsize=None)
+def get_alignment(horizontal=None, vertical=None):
+    return Alignment(horizontal=horizontal, vertical=vertical)
+
+
+@functools.lru_cache(maxsize=None)
+def get_rule_fill(color):
+    # conditional formats (differential styles) take the solid fill color from the background color
+    return PatternFill(start_color=color, end_color=color, fill_type='solid')
+
+
+def get_style_counts():
+    # {style kind: number of distinct objects built}, for benchmarking
+    return {'font': get_font.cache_info().currsize, 'fill': get_fill.cache_info().currsize,
+            'border': get_border.cache_info().currsize, 'alignment': get_alignment.cache_info().currsize}
@@ -1,15 +1,108 @@
-import os, re, zipfile, operator
+import os, re, sys, bisect, operator, functools, collections
 
 import py_common
+from tool_adapters import get_tool_adapter
+from summary_table import get_summary_table
+from metrics import get_suite_metrics, get_cwe_weights
 
-FVDL_NAME = "audit.fvdl"
 # todo: these are arbitrary settings for now
 SCORE_THRESHOLD_UNWEIGHTED = 0.45
 SCORE_THRESHOLD_WEIGHTED = 0.45
 
+# one valid hit; line number is an int and the strings are interned since they repeat across hits.  count is the
+# number of identical findings the hit stands for when duplicate findings are merged
+Hit = collections.namedtuple('Hit', ['file_path', 'line_number', 'function_name', 'count'])
+
+# everything scoring one xml project produces; picklable so projects can be scored in worker processes
+ProjectScore = collections.namedtuple('ProjectScore', ['test_cases', 'used_wids', 'test_case_files_that_hit',
+                                                       'hit_counts', 'score', 'name_space', 'opp_catalog'])
+
+# file extension and variant suffix that reduce a file name to its test case name
+JULIET_C_TEST_CASE_PATTERN = re.compile('[a-z]?\.\w+$')
+# c++ (and java) test cases are also split into _good and _bad files
+JULIET_SPLIT_TEST_CASE_PATTERN = re.compile('([a-z]?\.\w+$)|(_good.*$)|(_bad.*$)')
+KDM_TEST_CASE_PATTERN = re.compile('[_a]?\.\w+$')
+
+
+@functools.lru_cache(maxsize=65536)
+def get_test_case_name(file_path, tc_type, tc_lang):
+    """
+    Reduces a test case file (path or name) to the name of its test case, or returns None for an
+    unknown test case type.  Every finding in a file asks for the same name, so the results are cached.
+    """
+    if tc_type == 'juliet':
+        if tc_lang == 'c':
+            return JULIET_C_TEST_CASE_PATTERN.sub('', file_path)
+        return JULIET_SPLIT_TEST_CASE_PATTERN.sub('', file_path)
+    elif tc_type == 'kdm':
+        return KDM_TEST_CASE_PATTERN.sub('', file_path)
+    return None
+
+
+def new_hit(file_path, line_number, function_name, count=1):
+    return Hit(sys.intern(file_path), int(line_number), sys.intern(function_name), count)
+
+
+def is_opp_file(file, test_case_base_name, tc_lang):
+    # c: opps are in the test case file(s) themselves
+    if tc_lang == 'c':
+        return file.startswith(test_case_base_name) and file.endswith(tc_lang)
+    # cpp: get the single file in this test case that contains the opp counts
+    elif tc_lang == 'cpp':
+        return file.startswith(test_case_base_name) and file.endswith(tc_lang) \
+               and '_bad' not in file and '_goodG2B' not in file and '_goodB2G' not in file
+    return False
+
+
+def get_opp_catalog(juliet_path, tc_path, tc_lang):
+    """
+    Returns {test case name: (opp names, opp count)} for every juliet/false test case under tc_path,
+    the same opps TestCase finds for a single test case, but reading each directory only once.
+    """
+    opp_catalog = {}
+
+    for root, dirs, files in os.walk(tc_path):
+        test_case_dir = os.path.relpath(root, juliet_path).replace(os.sep, '/')
+        sorted_files = sorted(files)
+        # first file in walk order wins, as in TestCase
+        walk_order = {file: idx for idx, file in enumerate(files)}
+        file_opps = {}
+
+        for file in files:
+            if not file.endswith(tc_lang) or 'CWE' not in file:
+                continue
+            test_case_name = get_test_case_name(test_case_dir + '/' + file, 'juliet', tc_lang)
+            if test_case_name in opp_catalog:
+                continue
+            base_name = test_case_name.rsplit('/', 1)[1]
+
+            # files that start with the test case name are next to each other once sorted
+            opp_files = []
+            for idx in range(bisect.bisect_left(sorted_files, base_name), len(sorted_files)):
+                if not sorted_files[idx].startswith(base_name):
+                    break
+                if is_opp_file(sorted_files[idx], base_name, tc_lang):
+                    opp_files.append(sorted_files[idx])
+
+            opps = ([], 0)
+            for opp_file in sorted(opp_files, key=walk_order.get):
+                if opp_file not in file_opps:
+                    file_opps[opp_file] = py_common.find_good_fx_calls_in_file(os.path.join(root, opp_file))
+                opp_names = file_opps[opp_file]
+                if opp_names:
+                    # pad for even display
+                    opps = (opp_names + [''] * (4 - len(opp_names)), len(opp_names))
+                    break
+            opp_catalog[test_case_name] = opps
+
+    return opp_catalog
+
 
 class TestCase(object):
-    def __init__(self, test_case_name, tc_type, true_false, tc_lang):
+    __slots__ = ('test_case_name', 'tc_type', 'true_false', 'tc_lang', 'hit_data', 'hit_data_match_levels',
+                 'opp_names', 'opp_counts', 'score', 'percent')
+
+    def __init__(self, test_case_name, tc_type, true_false, tc_lang, opps=None):
 
         # test case name
         self.test_case_name = test_case_name
@@ -21,7 +114,7 @@ class TestCase(object):
         self.tc_lang = tc_lang
 
         ''' runtime attributes '''
-        # FILE NAME, LINE, FUNCTION
+        # Hit(FILE NAME, LINE, FUNCTION)
         self.hit_data = []
         '''
          Level     FILE NAME   LINE     COLOR
@@ -42,7 +135,12 @@ class TestCase(object):
         self.percent = 0
 
         ''' auto-run methods on creation '''
-        self.get_juliet_false_opp_counts_per_test_case(self.test_case_name)
+        if opps is None:
+            self.get_juliet_false_opp_counts_per_test_case(self.test_case_name)
+        else:
+            # (opp names, opp count) already read from the test case catalog
+            self.opp_names = list(opps[0])
+            self.opp_counts = opps[1]
         # self.update_match_levels(self.TODO)
 
     def get_juliet_false_opp_counts_per_test_case(self, test_case_name):
@@ -54,57 +152,23 @@ class TestCase(object):
             # walk thru the test case dir associated with this test case and look for the file(s) in this test case
             for root, dirs, files in os.walk(test_case_dir):
                 for file in files:
-                    opp_count = 0
                     # get file(s) associated with this test case and find opps
-                    # if file.startswith(test_case_name.rsplit('/', 1)[1]) and file.endswith('.c'):
-                    # todo: 06/14/17 need to test this with the c test cases
-
-                    if self.tc_lang == 'c':
-                        if file.startswith(test_case_name.rsplit('/', 1)[1]) and file.endswith(self.tc_lang):
-                            # read thru entire test case file and look for 'good...()' funct. calls (i.e. opportunities)
-                            with open(root + "\\" + file, 'r') as inF:
-                                for line in inF:
-                                    # todo: 6/14/17 for c++, we have multiple good()'s
-                                    # if 'good...()' in line:
-                                    if line.lstrip().startswith('good') and line.rstrip().endswith('();') \
-                                            and 'Source' not in line and 'Sink' not in line:
-                                        opp_count += 1
-                                        self.opp_counts = opp_count
-                                        self.opp_names.append(line.strip()[:-3])
-                            ''' 
-                            stop searching the files associated wtih this test case since the opp info has been 
-                            found and it only occurs in one file 
-                            '''
-                            if opp_count != 0:
-                                # pad for even display
-                                self.opp_names = self.opp_names + [''] * (4 - len(self.opp_names))
-                                break
-                    elif self.tc_lang == 'cpp':
-                        # get the single file in this test case that contains the opp counts
-                        if file.startswith(test_case_name.rsplit('/', 1)[1]) and file.endswith(self.tc_lang) \
-                                and '_bad' not in file and '_goodG2B' not in file and '_goodB2G' not in file:
-
-                            # read thru entire test case file and look for 'good...()' funct. calls (i.e. opportunities)
-                            with open(root + "\\" + file, 'r') as inF:
-                                line_content = []
-                                for line in inF:
-                                    # todo: 6/14/17 for c++, we have multiple good()'s
-                                    # if 'good...()' in line:
-                                    if line.lstrip().startswith('good') and line.rstrip().endswith('();') \
-                                            and 'Source' not in line and 'Sink' not in line and 'good()' not in line:
-                                        line_content.append(line)
-                                        opp_count += 1
-                                        self.opp_counts = opp_count
-                                        self.opp_names.append(line.strip()[:-3])
-                            ''' 
-                            stop searching the files associated wtih this test case since the opp info has been 
-                            found and it only occurs in one file 
-                            '''
-                            print('FILE_WITH_OPP*****', file, 'OPP_COUNT*****', opp_count)
-                            if opp_count != 0:
-                                # pad for even display
-                                self.opp_names = self.opp_names + [''] * (4 - len(self.opp_names))
-                                break
+                    if not is_opp_file(file, test_case_name.rsplit('/', 1)[1], self.tc_lang):
+                        continue
+
+                    # scan entire test case file for 'good...();' funct. calls (i.e. opportunities)
+                    opp_names = py_common.find_good_fx_calls_in_file(os.path.join(root, file))
+                    self.opp_names.extend(opp_names)
+
+                    ''' 
+                    stop searching the files associated wtih this test case since the opp info has been 
+                    found and it only occurs in one file 
+                    '''
+                    if opp_names:
+                        self.opp_counts = len(opp_names)
+                        # pad for even display
+                        self.opp_names = self.opp_names + [''] * (4 - len(self.opp_names))
+                        break
 
         else:
             self.opp_counts = 1
@@ -116,6 +180,11 @@ class TestCase(object):
 
 
 class Xml(object):
+    __slots__ = ('cwe_id_padded', 'cwe_num', 'tc_type', 'true_false', 'tc_lang', 'new_xml_name', 'scan_data_file',
+                 'tc_count', 'num_of_hits', 'percent_hits', 'tc_path', 'acceptable_weakness_ids',
+                 'acceptable_weakness_ids_dict', 'used_wids', 'test_cases', 'test_case_files_that_hit', 'scan_hash',
+                 'opp_catalog')
+
     def __init__(self, cwe_id_padded, cwe_num, tc_type, true_false, tc_lang, new_xml_name, scan_data_file):
         self.cwe_id_padded = cwe_id_padded
         self.cwe_num = cwe_num
@@ -135,15 +204,126 @@ class Xml(object):
         self.used_wids = []
         # list of test case objects
         self.test_cases = []
+        # file paths of all valid hits
+        self.test_case_files_that_hit = []
+        # content hash of the scan data file
+        self.scan_hash = ''
+        # juliet/false opps per test case name, None until the test cases have been read
+        self.opp_catalog = None
 
         print('PROJECT FILE---', self.scan_data_file)
 
+    def read_opp_catalog(self):
+        # read the opps of all juliet/false test cases at once; every other test case has a single opp
+        if self.tc_type == 'juliet' and self.true_false == 'FALSE' and self.tc_path:
+            self.opp_catalog = get_opp_catalog(os.path.join(os.getcwd(), 'juliet'),
+                                               os.path.join(os.getcwd(), self.tc_path), self.tc_lang)
+        else:
+            self.opp_catalog = {}
+
+
+class HitAggregator(object):
+    """
+    Collects the valid hits of one xml project, keyed by test case name, so that adding a hit is a
+    constant time update no matter how many test cases or hits the project already has.
+
+    With dedupe, findings that repeat the file, line, function and category of an earlier finding (i.e.
+    the same issue reported for another trace) are merged into the earlier hit and only counted.
+    """
+    __slots__ = ('xml_project', 'tc_lang', 'test_cases', 'used_wids', 'file_paths', 'dedupe', 'unique_hits')
+
+    def __init__(self, xml_project, tc_lang, dedupe=False):
+        self.xml_project = xml_project
+        self.tc_lang = tc_lang
+        # test case name -> TestCase, in order of first hit
+        self.test_cases = {}
+        # used wids in order of first use (the values are not used)
+        self.used_wids = {}
+        # file paths of all valid hits
+        self.file_paths = []
+        self.dedupe = dedupe
+        # (file, line, function, category) -> (TestCase, index of the hit in its hit data)
+        self.unique_hits = {}
+
+    def add_used_wids(self, wids):
+        for wid in wids:
+            self.used_wids[wid] = None
+
+    def add_hit(self, test_case_name, file_path, line_number, function_name, category=()):
+        if self.dedupe:
+            key = (file_path, line_number, function_name, category)
+            unique_hit = self.unique_hits.get(key)
+            if unique_hit is not None:
+                test_case, idx = unique_hit
+                hit = test_case.hit_data[idx]
+                test_case.hit_data[idx] = hit._replace(count=hit.count + 1)
+                return
+
+        test_case = self.test_cases.get(test_case_name)
+        if test_case is None:
+            # create a new test case object, with its opps from the catalog if they are there
+            opps = None
+            if self.xml_project.opp_catalog is not None:
+                opps = self.xml_project.opp_catalog.get(test_case_name)
+            test_case = TestCase(test_case_name, self.xml_project.tc_type, self.xml_project.true_false, self.tc_lang,
+                                 opps)
+            self.test_cases[test_case_name] = test_case
+
+        if self.dedupe:
+            self.unique_hits[key] = (test_case, len(test_case.hit_data))
+        test_case.hit_data.append(new_hit(file_path, line_number, function_name))
+        self.file_paths.append(file_path)
+
+    def get_test_case_count(self):
+        return len(self.test_cases)
+
+    def get_hit_counts(self):
+        # {test_case_name: hit_count}, counting merged duplicates too
+        return {name: sum(hit.count for hit in test_case.hit_data) for name, test_case in self.test_cases.items()}
+
+    def get_project_score(self, score, name_space):
+        return ProjectScore(list(self.test_cases.values()), list(self.used_wids), self.file_paths,
+                            self.get_hit_counts(), score, name_space, self.xml_project.opp_catalog)
+
+
+def store_project_score(xml_project, project_score, suite_hit_data):
+    # store the collected data on the xml project and the hit counts in the suite
+    if project_score.test_cases:
+        xml_project.test_cases = project_score.test_cases
+    xml_project.used_wids = project_score.used_wids
+    xml_project.test_case_files_that_hit = project_score.test_case_files_that_hit
+    xml_project.num_of_hits = project_score.score
+    xml_project.opp_catalog = project_score.opp_catalog
+    suite_hit_data.update(project_score.hit_counts)
+
 
 class Suite(object):
-    def __init__(self, source_path, dest_path, tool_name):
+    __slots__ = ('source_path', 'dest_path', 'tool_name', 'tool_adapter', 'scan_data_files', 'xml_projects', 'tc_paths',
+                 'suite_hit_data', 'suite_hit_data_complete', 'name_space', 'tag_info',
+                 'acceptable_weakness_ids_full_list', 'acceptable_weakness_ids_full_list_dict', 'weakness_id_index',
+                 'weakness_id_cells', 'weakness_id_fills',
+                 'used_wids_per_cwe',
+                 'used_wids_per_cwe_dict', 'weightings_per_cwe_dict', 'unique_cwes', 'summary_table', 'metrics',
+                 'suite_tc_count_true', 'suite_tc_count_false', 'suite_tp_count', 'suite_fp_count', 'suite_cwe_count',
+                 'precision_values_per_cwe_unweighted', 'precision_accumulated_valid_values_unweighted',
+                 'precision_accumulated_valid_count_unweighted', 'precision_average_unweighted',
+                 'precision_score_unweighted',
+                 'precision_values_per_cwe_weighted', 'precision_accumulated_valid_values_weighted',
+                 'precision_accumulated_valid_count_weighted', 'precision_average_weighted', 'precision_score_weighted',
+                 'recall_values_per_cwe_unweighted', 'recall_accumulated_values_unweighted',
+                 'recall_accumulated_count_unweighted', 'recall_average_unweighted', 'recall_score_unweighted',
+                 'recall_values_per_cwe_weighted', 'recall_accumulated_values_weighted',
+                 'recall_accumulated_count_weighted', 'recall_average_weighted', 'recall_score_weighted',
+                 'overall_score_unweighted', 'overall_required_threshold_unweighted',
+                 'overall_score_weighted', 'overall_required_threshold_weighted',
+                 'manual_review_recommendataion', 'pass_fail', 'duplicate_file_name_hits')
+
+    def __init__(self, source_path, dest_path, tool_name, xml_projects=None):
         self.source_path = source_path
         self.dest_path = dest_path
         self.tool_name = tool_name
+        # finds, copies and reads the scan data files of this tool
+        self.tool_adapter = get_tool_adapter(tool_name)
 
         # raw files produced by scanner
         self.scan_data_files = []
@@ -155,15 +335,26 @@ class Suite(object):
         ''' runtime attributes '''
         # stores the hits per test case {test_case_name: hit_count}
         self.suite_hit_data = {}
-        self.suite_hit_data_complete = []
+        # HitTable of every valid hit in the suite
+        self.suite_hit_data_complete = None
         self.name_space = ''
         self.tag_info = []
         self.acceptable_weakness_ids_full_list = []
         self.acceptable_weakness_ids_full_list_dict = {}
+        # acceptable wids indexed per cwe for matching
+        self.weakness_id_index = None
+        # cells of the acceptable wids in the 'Weakness IDs' sheet {cwe: {wid: [(row, col)]}}
+        self.weakness_id_cells = {}
+        # fills of the used and unused wid cells, when the 'Weakness IDs' sheet is read only {(row, col): color}
+        self.weakness_id_fills = {}
         self.used_wids_per_cwe = []
         self.used_wids_per_cwe_dict = {}
         self.weightings_per_cwe_dict = {}
         self.unique_cwes = []
+        # SummaryTable of the per cwe totals, built once the projects are scored
+        self.summary_table = None
+        # SuiteMetrics computed from the summary table
+        self.metrics = None
         # totals
         self.suite_tc_count_true = 0
         self.suite_tc_count_false = 0
@@ -209,11 +400,16 @@ class Suite(object):
 
         self.clear_totals()
         ''' auto-run methods on creation '''
-        self.create_xml_dir()
-        # get the xml info and create copies
-        self.get_xml_info(self.scan_data_files)
-        # get the test case counts
-        self.get_test_case_paths_and_counts(self.scan_data_files)
+        if xml_projects is None:
+            self.create_xml_dir()
+            # get the xml info and create copies
+            self.get_xml_info(self.scan_data_files)
+            # get the test case counts
+            self.get_test_case_paths_and_counts(self.scan_data_files)
+        else:
+            # projects (with their test case paths and counts) from an earlier run; scans are not read
+            self.xml_projects = xml_projects
+            self.scan_data_files = [xml_project.scan_data_file for xml_project in xml_projects]
         # sort
         self.sort_by_columns()
 
@@ -223,6 +419,29 @@ class Suite(object):
         self.suite_tp_count = 0
         self.suite_fp_count = 0
 
+    def summarize(self):
+        # per cwe and suite totals of the scored xml projects
+        self.summary_table = get_summary_table(self.xml_projects)
+        self.unique_cwes = self.summary_table.get_cwe_names()
+        self.suite_tc_count_true = self.summary_table.tc_true
+        self.suite_tc_count_false = self.summary_table.tc_false
+        self.suite_tp_count = self.summary_table.tp
+        self.suite_fp_count = self.summary_table.fp
+        self.suite_cwe_count = len(self.summary_table)
+
+        # scores, from the totals alone
+        self.weightings_per_cwe_dict = get_cwe_weights(self.unique_cwes)
+        self.metrics = get_suite_metrics(self.summary_table, self.overall_required_threshold_unweighted,
+                                         self.weightings_per_cwe_dict)
+        for cwe_metrics in self.metrics.cwes:
+            self.precision_values_per_cwe_unweighted[cwe_metrics.cwe] = \
+                'N/A' if cwe_metrics.p_final is None else cwe_metrics.p_final
+            self.recall_values_per_cwe_unweighted[cwe_metrics.cwe] = cwe_metrics.r_final
+        self.precision_average_unweighted = self.metrics.precision_average
+        self.recall_average_unweighted = self.metrics.recall_average
+        self.overall_score_unweighted = self.metrics.score
+        self.pass_fail = self.metrics.pass_fail
+
     def create_xml_dir(self):
         # create, or empty, 'xmls' folder
         #
@@ -241,11 +460,7 @@ class Suite(object):
                 # os.remove(self.dest_path + "//" + fileName)
                 os.remove(os.path.join(self.dest_path, fileName))
 
-        # fortify files are not in standard xml format
-        if self.tool_name == 'fortify':
-            self.scan_data_files = py_common.find_files_in_dir(self.source_path, '.*?\.fpr$')
-        else:
-            self.scan_data_files = py_common.find_files_in_dir(self.source_path, '.*?\.xml$')
+        self.scan_data_files = py_common.find_files_in_dir(self.source_path, self.tool_adapter.scan_file_pattern)
 
     def get_xml_info(self, scan_data_files):
         for scan_data_file in scan_data_files:
@@ -291,19 +506,8 @@ class Suite(object):
         return self.xml_projects
 
     def copy_xml_file(self, scan_data_file, new_xml_name):
-        if self.tool_name == 'fortify':
-            # self.extract_fvdl_from_fpr(scan_data_file, self.dest_path)
-
-            # fortify .fpr files need unzipped to get the xml
-            myzip = zipfile.ZipFile(scan_data_file, mode='r')
-            myzip.extract(FVDL_NAME, path=self.dest_path)
-            myzip.close()
-
-        # format xml name
-        tool_path_to_xml = os.path.join(self.dest_path, FVDL_NAME)
-        new_path_to_xml = os.path.join(self.dest_path, new_xml_name)
-        # create fresh xml name
-        os.rename(tool_path_to_xml, new_path_to_xml)
+        # fortify files are not in standard xml format, the tool adapter knows how to get the xml out
+        self.tool_adapter.copy_result_file(scan_data_file, self.dest_path, new_xml_name)
 
     def get_test_case_paths_and_counts(self, scan_data_files):
         key_list = []
@@ -350,13 +554,12 @@ class Suite(object):
                     if tc_type == 'juliet':
                         print('JULIET TEST CASE FILE', file)
                         # reduce filename to test case name by removing variant and file extension
-                        file = re.sub('([a-z]?\.\w+$)|(_good.*$)|(_bad.*$)', '', file)
-                        test_case_files.append(file)
+                        test_case_files.append(get_test_case_name(file, tc_type, tc_lang))
                     elif tc_type == 'kdm':
                         # if not file.endswith(".h") and not file.endswith("_a.c") and not file.endswith(".obj") and file.startswith("SFP"):
                         if not file.endswith(".h") and not file.endswith("_a." + tc_lang) and not file.endswith(
                                 ".obj") and file.startswith("SFP"):
-                            test_case_files.append(file)
+                            test_case_files.append(get_test_case_name(file, tc_type, tc_lang))
                             print('KDM TEST CASE FILE', file)
                     else:
                         print('Not a KDM or Juliet Test Case File.')
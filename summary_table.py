@@ -0,0 +1,47 @@
+#
+# Per cwe totals of the suite, shared by the 'Summary' and 'SCORE' sheets and their charts
+#
+import collections
+
+# one row of the summary; precision is None (written as 'N/A') when the cwe has no hits
+CweTotals = collections.namedtuple('CweTotals', ['cwe', 'tc_true', 'tc_false', 'tp', 'fp', 'precision', 'recall'])
+
+
+class SummaryTable(collections.namedtuple('SummaryTable', ['cwes', 'tc_true', 'tc_false', 'tp', 'fp'])):
+    """
+    Read only per cwe totals (a tuple of CweTotals sorted by cwe) and suite totals, built once from the
+    xml projects after they have been scored.
+    """
+    __slots__ = ()
+
+    def __len__(self):
+        return len(self.cwes)
+
+    def get_cwe_names(self):
+        return [cwe_totals.cwe for cwe_totals in self.cwes]
+
+
+def get_summary_table(xml_projects):
+    # cwe -> [tc true, tc false, tp, fp], in one pass over the projects
+    totals = {}
+    for xml_project in xml_projects:
+        cwe_totals = totals.get(xml_project.cwe_id_padded)
+        if cwe_totals is None:
+            cwe_totals = totals[xml_project.cwe_id_padded] = [0, 0, 0, 0]
+
+        if xml_project.true_false == 'TRUE':
+            cwe_totals[0] += xml_project.tc_count
+            cwe_totals[2] += xml_project.num_of_hits
+        elif xml_project.true_false == 'FALSE':
+            cwe_totals[1] += xml_project.tc_count
+            cwe_totals[3] += xml_project.num_of_hits
+
+    cwes = []
+    for cwe in sorted(totals):
+        tc_t, tc_f, tp, fp = totals[cwe]
+        precision = tp / (tp + fp) if tp + fp != 0 else None
+        cwes.append(CweTotals(cwe, tc_t, tc_f, tp, fp, precision, tp / tc_t))
+
+    return SummaryTable(tuple(cwes), sum(cwe_totals.tc_true for cwe_totals in cwes),
+                        sum(cwe_totals.tc_false for cwe_totals in cwes), sum(cwe_totals.tp for cwe_totals in cwes),
+                        sum(cwe_totals.fp for cwe_totals in cwes))
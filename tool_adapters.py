@@ -0,0 +1,77 @@
+#
+# Adapters for the tools being scored: how each tool's scan data files are found, copied into the 'xmls'
+# folder and streamed as findings
+#
+import os
+import re
+import shutil
+import zipfile
+
+from findings import FvdlReader, SarifReader
+
+FVDL_NAME = 'audit.fvdl'
+
+
+class TagXmlAdapter(object):
+    """
+    Generic xml tool output, read with the schemas in the 'XML Tags' sheet.  The scan data files are
+    the xmls themselves.
+    """
+    # raw scan data files produced by the tool
+    scan_file_pattern = re.compile('.*?\.xml$', re.IGNORECASE)
+    # findings are read with the 'XML Tags' sheet
+    uses_xml_tags = True
+    # delimiter between the pieces of a weakness id, None if each weakness id is a single piece
+    wid_delimiter = None
+
+    def copy_result_file(self, scan_data_file, dest_path, new_xml_name):
+        shutil.copyfile(scan_data_file, os.path.join(dest_path, new_xml_name))
+
+    def get_reader(self, xml_path, extractor):
+        # streaming iterator of Findings, with a name_space dict
+        return FvdlReader(xml_path, extractor)
+
+
+class FortifyAdapter(TagXmlAdapter):
+    """
+    Fortify .fpr files; the xml (audit.fvdl) is zipped inside.
+    """
+    scan_file_pattern = re.compile('.*?\.fpr$', re.IGNORECASE)
+    wid_delimiter = ':'
+
+    def copy_result_file(self, scan_data_file, dest_path, new_xml_name):
+        # fortify .fpr files need unzipped to get the xml
+        with zipfile.ZipFile(scan_data_file, mode='r') as fpr_zip:
+            fpr_zip.extract(FVDL_NAME, path=dest_path)
+
+        # create fresh xml name
+        os.rename(os.path.join(dest_path, FVDL_NAME), os.path.join(dest_path, new_xml_name))
+
+
+class SarifAdapter(TagXmlAdapter):
+    """
+    SARIF logs (json) from a local file; each result's rule id is its weakness id.
+    """
+    scan_file_pattern = re.compile('.*?\.(sarif|json)$', re.IGNORECASE)
+    uses_xml_tags = False
+
+    def get_reader(self, xml_path, extractor):
+        return SarifReader(xml_path)
+
+
+# tool name -> adapter
+TOOL_ADAPTERS = {}
+
+
+def register_tool_adapter(tool_name, adapter):
+    TOOL_ADAPTERS[tool_name] = adapter
+
+
+def get_tool_adapter(tool_name):
+    # tools without an adapter of their own produce xml that is read with the 'XML Tags' sheet
+    return TOOL_ADAPTERS.get(tool_name, TOOL_ADAPTERS['xml'])
+
+
+register_tool_adapter('fortify', FortifyAdapter())
+register_tool_adapter('xml', TagXmlAdapter())
+register_tool_adapter('sarif', SarifAdapter())
@@ -0,0 +1,117 @@
+#
+# Matches the weakness ids reported by a tool against the vendor's acceptable weakness ids
+#
+import collections
+
+# wid piece that matches any one piece, or any number of trailing pieces when it is the last piece
+WILDCARD = '*'
+
+
+class WidTrieNode(object):
+    __slots__ = ('children', 'wids', 'family_wids')
+
+    def __init__(self):
+        # next wid piece (or WILDCARD) -> node
+        self.children = {}
+        # wids that end at this node
+        self.wids = []
+        # wids that end with a trailing WILDCARD after this node (this category and everything below it)
+        self.family_wids = []
+
+
+class WeaknessIdIndex(object):
+    """
+    The 'Weakness IDs' sheet compiled into one hash index per CWE.
+
+    Each acceptable wid cell is split into its pieces and keyed by the frozenset of those pieces, so
+    finding whether a tool's wid pieces exactly match any acceptable wid of a CWE is a single dictionary
+    lookup rather than a loop over every cell in the CWE's row.
+
+    Cells that contain a WILDCARD piece are category patterns and go into a trie per CWE instead, which
+    is walked one piece at a time in wid order (i.e. Kingdom:Type:Subtype):
+        'Input Validation and Representation:Buffer Overflow:*'  the Buffer Overflow family
+        '*:Buffer Overflow:*'                                     the same, in any kingdom
+        'Input Validation and Representation:*:Off-by-One'       Off-by-One under any type
+    """
+
+    def __init__(self, weakness_ids, delimiter=None):
+        # delimiter between the pieces of a wid; None if the whole cell is a single piece
+        self.delimiter = delimiter
+        # cwe number -> {frozenset of wid pieces: (acceptable wids)}
+        self.wid_keys_per_cwe = {}
+        # cwe number -> root WidTrieNode of the wildcard wids
+        self.wid_tries_per_cwe = {}
+
+        # first row holds the column titles, first column the cwe number
+        for row in weakness_ids[1:]:
+            self.add_cwe(row[0], row[1:])
+
+    def add_cwe(self, cwe_num, wids):
+        wid_keys = self.wid_keys_per_cwe.setdefault(cwe_num, {})
+
+        for wid in wids:
+            # skip blank cells
+            if wid == 'None' or wid.isdigit():
+                continue
+
+            pieces = self.get_wid_pieces(wid)
+            if WILDCARD in [piece.strip() for piece in pieces]:
+                self.add_wildcard_wid(cwe_num, wid, [piece.strip() for piece in pieces])
+            else:
+                key = frozenset(pieces)
+                if wid not in wid_keys.get(key, ()):
+                    wid_keys[key] = wid_keys.get(key, ()) + (wid,)
+
+    def add_wildcard_wid(self, cwe_num, wid, pieces):
+        node = self.wid_tries_per_cwe.setdefault(cwe_num, WidTrieNode())
+
+        family = pieces[-1] == WILDCARD
+        if family:
+            pieces = pieces[:-1]
+        for piece in pieces:
+            if piece not in node.children:
+                node.children[piece] = WidTrieNode()
+            node = node.children[piece]
+
+        if family:
+            node.family_wids.append(wid)
+        else:
+            node.wids.append(wid)
+
+    def get_wid_pieces(self, wid):
+        # exact wids are compared as they are in the sheet, spaces included; only wildcard pieces are stripped
+        if self.delimiter is None:
+            return [wid]
+        return wid.split(self.delimiter)
+
+    def match(self, cwe_num, wid_pieces):
+        """
+        Returns the acceptable wids of a CWE that match the given wid pieces, or an empty tuple if there
+        is no match.  Plain wids must have exactly the same pieces (in any order); wildcard wids are
+        matched in order against the trie.
+        """
+        wid_keys = self.wid_keys_per_cwe.get(cwe_num)
+        matched = wid_keys.get(frozenset(wid_pieces), ()) if wid_keys else ()
+
+        wid_trie = self.wid_tries_per_cwe.get(cwe_num)
+        if wid_trie is None:
+            return matched
+
+        wildcard_matched = []
+        self.match_trie(wid_trie, wid_pieces, 0, wildcard_matched)
+        if not wildcard_matched:
+            return matched
+        # each wid once, in the order it was matched
+        return tuple(collections.OrderedDict.fromkeys(matched + tuple(wildcard_matched)))
+
+    def match_trie(self, node, wid_pieces, idx, matched):
+        # a trailing wildcard matches this category and everything below it
+        matched.extend(node.family_wids)
+        if idx == len(wid_pieces):
+            matched.extend(node.wids)
+            return
+
+        for piece in (wid_pieces[idx], WILDCARD):
+            child = node.children.get(piece)
+            if child is not None:
+                self.match_trie(child, wid_pieces, idx + 1, matched)